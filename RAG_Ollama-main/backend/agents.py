@@ -1,9 +1,14 @@
-import ollama
+import asyncio
 import logging
-from typing import List, Dict, Any, Tuple
+import time
+from typing import List, Dict, Any, Tuple, AsyncIterator
 from .config import Config
-import re
-from rag_pipeline import get_all_paragraph_chunks
+from .context_packer import ContextPacker
+from .executor import run_blocking
+from .intent_router import IntentRouter, is_retrieval_intent, PHRASE, DOCUMENT
+from .tracing import RequestTrace
+from . import llm_client
+from rag_pipeline import get_all_paragraph_chunks, find_phrase
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -13,46 +18,145 @@ class RetrieverAgent:
     
     def __init__(self, query_vector_db_func):
         self.query_vector_db = query_vector_db_func
+        self.context_packer = ContextPacker()
+        # Fallback for callers that do not route the query themselves (keywords only, never blocks)
+        self.router = IntentRouter("keywords")
         self.name = "Retriever Agent"
     
-    def retrieve(self, query: str, top_k: int = None) -> Dict[str, Any]:
+    async def fetch_context(self, query: str, top_k: int = None, route: Dict[str, Any] = None,
+                            filters: Dict[str, Any] = None) -> Dict[str, Any]:
         """
-        Retrieve paragraphs containing exact matches for the keyword/phrase in the uploaded documents.
+        Fetch and pack the most similar paragraph chunks for the query, without calling the LLM.
+        
+        In "hybrid" (default) and "vector" modes the best CONTEXT_CANDIDATES (at least top_k)
+        matching chunks are retrieved and the packer picks among them down to the token budget.
+        "full_corpus" mode uses every indexed chunk and is only meant for tiny corpora.
+        Phrase-existence questions (route intent "phrase") use the chunks that contain the phrase
+        ("phrase" mode); unquoted phrases without exact matches fall back to the configured mode.
+        Every mode only searches the documents and pages in filters (see rag_pipeline.make_filters).
+        """
+        if top_k is None:
+            top_k = Config.TOP_K_RESULTS
+        if route is None:
+            route = self.router.route(query)
+        retrieval_mode = Config.get_retrieval_mode()
+        lookup = None
+        if route["intent"] == PHRASE:
+            lookup = await run_blocking(find_phrase, route["phrase"], limit=Config.PHRASE_MAX_HITS, filters=filters)
+            logger.info(f"{self.name}: Phrase lookup for '{route['phrase']}' matched {lookup['total']} chunks")
+        if lookup and (lookup["hits"] or route["quoted"]):
+            # Exact matches (or a definite miss for a quoted phrase) replace similarity search
+            retrieval_mode = "phrase"
+            chunks = [
+                {key: value for key, value in hit.items() if key not in ("snippet", "occurrences")}
+                for hit in lookup["hits"]
+            ]
+        elif retrieval_mode == "full_corpus":
+            chunks = await run_blocking(get_all_paragraph_chunks, filters)
+            logger.info(f"{self.name}: Retrieved all {len(chunks)} paragraph chunks from DB (full_corpus mode)")
+        else:
+            candidates = Config.get_context_candidates(top_k)
+            chunks = await run_blocking(self.query_vector_db, query, n_results=candidates, include_embeddings=True, filters=filters)
+            logger.info(f"{self.name}: Retrieved {len(chunks)} of top {candidates} paragraph chunks for '{query}'")
+        packed = self.context_packer.pack(chunks)
+        chunks = packed["chunks"]
+        result = {
+            "query": query,
+            "context": packed["context"],
+            "retrieved_paragraphs": chunks,
+            "num_paragraphs": len(chunks),
+            "citations": self._citations(chunks),
+            "retrieval_mode": retrieval_mode,
+            "context_tokens": packed["tokens"],
+            "filters": filters,
+            "status": "success"
+        }
+        if lookup is not None:
+            result["phrase_lookup"] = {
+                "phrase": lookup["phrase"],
+                "total": lookup["total"],
+                "hits": [{key: value for key, value in hit.items() if key != "text"} for hit in lookup["hits"]]
+            }
+        return result
+    
+    async def retrieve(self, query: str, top_k: int = None, filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Retrieve the top_k most similar paragraph chunks for the query and answer from them.
+        
+        Phrase-existence questions ("is there ...", "does it contain ...", or a quoted phrase)
+        return the paragraphs containing exact matches for the phrase instead.
         """
         try:
-            if top_k is None:
-                top_k = Config.TOP_K_RESULTS
-            logger.info(f"{self.name}: Passing query to LLM for retrieval and answer generation: '{query}'")
-            all_chunks = get_all_paragraph_chunks()
-            logger.info(f"{self.name}: Retrieved {len(all_chunks)} total paragraph chunks from DB")
-            # Concatenate all paragraphs as context
-            context = "\n\n".join([chunk['text'] for chunk in all_chunks if isinstance(chunk, dict) and 'text' in chunk and chunk['text']])
-            llm_answer = ""
-            if context:
-                prompt = f"You are an expert assistant. Use the following document context to answer the user's question.\n\nContext:\n{context}\n\nQuestion: {query}\n\nIf the answer is not in the context, say so."
-                response = ollama.chat(
-                    model=Config.get_ollama_model(),
-                    messages=[{"role": "user", "content": prompt}],
-                    options={"temperature": Config.TEMPERATURE}
-                )
-                llm_answer = response['message']['content']
+            result = await self.fetch_context(query, top_k, filters=filters)
+        except Exception as e:
+            logger.error(f"{self.name}: Error during retrieval: {e}")
+            return self._error_result(query, e)
+        return await self.answer_from_context(result)
+    
+    async def answer_from_context(self, retrieval_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate the retriever's answer for an already fetched context"""
+        query = retrieval_result["query"]
+        try:
+            context = retrieval_result["context"]
+            if retrieval_result.get("retrieval_mode") == "skipped":
+                # Routed as a general question: only the editor answers
+                llm_answer = ""
+            elif retrieval_result.get("retrieval_mode") == "phrase":
+                # The hits are the answer; the editor phrases the final response
+                llm_answer = self._phrase_answer(retrieval_result["phrase_lookup"])
+            elif context:
+                llm_answer = await llm_client.chat(self._answer_prompt(query, context))
             else:
                 llm_answer = "No document context is available to answer the question."
-            return {
-                "query": query,
-                "context": context,
-                "llm_answer": llm_answer,
-                "status": "success"
-            }
+            return dict(retrieval_result, llm_answer=llm_answer)
         except Exception as e:
-            logger.error(f"{self.name}: Error during retrieval: {e}")
-            return {
-                "query": query,
-                "context": "",
-                "llm_answer": "",
-                "status": "error",
-                "error": str(e)
-            }
+            logger.error(f"{self.name}: Error during answer generation: {e}")
+            return self._error_result(query, e)
+    
+    def skipped_result(self, query: str) -> Dict[str, Any]:
+        """Result for a query routed past retrieval"""
+        return {
+            "query": query,
+            "context": "",
+            "retrieved_paragraphs": [],
+            "num_paragraphs": 0,
+            "citations": [],
+            "retrieval_mode": "skipped",
+            "status": "success"
+        }
+    
+    def _error_result(self, query: str, error: Exception) -> Dict[str, Any]:
+        """Result returned when retrieval or answer generation fails"""
+        return {
+            "query": query,
+            "context": "",
+            "llm_answer": "",
+            "retrieved_paragraphs": [],
+            "num_paragraphs": 0,
+            "citations": [],
+            "status": "error",
+            "error": str(error)
+        }
+    
+    def _answer_prompt(self, query: str, context: str) -> str:
+        """Prompt asking the LLM to answer from the retrieved context"""
+        return f"You are an expert assistant. Use the following document context to answer the user's question. Cite the page numbers you rely on.\n\nContext:\n{context}\n\nQuestion: {query}\n\nIf the answer is not in the context, say so."
+    
+    def _phrase_answer(self, lookup: Dict[str, Any]) -> str:
+        """Summary of a phrase lookup, listing where the phrase occurs"""
+        if not lookup["hits"]:
+            return f'"{lookup["phrase"]}" was not found in the indexed documents.'
+        pages = sorted({hit["page"] for hit in lookup["hits"] if hit.get("page") is not None})
+        locations = f" on page{'s' if len(pages) > 1 else ''} {', '.join(str(page) for page in pages)}" if pages else ""
+        return f'"{lookup["phrase"]}" occurs in {lookup["total"]} passage{"s" if lookup["total"] != 1 else ""}{locations}.'
+    
+    def _citations(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Page citations for the retrieved chunks, in retrieval order"""
+        return [
+            {"id": chunk.get('id'), "page": chunk.get('page'), "para": chunk.get('para'), "section": chunk.get('section'),
+             "document_id": chunk.get('document_id'), "filename": chunk.get('filename')}
+            for chunk in chunks
+        ]
 
 class RFPEditorAgent:
     """Agent B: Responsible for analyzing and improving RFP content"""
@@ -60,6 +164,7 @@ class RFPEditorAgent:
     def __init__(self):
         self.name = "RFP Editor Agent"
         self.rfp_best_practices = self._get_rfp_best_practices()
+        self.router = IntentRouter("keywords")
     
     def _get_rfp_best_practices(self) -> str:
         """Get the RFP best practices checklist"""
@@ -102,7 +207,8 @@ class RFPEditorAgent:
         - Security and compliance needs
         """
     
-    def analyze_and_improve(self, query: str, context: str, original_response: str = None) -> Dict[str, Any]:
+    async def analyze_and_improve(self, query: str, context: str, original_response: str = None,
+                                  route: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Analyze the content and provide improvement suggestions
         
@@ -110,6 +216,7 @@ class RFPEditorAgent:
             query: The user's original question
             context: Retrieved context from Agent A
             original_response: Previous response if this is a revision
+            route: IntentRouter decision for the query (routed by keywords when omitted)
             
         Returns:
             Dictionary containing analysis and suggestions
@@ -118,16 +225,10 @@ class RFPEditorAgent:
             logger.info(f"{self.name}: Analyzing content for improvement")
             
             # Create the analysis prompt
-            analysis_prompt = self._create_analysis_prompt(query, context, original_response)
+            analysis_prompt = self._create_analysis_prompt(query, context, original_response, route)
             
             # Get response from Ollama
-            response = ollama.chat(
-                model=Config.get_ollama_model(),
-                messages=[{"role": "user", "content": analysis_prompt}],
-                options={"temperature": Config.TEMPERATURE}
-            )
-            
-            improved_content = response['message']['content']
+            improved_content = await llm_client.chat(analysis_prompt)
             
             logger.info(f"{self.name}: Generated improvement suggestions")
             
@@ -152,17 +253,25 @@ class RFPEditorAgent:
                 "agent_name": self.name
             }
     
-    def _create_analysis_prompt(self, query: str, context: str, original_response: str = None) -> str:
+    async def stream_analysis(self, query: str, context: str, original_response: str = None,
+                              route: Dict[str, Any] = None) -> AsyncIterator[str]:
+        """Stream the improvement suggestions token by token"""
+        logger.info(f"{self.name}: Streaming content analysis")
+        analysis_prompt = self._create_analysis_prompt(query, context, original_response, route)
+        async for token in llm_client.stream_chat(analysis_prompt):
+            yield token
+    
+    def _create_analysis_prompt(self, query: str, context: str, original_response: str = None,
+                                route: Dict[str, Any] = None) -> str:
         """Create the analysis prompt with intelligent response logic"""
         
         # Check if the query is asking about content retrieval
-        retrieval_keywords = ['is there', 'does it contain', 'does the document', 'is mentioned', 'can you find', 'look for', 'search for', 'find', 'locate', 'where is', 'what does it say about']
-        is_retrieval_query = any(keyword in query.lower() for keyword in retrieval_keywords)
+        is_retrieval_query = is_retrieval_intent(route or self.router.route(query))
         
         if is_retrieval_query and context.strip():
             # User is asking if something exists in the PDF - provide relevant content
             base_prompt = f"""
-            You are an expert assistant analyzing a PDF document. The user is asking if specific content exists in the document.
+            You are an expert assistant analyzing a PDF document. The user is asking about specific content in the document.
 
             USER QUERY: {query}
 
@@ -181,7 +290,7 @@ class RFPEditorAgent:
         elif is_retrieval_query and not context.strip():
             # User is asking for content but nothing was found
             base_prompt = f"""
-            You are an expert assistant analyzing a PDF document. The user is asking if specific content exists in the document.
+            You are an expert assistant analyzing a PDF document. The user is asking about specific content in the document.
 
             USER QUERY: {query}
 
@@ -242,7 +351,8 @@ class RFPEditorAgent:
         
         return applied_practices
     
-    def rephrase_with_feedback(self, query: str, context: str, feedback: str, original_suggestion: str) -> Dict[str, Any]:
+    async def rephrase_with_feedback(self, query: str, context: str, feedback: str, original_suggestion: str,
+                                     route: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Rephrase the suggestion based on user feedback
         
@@ -251,6 +361,7 @@ class RFPEditorAgent:
             context: Retrieved context
             feedback: User feedback (rejection reason)
             original_suggestion: The suggestion that was rejected
+            route: IntentRouter decision for the query (routed by keywords when omitted)
             
         Returns:
             Dictionary containing the rephrased suggestion
@@ -258,52 +369,9 @@ class RFPEditorAgent:
         try:
             logger.info(f"{self.name}: Rephrasing based on user feedback")
             
-            # Check if the query is asking about content retrieval
-            retrieval_keywords = ['is there', 'does it contain', 'does the document', 'is mentioned', 'can you find', 'look for', 'search for', 'find', 'locate', 'where is', 'what does it say about']
-            is_retrieval_query = any(keyword in query.lower() for keyword in retrieval_keywords)
+            rephrase_prompt = self._create_rephrase_prompt(query, context, feedback, original_suggestion, route)
             
-            if is_retrieval_query:
-                rephrase_prompt = f"""
-                The user rejected your previous suggestion. Please provide an improved version.
-                
-                ORIGINAL QUERY: {query}
-                CONTEXT: {context}
-                YOUR PREVIOUS SUGGESTION: {original_suggestion}
-                USER FEEDBACK: {feedback}
-                
-                INSTRUCTIONS:
-                - If the relevant content is found, clearly state what was found and provide the specific information
-                - If the content is not found, clearly state that it was not found in the document
-                - Always be specific about what was found or not found
-                - Use the exact content from the document when possible
-                - Address the user's feedback in your response
-                
-                Please provide a new suggestion that addresses the user's feedback.
-                """
-            else:
-                rephrase_prompt = f"""
-                The user rejected your previous suggestion. Please provide an improved version.
-                
-                ORIGINAL QUERY: {query}
-                YOUR PREVIOUS SUGGESTION: {original_suggestion}
-                USER FEEDBACK: {feedback}
-                
-                INSTRUCTIONS:
-                - Answer the question directly based on your knowledge
-                - Do not reference any document content unless specifically relevant
-                - Provide helpful, accurate, and informative responses
-                - Address the user's feedback in your response
-                
-                Please provide a new suggestion that addresses the user's feedback.
-                """
-            
-            response = ollama.chat(
-                model=Config.get_ollama_model(),
-                messages=[{"role": "user", "content": rephrase_prompt}],
-                options={"temperature": Config.TEMPERATURE}
-            )
-            
-            rephrased_content = response['message']['content']
+            rephrased_content = await llm_client.chat(rephrase_prompt)
             
             return {
                 "original_query": query,
@@ -325,62 +393,55 @@ class RFPEditorAgent:
                 "error": str(e),
                 "agent_name": self.name
             }
-
-class HelpingAgent:
-    """Agent that answers RFP-related questions using both general RFP knowledge and indexed PDFs."""
-    def __init__(self, query_vector_db_func):
-        self.query_vector_db = query_vector_db_func
-        self.name = "Helping Agent"
-
-    def answer(self, query: str) -> str:
-        try:
-            top_k = Config.TOP_K_RESULTS
-            context_chunks = self.query_vector_db(query, n_results=top_k)
-            logger.info(f"{self.name} context_chunks: {context_chunks}")
-            if not isinstance(context_chunks, list):
-                context_chunks = []
-            filtered_chunks = []
-            if context_chunks:
-                for chunk in context_chunks:
-                    if isinstance(chunk, dict) and 'text' in chunk and chunk['text'] is not None:
-                        filtered_chunks.append(chunk)
-            context = "\n".join([chunk['text'] for chunk in filtered_chunks]) if filtered_chunks else ""
-
-            prompt = f"""
-            You are an expert in writing, reviewing, and consulting on Requests for Proposal (RFPs). Answer the user's question with clear, accurate, and practical advice. Use both your general RFP knowledge and the provided document context below. If the context is relevant, cite it in your answer. If not, answer from your expertise.
-
-            USER QUESTION: {query}
-
-            DOCUMENT CONTEXT:
-            {context}
+    
+    async def stream_rephrase(self, query: str, context: str, feedback: str, original_suggestion: str,
+                              route: Dict[str, Any] = None) -> AsyncIterator[str]:
+        """Stream the rephrased suggestion token by token"""
+        logger.info(f"{self.name}: Streaming rephrase based on user feedback")
+        rephrase_prompt = self._create_rephrase_prompt(query, context, feedback, original_suggestion, route)
+        async for token in llm_client.stream_chat(rephrase_prompt):
+            yield token
+    
+    def _create_rephrase_prompt(self, query: str, context: str, feedback: str, original_suggestion: str,
+                                route: Dict[str, Any] = None) -> str:
+        """Create the prompt for rephrasing a rejected suggestion"""
+        # Check if the query is asking about content retrieval
+        is_retrieval_query = is_retrieval_intent(route or self.router.route(query))
+        
+        if is_retrieval_query:
+            return f"""
+            The user rejected your previous suggestion. Please provide an improved version.
+            
+            ORIGINAL QUERY: {query}
+            CONTEXT: {context}
+            YOUR PREVIOUS SUGGESTION: {original_suggestion}
+            USER FEEDBACK: {feedback}
+            
+            INSTRUCTIONS:
+            - If the relevant content is found, clearly state what was found and provide the specific information
+            - If the content is not found, clearly state that it was not found in the document
+            - Always be specific about what was found or not found
+            - Use the exact content from the document when possible
+            - Address the user's feedback in your response
+            
+            Please provide a new suggestion that addresses the user's feedback.
+            """
+        else:
+            return f"""
+            The user rejected your previous suggestion. Please provide an improved version.
+            
+            ORIGINAL QUERY: {query}
+            YOUR PREVIOUS SUGGESTION: {original_suggestion}
+            USER FEEDBACK: {feedback}
+            
+            INSTRUCTIONS:
+            - Answer the question directly based on your knowledge
+            - Do not reference any document content unless specifically relevant
+            - Provide helpful, accurate, and informative responses
+            - Address the user's feedback in your response
+            
+            Please provide a new suggestion that addresses the user's feedback.
             """
-            response = ollama.chat(
-                model=Config.get_ollama_model(),
-                messages=[{"role": "user", "content": prompt}],
-                options={"temperature": Config.TEMPERATURE}
-            )
-            if not response or not isinstance(response, dict):
-                logger.error(f"{self.name}: ollama.chat returned None or invalid response: {response}")
-                return "Error: LLM did not return a valid response."
-            message = response.get('message')
-            if not message or not isinstance(message, dict):
-                logger.error(f"{self.name}: ollama.chat response missing 'message': {response}")
-                return "Error: LLM response missing message content."
-            content = message.get('content')
-            if not content:
-                logger.error(f"{self.name}: ollama.chat message missing 'content': {response}")
-                return "Error: LLM response missing content."
-            # Remove any preamble or 'thoughts' before the answer
-            # Heuristic: take content after the first double linebreak or 'Answer:'
-            split_content = re.split(r"\n\n|Answer:|A:|\n[Aa]nswer", content, maxsplit=1)
-            if len(split_content) > 1:
-                answer = split_content[1].strip()
-            else:
-                answer = content.strip()
-            return answer
-        except Exception as e:
-            logger.error(f"{self.name}: Error in answer: {e}")
-            return f"Error: {str(e)}"
 
 class MultiAgentRFPAssistant:
     """Main coordinator for the multi-agent RFP review system"""
@@ -388,60 +449,117 @@ class MultiAgentRFPAssistant:
     def __init__(self, query_vector_db_func):
         self.retriever_agent = RetrieverAgent(query_vector_db_func)
         self.rfp_editor_agent = RFPEditorAgent()
-        self.agent_log = []
+        self.router = IntentRouter()
+        self.name = "Multi-Agent RFP Assistant"
     
-    def process_query(self, query: str) -> Dict[str, Any]:
+    async def process_query(self, query: str, filters: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Process a query through the multi-agent pipeline
         
+        The query is routed first. General questions skip retrieval and the retriever's answer,
+        so they cost one LLM call; phrase-existence questions use the exact phrase lookup and
+        only the editor calls the LLM. Otherwise context is fetched once. In "concurrent"
+        pipeline mode the retriever's answer and the editor's analysis are then generated at
+        the same time, since the editor only needs the context; "sequential" mode runs them
+        one after the other.
+        
         Args:
             query: User's question or request
+            filters: Documents and page range to search (see rag_pipeline.make_filters)
             
         Returns:
-            Dictionary containing results from pdf
+            Dictionary containing results from pdf, per-stage timings in milliseconds and the
+            request's compact trace as "agent_log"
         """
         logger.info("MultiAgentRFPAssistant: Starting query processing")
+        trace = RequestTrace("ask", query)
+        timings = trace.timings
+        started = time.perf_counter()
+        route = trace.route = await self._timed(self.route(query, filters), "routing_ms", timings)
+        
+        # Step 1: Agent A - Fetch the document context once for both agents
+        context_result = await self._fetch_context(query, route, timings, filters)
+        
+        if context_result["status"] != "error":
+            context = context_result["context"]
+            answer = self.retriever_agent.answer_from_context(context_result)
+            # Step 2: Agent B - Analyze and improve content (empty context when no results were found)
+            improvement = self.rfp_editor_agent.analyze_and_improve(query, context, route=route)
+            if Config.get_pipeline_mode() == "concurrent":
+                retrieval_result, improvement_result = await asyncio.gather(
+                    self._timed(answer, "retriever_generation_ms", timings),
+                    self._timed(improvement, "editor_generation_ms", timings)
+                )
+            else:
+                retrieval_result = await self._timed(answer, "retriever_generation_ms", timings)
+                if retrieval_result["status"] == "error":
+                    improvement.close()
+                    improvement_result = None
+                else:
+                    improvement_result = await self._timed(improvement, "editor_generation_ms", timings)
+        else:
+            retrieval_result = context_result
+            improvement_result = None
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
         
-        # Always use paragraph containment logic for retrieval
-        retrieval_result = self.retriever_agent.retrieve(query)
-        self.agent_log.append({
-            "step": 1,
-            "agent": "Retriever Agent",
-            "action": "Document retrieval",
-            "result": retrieval_result
-        })
+        trace.add("Retriever Agent", "Document retrieval", retrieval_result,
+                  timings.get("retrieval_ms", 0.0) + timings.get("retriever_generation_ms", 0.0))
         if retrieval_result["status"] == "error":
+            trace.finish("error")
             return {
                 "status": "error",
                 "error": "Failed to retrieve documents",
-                "agent_log": self.agent_log
+                "trace_id": trace.trace_id,
+                "agent_log": trace.entries
             }
-        # Step 2: Agent B - Analyze and improve content
-        if retrieval_result["context"]:
-            improvement_result = self.rfp_editor_agent.analyze_and_improve(
-                query, 
-                retrieval_result["context"]
-            )
-        else:
-            improvement_result = self.rfp_editor_agent.analyze_and_improve(
-                query, 
-                ""  # Empty context for no results found
-            )
-        self.agent_log.append({
-            "step": 2,
-            "agent": "RFP Editor Agent",
-            "action": "Content analysis and improvement",
-            "result": improvement_result
-        })
+        trace.add("RFP Editor Agent", "Content analysis and improvement", improvement_result, timings.get("editor_generation_ms"))
+        trace.finish("success")
+        logger.info(f"{self.name}: Query processed in {timings['total_ms']} ms ({Config.get_pipeline_mode()} mode, {route['intent']} intent)")
         return {
             "status": "success",
             "query": query,
+            "route": route,
             "retrieval_result": retrieval_result,
             "improvement_result": improvement_result,
-            "agent_log": self.agent_log
+            "timings": timings,
+            "trace_id": trace.trace_id,
+            "agent_log": trace.entries
         }
     
-    def handle_feedback(self, query: str, feedback: str, original_suggestion: str) -> Dict[str, Any]:
+    async def route(self, query: str, filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Route a query with the configured IntentRouter (the embedding classifier runs off the event loop)"""
+        if self.router.uses_embeddings:
+            route = await run_blocking(self.router.route, query)
+        else:
+            route = self.router.route(query)
+        if filters and route["intent"] not in (DOCUMENT, PHRASE):
+            # Restricting the search to a document means the question is about it
+            route = dict(route, intent=DOCUMENT, retrieve=True, method="filters")
+        logger.info(f"{self.name}: Routed query as {route['intent']} ({route['method']})")
+        return route
+    
+    async def _fetch_context(self, query: str, route: Dict[str, Any], timings: Dict[str, float] = None,
+                             filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Fetch document context if the route needs it"""
+        if not route["retrieve"]:
+            return self.retriever_agent.skipped_result(query)
+        try:
+            fetch = self.retriever_agent.fetch_context(query, route=route, filters=filters)
+            return await (self._timed(fetch, "retrieval_ms", timings) if timings is not None else fetch)
+        except Exception as e:
+            logger.error(f"{self.name}: Error during retrieval: {e}")
+            return self.retriever_agent._error_result(query, e)
+    
+    async def _timed(self, awaitable, key: str, timings: Dict[str, float]):
+        """Await a pipeline stage and record its duration in milliseconds"""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            timings[key] = round((time.perf_counter() - started) * 1000, 1)
+    
+    async def handle_feedback(self, query: str, feedback: str, original_suggestion: str,
+                              filters: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Handle user feedback and provide an improved response
         
@@ -449,33 +567,147 @@ class MultiAgentRFPAssistant:
             query: Original user query
             feedback: User feedback
             original_suggestion: The original suggestion that received feedback
+            filters: Documents and page range to search (see rag_pipeline.make_filters)
             
         Returns:
             Dictionary containing the improved response
         """
+        trace = RequestTrace("feedback", query)
         try:
             logger.info(f"{self.name}: Handling user feedback")
             
-            # Get context if needed for retrieval queries
-            retrieval_keywords = ['is there', 'does it contain', 'does the document', 'is mentioned', 'can you find', 'look for', 'search for', 'find', 'locate', 'where is', 'what does it say about']
-            is_retrieval_query = any(keyword in query.lower() for keyword in retrieval_keywords)
-            
-            if is_retrieval_query:
-                # For retrieval queries, we need to get context first
-                context_result = self.retriever_agent.retrieve(query)
-                context = context_result.get('context', '')
-                return self.rfp_editor_agent.rephrase_with_feedback(query, context, feedback, original_suggestion)
-            else:
-                # For non-retrieval queries, answer directly without context
-                return self.rfp_editor_agent.rephrase_with_feedback(query, '', feedback, original_suggestion)
+            route = trace.route = await self._timed(self.route(query, filters), "routing_ms", trace.timings)
+            retrieval_result = await self._timed(self._feedback_context(query, route, filters), "retrieval_ms", trace.timings)
+            trace.add("Retriever Agent", "Document retrieval", retrieval_result, trace.timings["retrieval_ms"])
+            revision_result = await self._timed(self.rfp_editor_agent.rephrase_with_feedback(
+                query, retrieval_result["context"], feedback, original_suggestion, route=route
+            ), "editor_generation_ms", trace.timings)
+            trace.add("RFP Editor Agent", "Revision from user feedback", revision_result, trace.timings["editor_generation_ms"])
+            if revision_result["status"] == "error":
+                trace.finish("error")
+                return {
+                    "status": "error",
+                    "error": revision_result.get("error", "Failed to revise suggestion"),
+                    "trace_id": trace.trace_id,
+                    "agent_log": trace.entries
+                }
+            trace.finish("success")
+            return {
+                "status": "success",
+                "query": query,
+                "route": route,
+                "retrieval_result": retrieval_result,
+                "improvement_result": revision_result,
+                "revision_result": revision_result,
+                "timings": trace.timings,
+                "trace_id": trace.trace_id,
+                "agent_log": trace.entries
+            }
                 
         except Exception as e:
             logger.error(f"{self.name}: Error handling feedback: {e}")
+            trace.add(self.name, "Feedback handling", {"status": "error", "error": str(e)})
+            trace.finish("error")
             return {
-                "original_query": query,
-                "improved_content": "",
-                "feedback_addressed": feedback,
                 "status": "error",
                 "error": str(e),
-                "agent_name": self.name
-            } 
\ No newline at end of file
+                "trace_id": trace.trace_id,
+                "agent_log": trace.entries
+            }
+    
+    async def _feedback_context(self, query: str, route: Dict[str, Any], filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Fetch document context for retrieval queries; other queries are answered without it"""
+        if is_retrieval_intent(route):
+            return await self.retriever_agent.fetch_context(query, route=route, filters=filters)
+        return self.retriever_agent.skipped_result(query)
+    
+    async def stream_query(self, query: str, filters: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a query through the pipeline as events.
+        
+        Yields a "metadata" event with the retrieved paragraphs and citations, then one
+        "token" event per generated token of the editor's answer, then a "done" event.
+        The retriever's separate LLM answer is not generated in streaming mode.
+        """
+        logger.info(f"{self.name}: Starting streaming query processing")
+        trace = RequestTrace("ask_stream", query)
+        route = trace.route = await self._timed(self.route(query, filters), "routing_ms", trace.timings)
+        try:
+            if route["retrieve"]:
+                fetch = self.retriever_agent.fetch_context(query, route=route, filters=filters)
+                retrieval_result = await self._timed(fetch, "retrieval_ms", trace.timings)
+            else:
+                retrieval_result = self.retriever_agent.skipped_result(query)
+        except Exception as e:
+            logger.error(f"{self.name}: Error during streaming retrieval: {e}")
+            trace.add("Retriever Agent", "Document retrieval", {"status": "error", "error": str(e)})
+            trace.finish("error")
+            yield {"type": "error", "error": f"Failed to retrieve documents: {e}"}
+            return
+        trace.add("Retriever Agent", "Document retrieval", retrieval_result, trace.timings.get("retrieval_ms"))
+        yield dict(self._metadata_event(retrieval_result), route=route, trace_id=trace.trace_id)
+        tokens = self.rfp_editor_agent.stream_analysis(query, retrieval_result["context"], route=route)
+        async for event in self._traced_generation(tokens, trace, "Content analysis and improvement"):
+            yield event
+    
+    async def stream_feedback(self, query: str, feedback: str, original_suggestion: str,
+                              filters: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a feedback revision as metadata, token and done events"""
+        logger.info(f"{self.name}: Streaming feedback revision")
+        trace = RequestTrace("feedback_stream", query)
+        try:
+            route = trace.route = await self._timed(self.route(query, filters), "routing_ms", trace.timings)
+            retrieval_result = await self._timed(self._feedback_context(query, route, filters), "retrieval_ms", trace.timings)
+        except Exception as e:
+            logger.error(f"{self.name}: Error fetching feedback context: {e}")
+            trace.add("Retriever Agent", "Document retrieval", {"status": "error", "error": str(e)})
+            trace.finish("error")
+            yield {"type": "error", "error": str(e)}
+            return
+        trace.add("Retriever Agent", "Document retrieval", retrieval_result, trace.timings["retrieval_ms"])
+        yield dict(self._metadata_event(retrieval_result), route=route, trace_id=trace.trace_id)
+        tokens = self.rfp_editor_agent.stream_rephrase(query, retrieval_result["context"], feedback, original_suggestion, route=route)
+        async for event in self._traced_generation(tokens, trace, "Revision from user feedback"):
+            yield event
+    
+    def _metadata_event(self, retrieval_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Retrieval metadata sent ahead of the first token (the packed context itself is omitted)"""
+        metadata = {key: value for key, value in retrieval_result.items() if key != "context"}
+        metadata["type"] = "metadata"
+        return metadata
+    
+    async def _traced_generation(self, tokens: AsyncIterator[str], trace: RequestTrace, action: str) -> AsyncIterator[Dict[str, Any]]:
+        """Forward generation events and record the editor step and outcome in the trace"""
+        started = time.perf_counter()
+        try:
+            async for event in self._stream_generation(tokens):
+                if event["type"] in ("done", "error"):
+                    result = {"status": "success", "improved_content": event["improved_content"]} if event["type"] == "done" \
+                        else {"status": "error", "error": event["error"]}
+                    trace.timings["editor_generation_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                    trace.add(self.rfp_editor_agent.name, action, result, trace.timings["editor_generation_ms"])
+                    trace.finish(result["status"])
+                yield event
+        finally:
+            if trace.status == "running":
+                # The client disconnected before generation finished
+                trace.finish("cancelled")
+    
+    async def _stream_generation(self, tokens: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Forward generated tokens as events and finish with the assembled content"""
+        content = []
+        try:
+            async for token in tokens:
+                content.append(token)
+                yield {"type": "token", "content": token}
+        except Exception as e:
+            logger.error(f"{self.name}: Error during streaming generation: {e}")
+            yield {"type": "error", "error": str(e)}
+            return
+        improved_content = "".join(content)
+        yield {
+            "type": "done",
+            "improved_content": improved_content,
+            "best_practices_applied": self.rfp_editor_agent._extract_applied_practices(improved_content),
+            "agent_name": self.rfp_editor_agent.name
+        }
@@ -9,10 +9,24 @@ class Config:
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:3b")
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen3:0.6b")
     TEMPERATURE = float(os.getenv("TEMPERATURE", "0.1"))
+    OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+    OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+    
+    # Directory for the SQLite caches (embeddings, LLM responses)
+    CACHE_DIR = os.getenv("CACHE_DIR", "./cache")
     
     # Vector database settings
     CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_data")
+    COLLECTION_NAME = os.getenv("COLLECTION_NAME", "rag_collection")
+    DOCUMENT_REGISTRY_PATH = os.getenv("DOCUMENT_REGISTRY_PATH", os.path.join(CHROMA_PERSIST_DIRECTORY, "documents.sqlite3"))
+    # "<model>" (sentence-transformers), "onnx:<model>" (int8 ONNX on CPU) or "ollama:<model>"
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = library default
+    EMBEDDING_NORMALIZE = os.getenv("EMBEDDING_NORMALIZE", "true").lower() == "true"
+    EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx2.onnx")
+    LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(CHROMA_PERSIST_DIRECTORY, "lexical_index.sqlite3"))
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(CACHE_DIR, "embeddings.sqlite3"))
     
     # Chunking settings - now token-based
     CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", "500"))
@@ -20,31 +34,117 @@ class Config:
     MAX_CHUNK_SIZE_TOKENS = int(os.getenv("MAX_CHUNK_SIZE_TOKENS", "1000"))
     MIN_CHUNK_SIZE_TOKENS = int(os.getenv("MIN_CHUNK_SIZE_TOKENS", "100"))
     
+    # Sentence splitting for chunking: "fast" (built-in, offline) or "nltk" (punkt, downloaded on first use)
+    SENTENCE_SEGMENTER = os.getenv("SENTENCE_SEGMENTER", "fast")
+    
     # Legacy character-based settings (for backward compatibility)
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))
     OVERLAP = int(os.getenv("OVERLAP", "50"))
     
     # Retrieval settings
     TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", "3"))
-    SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+    # "hybrid" fuses vector and BM25 results; "vector" runs a similarity search only;
+    # "full_corpus" sends every chunk (tiny corpora only)
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+    # Hybrid retrieval: reciprocal-rank fusion of the top HYBRID_CANDIDATES from each retriever
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+    HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B = float(os.getenv("BM25_B", "0.75"))
+    # Cross-encoder reranking: retrieve RERANK_CANDIDATES chunks (hard cap RERANK_MAX_CANDIDATES)
+    # and keep the TOP_K_RESULTS best by cross-encoder score
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+    RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "50"))
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_CACHE_ENTRIES = int(os.getenv("RERANK_CACHE_ENTRIES", "4096"))  # cached (query, chunk) scores
+    # Most chunks returned by an exact phrase lookup ("is there ...", "does it contain ...")
+    PHRASE_MAX_HITS = int(os.getenv("PHRASE_MAX_HITS", "20"))
+    # Decides which pipeline stages a query needs: "keywords" (precompiled keyword match), "embedding"
+    # (keywords, then a nearest-example classifier) or "off" (retrieve context for every query)
+    INTENT_ROUTING = os.getenv("INTENT_ROUTING", "keywords")
+    # "concurrent" generates the retriever answer and editor analysis in parallel; "sequential" does not
+    PIPELINE_MODE = os.getenv("PIPELINE_MODE", "concurrent")
+    # Cosine similarity below which retrieved chunks are not sent to the LLM
+    SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.2"))
+    
+    # Context packing settings
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1.0 = relevance only, 0.0 = diversity only
+    # Chunks retrieved for the packer (at least TOP_K_RESULTS), which picks among them down to the token budget
+    CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "20"))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+    # Per-model overrides, e.g. "llama3.2:3b=6000,qwen3:0.6b=3000"
+    CONTEXT_TOKEN_BUDGETS = os.getenv("CONTEXT_TOKEN_BUDGETS", "")
     
     # API settings
     HOST = os.getenv("HOST", "0.0.0.0")
     PORT = int(os.getenv("PORT", "8000"))
+    # Preload the embedder, vector index and Ollama model in the background at startup (see /ready)
+    WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+    # Threads for embedding and ChromaDB calls made from request handlers
+    BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "4"))
     
     # File upload settings
     UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
     MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", "52428800"))  # 50MB
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "1048576"))  # bytes copied to disk per read
     ALLOWED_EXTENSIONS = {".pdf", ".txt", ".docx"}
     
+    # PDF extraction: documents with at least PDF_PARALLEL_MIN_PAGES pages are extracted by a process pool
+    PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+    
+    # Ingestion worker settings
+    INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+    INGESTION_NICE = int(os.getenv("INGESTION_NICE", "10"))  # CPU priority offset for worker processes
+    INGESTION_BATCH_SIZE = int(os.getenv("INGESTION_BATCH_SIZE", "64"))  # chunks per embedding batch and upsert
+    INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", "4"))  # batches buffered between pipeline stages
+    INGESTION_DB_PATH = os.getenv("INGESTION_DB_PATH", os.path.join(CHROMA_PERSIST_DIRECTORY, "jobs.sqlite3"))
+    
+    # LLM response cache settings (stored under CACHE_DIR)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+    
+    # Semantic answer cache settings (near-duplicate questions)
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_COLLECTION = os.getenv("SEMANTIC_CACHE_COLLECTION", "query_cache")
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+    SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+    
     # Logging settings
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    # Response size: compact responses cut chunk texts to snippets, and larger bodies are gzip-compressed
+    COMPACT_SNIPPET_CHARS = int(os.getenv("COMPACT_SNIPPET_CHARS", "160"))
+    GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+    # Recent per-request traces kept for GET /debug/traces (0 keeps none)
+    TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "100"))
     
     @classmethod
     def get_ollama_model(cls) -> str:
         """Get the configured Ollama model"""
         return cls.OLLAMA_MODEL
     
+    @classmethod
+    def get_embedding_model(cls) -> str:
+        """Get the configured embedding model"""
+        return cls.EMBEDDING_MODEL
+    
+    @classmethod
+    def get_chroma_path(cls) -> str:
+        """Get the ChromaDB persistence directory"""
+        return cls.CHROMA_PERSIST_DIRECTORY
+    
+    @classmethod
+    def get_collection_name(cls) -> str:
+        """Get the ChromaDB collection name"""
+        return cls.COLLECTION_NAME
+    
     @classmethod
     def get_chunk_size_tokens(cls) -> int:
         """Get the configured chunk size in tokens"""
@@ -55,6 +155,31 @@ class Config:
         """Get the configured overlap size in tokens"""
         return cls.OVERLAP_TOKENS
     
+    @classmethod
+    def get_retrieval_mode(cls) -> str:
+        """Get the configured retrieval mode"""
+        return cls.RETRIEVAL_MODE.lower()
+    
+    @classmethod
+    def get_pipeline_mode(cls) -> str:
+        """Get the configured orchestration mode for process_query"""
+        return cls.PIPELINE_MODE.lower()
+    
+    @classmethod
+    def get_context_token_budget(cls, model: Optional[str] = None) -> int:
+        """Get the context token budget for a model, falling back to CONTEXT_TOKEN_BUDGET"""
+        model = model or cls.get_ollama_model()
+        for entry in cls.CONTEXT_TOKEN_BUDGETS.split(","):
+            name, _, tokens = entry.strip().rpartition("=")
+            if name == model and tokens.strip().isdigit():
+                return int(tokens)
+        return cls.CONTEXT_TOKEN_BUDGET
+    
+    @classmethod
+    def get_context_candidates(cls, top_k: Optional[int] = None) -> int:
+        """Get how many chunks to retrieve for context packing: CONTEXT_CANDIDATES, but at least top_k"""
+        return max(top_k or cls.TOP_K_RESULTS, cls.CONTEXT_CANDIDATES)
+    
     @classmethod
     def validate_config(cls) -> bool:
         """Validate configuration settings"""
@@ -62,8 +187,46 @@ class Config:
             raise ValueError("CHUNK_SIZE_TOKENS must be positive")
         if cls.OVERLAP_TOKENS >= cls.CHUNK_SIZE_TOKENS:
             raise ValueError("OVERLAP_TOKENS must be less than CHUNK_SIZE_TOKENS")
+        if cls.SENTENCE_SEGMENTER not in ("fast", "nltk"):
+            raise ValueError("SENTENCE_SEGMENTER must be 'fast' or 'nltk'")
         if cls.TOP_K_RESULTS <= 0:
             raise ValueError("TOP_K_RESULTS must be positive")
+        if cls.get_retrieval_mode() not in ("hybrid", "vector", "full_corpus"):
+            raise ValueError("RETRIEVAL_MODE must be 'hybrid', 'vector' or 'full_corpus'")
+        if cls.HYBRID_CANDIDATES <= 0 or cls.RRF_K <= 0:
+            raise ValueError("HYBRID_CANDIDATES and RRF_K must be positive")
+        if cls.INTENT_ROUTING.lower() not in ("keywords", "embedding", "off"):
+            raise ValueError("INTENT_ROUTING must be 'keywords', 'embedding' or 'off'")
+        if min(cls.RERANK_CANDIDATES, cls.RERANK_MAX_CANDIDATES, cls.RERANK_BATCH_SIZE, cls.RERANK_CACHE_ENTRIES) <= 0:
+            raise ValueError("RERANK_CANDIDATES, RERANK_MAX_CANDIDATES, RERANK_BATCH_SIZE and RERANK_CACHE_ENTRIES must be positive")
+        if cls.PHRASE_MAX_HITS <= 0:
+            raise ValueError("PHRASE_MAX_HITS must be positive")
+        if cls.HYBRID_VECTOR_WEIGHT < 0 or cls.HYBRID_LEXICAL_WEIGHT < 0:
+            raise ValueError("Hybrid fusion weights must not be negative")
+        if cls.get_pipeline_mode() not in ("concurrent", "sequential"):
+            raise ValueError("PIPELINE_MODE must be 'concurrent' or 'sequential'")
+        if cls.CONTEXT_TOKEN_BUDGET <= 0:
+            raise ValueError("CONTEXT_TOKEN_BUDGET must be positive")
+        if cls.CONTEXT_CANDIDATES <= 0:
+            raise ValueError("CONTEXT_CANDIDATES must be positive")
+        if cls.MMR_LAMBDA < 0 or cls.MMR_LAMBDA > 1:
+            raise ValueError("MMR_LAMBDA must be between 0 and 1")
+        if cls.BLOCKING_WORKERS <= 0:
+            raise ValueError("BLOCKING_WORKERS must be positive")
+        if cls.LLM_CACHE_MEMORY_ENTRIES <= 0 or cls.LLM_CACHE_MAX_ENTRIES <= 0:
+            raise ValueError("LLM cache sizes must be positive")
+        if cls.SEMANTIC_CACHE_THRESHOLD <= 0 or cls.SEMANTIC_CACHE_THRESHOLD > 1:
+            raise ValueError("SEMANTIC_CACHE_THRESHOLD must be in (0, 1]")
+        if cls.INGESTION_WORKERS <= 0 or cls.INGESTION_BATCH_SIZE <= 0 or cls.INGESTION_QUEUE_SIZE <= 0:
+            raise ValueError("INGESTION_WORKERS, INGESTION_BATCH_SIZE and INGESTION_QUEUE_SIZE must be positive")
+        if cls.EMBEDDING_BATCH_SIZE <= 0 or cls.EMBEDDING_THREADS < 0:
+            raise ValueError("EMBEDDING_BATCH_SIZE must be positive and EMBEDDING_THREADS non-negative")
+        if cls.COMPACT_SNIPPET_CHARS <= 0 or cls.GZIP_MIN_BYTES < 0:
+            raise ValueError("COMPACT_SNIPPET_CHARS must be positive and GZIP_MIN_BYTES non-negative")
+        if cls.MAX_FILE_SIZE <= 0 or cls.UPLOAD_CHUNK_SIZE <= 0:
+            raise ValueError("MAX_FILE_SIZE and UPLOAD_CHUNK_SIZE must be positive")
+        if cls.TRACE_BUFFER_SIZE < 0:
+            raise ValueError("TRACE_BUFFER_SIZE must not be negative")
         if cls.TEMPERATURE < 0 or cls.TEMPERATURE > 2:
             raise ValueError("TEMPERATURE must be between 0 and 2")
         return True 
\ No newline at end of file
@@ -0,0 +1,93 @@
+import logging
+from typing import List, Dict, Any
+from .config import Config
+from pdf_load import count_tokens
+from rag_pipeline import cosine_similarity
+
+logger = logging.getLogger(__name__)
+
+# Tokens spent on the "[Page N] " label and the blank line between chunks
+LABEL_OVERHEAD_TOKENS = 8
+
+class ContextPacker:
+    """Assemble prompt context from retrieved chunks within a per-model token budget"""
+
+    def __init__(self, token_budget: int = None, similarity_threshold: float = None, mmr_lambda: float = None):
+        self.token_budget = token_budget
+        self.similarity_threshold = Config.SIMILARITY_THRESHOLD if similarity_threshold is None else similarity_threshold
+        self.mmr_lambda = Config.MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+
+    def pack(self, chunks: List[Dict[str, Any]], model: str = None) -> Dict[str, Any]:
+        """
+        Select chunks for the prompt.
+
+        Chunks scoring below the similarity threshold are dropped, the rest are picked by
+        maximal marginal relevance until the token budget for the model is full.
+
+        Returns:
+            Dictionary with the formatted context, the selected chunks and token accounting
+        """
+        budget = self.token_budget or Config.get_context_token_budget(model or Config.get_ollama_model())
+        candidates = []
+        for chunk in chunks or []:
+            if not isinstance(chunk, dict) or not chunk.get('text'):
+                continue
+            score = chunk.get('score')
+            # Exact keyword matches from hybrid retrieval are kept even when their embedding is a weak match
+            if score is not None and score < self.similarity_threshold and chunk.get('bm25') is None:
+                continue
+            tokens = chunk.get('tokens') or count_tokens(chunk['text'])
+            candidates.append((chunk, tokens + LABEL_OVERHEAD_TOKENS))
+
+        selected = []
+        used_tokens = 0
+        while candidates:
+            best_idx = None
+            best_value = None
+            for idx, (chunk, cost) in enumerate(candidates):
+                if used_tokens + cost > budget:
+                    continue
+                value = self._mmr_value(chunk, [c for c, _ in selected])
+                if best_value is None or value > best_value:
+                    best_idx, best_value = idx, value
+            if best_idx is None:
+                break
+            chunk, cost = candidates.pop(best_idx)
+            selected.append((chunk, cost))
+            used_tokens += cost
+
+        selected_chunks = [
+            {key: value for key, value in chunk.items() if key != 'embedding'}
+            for chunk, _ in selected
+        ]
+        dropped = len(chunks or []) - len(selected_chunks)
+        logger.info(f"ContextPacker: packed {len(selected_chunks)} chunks, {used_tokens}/{budget} tokens, dropped {dropped}")
+        return {
+            "context": self.format_context(selected_chunks),
+            "chunks": selected_chunks,
+            "tokens": used_tokens,
+            "token_budget": budget,
+            "dropped": dropped
+        }
+
+    def _mmr_value(self, chunk: Dict[str, Any], selected: List[Dict[str, Any]]) -> float:
+        """Relevance minus the similarity to the closest already selected chunk"""
+        # Hybrid results carry their fused rank score as "relevance"
+        relevance = chunk.get('relevance', chunk.get('score'))
+        if relevance is None:
+            relevance = 0.0
+        embedding = chunk.get('embedding')
+        redundancy = 0.0
+        if embedding is not None:
+            for other in selected:
+                other_embedding = other.get('embedding')
+                if other_embedding is not None:
+                    redundancy = max(redundancy, cosine_similarity(embedding, other_embedding))
+        return self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+
+    @staticmethod
+    def format_context(chunks: List[Dict[str, Any]]) -> str:
+        """Join chunk texts, prefixing each with its page so the LLM can cite it"""
+        return "\n\n".join(
+            f"[Page {chunk.get('page', '?')}] {chunk['text']}" for chunk in chunks
+        )
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Optional
+from .config import Config
+
+def file_content_hash(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class DocumentRegistry:
+    """
+    SQLite registry of ingested documents.
+
+    A document is identified by its filename and keeps a stable document_id across uploads;
+    each upload with new content bumps its version. The registry records the content hash
+    of the current version and the chunk IDs it owns in ChromaDB.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.DOCUMENT_REGISTRY_PATH
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "document_id TEXT PRIMARY KEY, filename TEXT NOT NULL UNIQUE, content_hash TEXT NOT NULL, "
+            "version INTEGER NOT NULL, chunk_ids TEXT NOT NULL, file_path TEXT, "
+            "uploaded_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_content_hash ON documents (content_hash)")
+        self._conn.commit()
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Return the document whose current version has this content hash"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE content_hash = ?", (content_hash,)).fetchone()
+        return self._to_dict(row)
+
+    def get_by_filename(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Return the registered document for a filename"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE filename = ?", (filename,)).fetchone()
+        return self._to_dict(row)
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Return a registered document by ID"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE document_id = ?", (document_id,)).fetchone()
+        return self._to_dict(row)
+
+    def list_documents(self) -> List[Dict[str, Any]]:
+        """All registered documents, newest first (without their chunk ID lists)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM documents ORDER BY updated_at DESC").fetchall()
+        documents = []
+        for row in rows:
+            document = self._to_dict(row)
+            document["num_chunks"] = len(document.pop("chunk_ids"))
+            documents.append(document)
+        return documents
+
+    def next_version(self, filename: str) -> Dict[str, Any]:
+        """Document ID and version number the next upload of filename should be stored under"""
+        existing = self.get_by_filename(filename)
+        if existing:
+            return {"document_id": existing["document_id"], "version": existing["version"] + 1}
+        return {"document_id": uuid.uuid4().hex, "version": 1}
+
+    def commit_version(self, document_id: str, filename: str, content_hash: str, version: int,
+                       chunk_ids: List[str], file_path: str = None) -> List[str]:
+        """
+        Make a new version current in one transaction.
+
+        Returns:
+            Chunk IDs owned by the previous version that the new version no longer uses
+        """
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                row = self._conn.execute("SELECT chunk_ids FROM documents WHERE document_id = ?", (document_id,)).fetchone()
+                previous = json.loads(row["chunk_ids"]) if row else []
+                self._conn.execute(
+                    "INSERT INTO documents (document_id, filename, content_hash, version, chunk_ids, file_path, uploaded_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(document_id) DO UPDATE SET content_hash = excluded.content_hash, version = excluded.version, "
+                    "chunk_ids = excluded.chunk_ids, file_path = excluded.file_path, updated_at = excluded.updated_at",
+                    (document_id, filename, content_hash, version, json.dumps(chunk_ids), file_path, now, now)
+                )
+        current = set(chunk_ids)
+        return [chunk_id for chunk_id in previous if chunk_id not in current]
+
+    @staticmethod
+    def _to_dict(row) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        document = dict(row)
+        document["chunk_ids"] = json.loads(document["chunk_ids"])
+        return document
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_document_registry() -> DocumentRegistry:
+    """Get the shared document registry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = DocumentRegistry()
+    return _registry
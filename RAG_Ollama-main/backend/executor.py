@@ -0,0 +1,33 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .config import Config
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get the bounded thread pool used for embedding and ChromaDB calls"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=Config.BLOCKING_WORKERS,
+                    thread_name_prefix="rag-blocking"
+                )
+    return _executor
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking or CPU-bound call off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+def shutdown_executor():
+    """Stop the blocking-call thread pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
@@ -0,0 +1,501 @@
+import logging
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Iterable, Iterator
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Job statuses; "queued" and "running" jobs are resumed after a restart
+ACTIVE_STATUSES = ("queued", "running")
+
+class JobCancelled(Exception):
+    """Raised inside a worker when its job has been cancelled"""
+
+class JobStore:
+    """Persistent SQLite table of ingestion jobs, shared by the API process and the workers"""
+
+    def __init__(self, path: str = None):
+        self.path = path or Config.INGESTION_DB_PATH
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "task_id TEXT PRIMARY KEY, file_path TEXT NOT NULL, filename TEXT NOT NULL, content_hash TEXT, "
+            "status TEXT NOT NULL, stage TEXT NOT NULL, pages_done INTEGER DEFAULT 0, pages_total INTEGER DEFAULT 0, "
+            "chunks_total INTEGER DEFAULT 0, chunks_embedded INTEGER DEFAULT 0, cancel_requested INTEGER DEFAULT 0, "
+            "document_id TEXT, version INTEGER, error TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.commit()
+
+    def create(self, file_path: str, filename: str, content_hash: str = None) -> str:
+        """Insert a queued job and return its task_id"""
+        task_id = str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (task_id, file_path, filename, content_hash, status, stage, created_at) "
+                "VALUES (?, ?, ?, ?, 'queued', 'queued', ?)",
+                (task_id, file_path, filename, content_hash, time.time())
+            )
+            self._conn.commit()
+        return task_id
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job with derived queue and run timings"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+        return self._to_dict(row)
+
+    def list_jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent jobs first"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def active_jobs(self) -> List[Dict[str, Any]]:
+        """Jobs that were queued or running, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({','.join('?' for _ in ACTIVE_STATUSES)}) ORDER BY created_at",
+                ACTIVE_STATUSES
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def update(self, task_id: str, **fields):
+        """Set columns on a job"""
+        if not fields:
+            return
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE task_id = ?", list(fields.values()) + [task_id])
+            self._conn.commit()
+
+    def finish(self, task_id: str, status: str, error: str = None, **fields):
+        """Mark a job as finished with the given terminal status"""
+        self.update(task_id, status=status, stage="done", error=error, finished_at=time.time(), **fields)
+
+    def request_cancel(self, task_id: str) -> bool:
+        """Flag an active job for cancellation; returns False if it is unknown or already finished"""
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET cancel_requested = 1 WHERE task_id = ? AND status IN ({','.join('?' for _ in ACTIVE_STATUSES)})",
+                (task_id,) + ACTIVE_STATUSES
+            )
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def is_cancel_requested(self, task_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def check_cancelled(self, task_id: str):
+        """Raise JobCancelled if the job has been cancelled"""
+        if self.is_cancel_requested(task_id):
+            raise JobCancelled(task_id)
+
+    @staticmethod
+    def _to_dict(row) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        now = time.time()
+        started_at, finished_at = job["started_at"], job["finished_at"]
+        job["queue_seconds"] = round((started_at or finished_at or now) - job["created_at"], 3)
+        job["run_seconds"] = round((finished_at or now) - started_at, 3) if started_at else None
+        return job
+
+# Bounded queue the worker processes stream embedded batches through; set by _worker_init
+_results_queue = None
+
+def _worker_init(results_queue):
+    """Run ingestion workers at lower CPU priority so queries stay responsive"""
+    global _results_queue
+    _results_queue = results_queue
+    try:
+        os.nice(Config.INGESTION_NICE)
+    except (AttributeError, OSError):
+        pass
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _put_until_stopped(target: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put into a bounded queue, giving up once stop is set; returns False if it gave up"""
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _produce_chunk_batches(batches: Iterator[List[Dict[str, Any]]], out: queue.Queue, stop: threading.Event):
+    """Parser thread: run pages -> paragraphs -> chunks and hand batches to the embedding stage"""
+    try:
+        for batch in batches:
+            if not _put_until_stopped(out, batch, stop):
+                return
+        _put_until_stopped(out, None, stop)
+    except BaseException as e:
+        _put_until_stopped(out, e, stop)
+
+def stream_document(task_id: str, file_path: str) -> int:
+    """
+    Worker-process stage: iter_sections -> iter_chunks_with_metadata -> embedding batches.
+
+    Parsing runs in a background thread, one bounded queue ahead of embedding, and every
+    embedded batch is sent to the API process through the bounded results queue, so memory
+    stays flat regardless of document size. ChromaDB is not touched here; the API process
+    upserts each batch as it arrives. The stream always ends with a "completed", "cancelled"
+    or "failed" message. Returns the number of chunks sent.
+    """
+    from pdf_load import iter_sections, iter_chunks_with_metadata
+    from rag_pipeline import embed_texts
+
+    store = JobStore()
+    store.update(task_id, status="running", stage="extracting", started_at=time.time())
+    stop = threading.Event()
+    chunks_sent = 0
+
+    def on_page(pages_done: int, pages_total: int):
+        store.update(task_id, pages_done=pages_done, pages_total=pages_total)
+        store.check_cancelled(task_id)
+
+    try:
+        chunks = iter_chunks_with_metadata(
+            iter_sections(file_path, progress=on_page),
+            max_tokens=Config.get_chunk_size_tokens(),
+            overlap_tokens=Config.get_overlap_tokens()
+        )
+        parsed = queue.Queue(maxsize=Config.INGESTION_QUEUE_SIZE)
+        parser = threading.Thread(
+            target=_produce_chunk_batches,
+            args=(batched(chunks, Config.INGESTION_BATCH_SIZE), parsed, stop),
+            name=f"ingestion-parser-{task_id}",
+            daemon=True
+        )
+        parser.start()
+        while True:
+            batch = parsed.get()
+            if batch is None:
+                break
+            if isinstance(batch, BaseException):
+                raise batch
+            store.check_cancelled(task_id)
+            if chunks_sent == 0:
+                store.update(task_id, stage="embedding")
+            embeddings = embed_texts([chunk['text'] for chunk in batch])
+            _results_queue.put(("batch", task_id, batch, embeddings))
+            chunks_sent += len(batch)
+            store.update(task_id, chunks_total=chunks_sent, chunks_embedded=chunks_sent)
+        _results_queue.put(("completed", task_id, None))
+    except JobCancelled:
+        _results_queue.put(("cancelled", task_id, None))
+    except Exception as e:
+        _results_queue.put(("failed", task_id, str(e)))
+    finally:
+        stop.set()
+    return chunks_sent
+
+class IngestionQueue:
+    """
+    Ingestion subsystem: a persistent job table, a process pool that streams embedded chunk
+    batches, and a single writer thread that upserts each batch into ChromaDB as it arrives.
+    """
+
+    def __init__(self, store: JobStore = None, workers: int = None):
+        self.store = store or JobStore()
+        self.workers = workers or Config.INGESTION_WORKERS
+        self._pool = None
+        self._results = None
+        self._writer = None
+        self._stopping = threading.Event()
+        self._exited = queue.Queue()
+        self._streams = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            context = multiprocessing.get_context("spawn")
+            self._results = context.Queue(maxsize=Config.INGESTION_QUEUE_SIZE)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_worker_init,
+                initargs=(self._results,)
+            )
+            self._writer = threading.Thread(target=self._write_loop, name="ingestion-writer", daemon=True)
+            self._writer.start()
+        return self._pool
+
+    def submit(self, file_path: str, filename: str, content_hash: str = None) -> str:
+        """Queue a PDF for ingestion and return its task_id"""
+        task_id = self.store.create(file_path, filename, content_hash)
+        self._dispatch(task_id, file_path)
+        logger.info(f"Ingestion: queued {filename} as task {task_id}")
+        return task_id
+
+    def resume(self):
+        """Requeue jobs that were queued or running when the process stopped"""
+        for job in self.store.active_jobs():
+            logger.info(f"Ingestion: resuming task {job['task_id']} ({job['filename']})")
+            if job["cancel_requested"]:
+                self.store.finish(job["task_id"], "cancelled")
+                continue
+            self.store.update(job["task_id"], status="queued", stage="queued", pages_done=0, chunks_total=0, chunks_embedded=0)
+            if job["document_id"] and job["version"]:
+                # Chunks the interrupted run already wrote stay hidden until the rerun commits
+                from rag_pipeline import set_version_visibility
+                set_version_visibility(job["document_id"], hide=[job["version"]])
+            self._dispatch(job["task_id"], job["file_path"])
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(task_id)
+
+    def cancel(self, task_id: str) -> bool:
+        """Cancel a queued or running job; returns False if it was already finished or unknown"""
+        if not self.store.request_cancel(task_id):
+            return False
+        with self._lock:
+            future = self._futures.get(task_id)
+        if future is not None and future.cancel():
+            self.store.finish(task_id, "cancelled")
+        return True
+
+    def shutdown(self):
+        """Stop dispatching; unfinished jobs stay queued in the job table for the next start"""
+        self._stopping.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch(self, task_id: str, file_path: str):
+        future = self._get_pool().submit(stream_document, task_id, file_path)
+        with self._lock:
+            self._futures[task_id] = future
+        future.add_done_callback(lambda done: self._exited.put((task_id, done)))
+
+    def _write_loop(self):
+        """Writer thread: apply streamed batches and end-of-stream messages in arrival order"""
+        while not self._stopping.is_set():
+            try:
+                kind, task_id, *payload = self._results.get(timeout=0.5)
+            except queue.Empty:
+                self._reap_exited()
+                continue
+            except (EOFError, OSError):
+                break
+            try:
+                if kind == "batch":
+                    self._write_batch(task_id, *payload)
+                else:
+                    self._close_stream(task_id, kind, payload[0])
+            except Exception as e:
+                logger.error(f"Ingestion: task {task_id} failed while indexing: {e}")
+                try:
+                    # Stop the worker and roll back what this job already upserted
+                    self.store.update(task_id, cancel_requested=1)
+                    self._close_stream(task_id, "failed", str(e))
+                except Exception as cleanup_error:
+                    logger.error(f"Ingestion: cleanup for task {task_id} failed: {cleanup_error}")
+                    self._streams.pop(task_id, None)
+
+    def _reap_exited(self):
+        """Fail jobs whose worker process died without ending its stream"""
+        while True:
+            try:
+                task_id, future = self._exited.get_nowait()
+            except queue.Empty:
+                return
+            with self._lock:
+                self._futures.pop(task_id, None)
+            # stream_document reports its own errors, so an exception here means the worker crashed
+            if future.cancelled() or future.exception() is None:
+                continue
+            logger.error(f"Ingestion: worker for task {task_id} exited: {future.exception()}")
+            try:
+                self._close_stream(task_id, "failed", str(future.exception()))
+            except Exception as e:
+                logger.error(f"Ingestion: cleanup for task {task_id} failed: {e}")
+                self._streams.pop(task_id, None)
+
+    def _open_stream(self, task_id: str) -> Dict[str, Any]:
+        """
+        Reserve the document version a job writes under, or mark the job as skipped.
+
+        The version is hidden from retrieval until _commit makes it current.
+        """
+        from rag_pipeline import set_version_visibility
+        from .document_registry import get_document_registry, file_content_hash
+
+        job = self.store.get(task_id)
+        registry = get_document_registry()
+        content_hash = job["content_hash"] or file_content_hash(job["file_path"])
+        in_flight = [stream for stream in self._streams.values() if not stream["skipped"]]
+        existing = registry.find_by_hash(content_hash) or next(
+            (stream for stream in in_flight if stream["content_hash"] == content_hash), None
+        )
+        if existing:
+            logger.info(f"Ingestion: {job['filename']} is unchanged (document {existing['document_id']}), skipping")
+            # Stop the worker; its remaining batches are ignored
+            self.store.update(task_id, cancel_requested=1)
+            self.store.finish(task_id, "skipped", document_id=existing["document_id"], version=existing["version"])
+            stream = {"skipped": True}
+        else:
+            target = registry.next_version(job["filename"])
+            for other in in_flight:
+                if other["filename"] == job["filename"]:
+                    target = {"document_id": other["document_id"], "version": max(target["version"], other["version"] + 1)}
+            self.store.update(task_id, document_id=target["document_id"], version=target["version"])
+            set_version_visibility(target["document_id"], hide=[target["version"]])
+            stream = {
+                "skipped": False,
+                "document_id": target["document_id"],
+                "version": target["version"],
+                "filename": job["filename"],
+                "uploaded_at": job["created_at"],
+                "file_path": job["file_path"],
+                "content_hash": content_hash,
+                "ids": {},
+                "chunks_written": 0
+            }
+        self._streams[task_id] = stream
+        return stream
+
+    def _write_batch(self, task_id: str, chunks: List[Dict[str, Any]], embeddings: List[List[float]]):
+        """
+        Upsert one embedded batch under the job's reserved (hidden) document version.
+
+        Chunk IDs are namespaced by document and version, so a new version never overwrites
+        the chunks or metadata of the version queries are still served from.
+        """
+        from rag_pipeline import add_to_vector_db, make_chunk_id
+
+        if self.store.is_cancel_requested(task_id):
+            return
+        stream = self._streams.get(task_id) or self._open_stream(task_id)
+        if stream["skipped"]:
+            return
+        texts = [chunk['text'] for chunk in chunks]
+        ids = [make_chunk_id(text, namespace=f"{stream['document_id']}:{stream['version']}") for text in texts]
+        metadatas = [{
+            'page': chunk['page'],
+            'para': chunk['para'],
+            'section': chunk.get('section') or "",
+            'tokens': chunk['tokens'],
+            'char_start': chunk['char_start'],
+            'char_end': chunk['char_end'],
+            'document_id': stream["document_id"],
+            'filename': stream["filename"],
+            'uploaded_at': stream["uploaded_at"],
+            'version': stream["version"],
+            'content_hash': stream["content_hash"],
+            'chunk_index': stream["chunks_written"] + offset
+        } for offset, chunk in enumerate(chunks)]
+        add_to_vector_db(texts, ids, metadatas, embeddings=embeddings)
+        stream["ids"].update(dict.fromkeys(ids))
+        stream["chunks_written"] += len(chunks)
+
+    def _close_stream(self, task_id: str, outcome: str, error: Optional[str]):
+        """Commit a finished stream, or remove what a cancelled or failed one already upserted"""
+        job = self.store.get(task_id)
+        if job is None or job["status"] not in ACTIVE_STATUSES:
+            # Already skipped or finished by the writer; late messages are ignored
+            self._streams.pop(task_id, None)
+            return
+        stream = self._streams.get(task_id)
+        if stream is None and outcome == "completed":
+            # A document without any chunks still gets a registry entry
+            stream = self._open_stream(task_id)
+            if stream["skipped"]:
+                self._streams.pop(task_id, None)
+                return
+        if outcome == "completed" and not self.store.is_cancel_requested(task_id):
+            self._commit(task_id, stream)
+        else:
+            if stream is not None:
+                self._discard(stream)
+            if outcome == "failed":
+                logger.error(f"Ingestion: task {task_id} failed: {error}")
+                self.store.finish(task_id, "failed", error=error)
+            else:
+                logger.info(f"Ingestion: task {task_id} cancelled")
+                self.store.finish(task_id, "cancelled")
+        self._streams.pop(task_id, None)
+
+    def _commit(self, task_id: str, stream: Dict[str, Any]):
+        """
+        Make the streamed version current and remove the previous version's chunks.
+
+        Retrieval switches from the previous version to the new one in a single visibility
+        change, and the previous version stays hidden until its chunks are deleted.
+        """
+        from rag_pipeline import delete_from_vector_db, set_version_visibility
+        from .document_registry import get_document_registry
+
+        registry = get_document_registry()
+        self.store.update(task_id, stage="indexing")
+        current = registry.get(stream["document_id"])
+        if current and current["version"] >= stream["version"]:
+            # A newer upload of the same file finished first
+            self._discard(stream)
+            self.store.finish(task_id, "skipped", error=f"superseded by version {current['version']}")
+            return
+        ids = list(stream["ids"])
+        stale_ids = registry.commit_version(stream["document_id"], stream["filename"], stream["content_hash"],
+                                            stream["version"], ids, stream["file_path"])
+        previous = [current["version"]] if current else []
+        set_version_visibility(stream["document_id"], hide=previous, show=[stream["version"]])
+        delete_from_vector_db(stale_ids)
+        set_version_visibility(stream["document_id"], show=previous)
+        if current and current.get("file_path") and current["file_path"] != stream["file_path"]:
+            # Uploads are stored under unique names, so the previous version's file is no longer needed
+            try:
+                os.remove(current["file_path"])
+            except OSError:
+                pass
+        self.store.finish(task_id, "completed")
+        logger.info(f"Ingestion: task {task_id} indexed {stream['filename']} as document {stream['document_id']} "
+                    f"v{stream['version']}: {len(ids)} chunks upserted, {len(stale_ids)} stale chunks removed")
+
+    def _discard(self, stream: Dict[str, Any]):
+        """Delete the chunks an unfinished stream upserted and stop hiding its version"""
+        from rag_pipeline import delete_from_vector_db, set_version_visibility
+        from .document_registry import get_document_registry
+
+        current = get_document_registry().get(stream["document_id"])
+        owned = set(current["chunk_ids"]) if current else set()
+        delete_from_vector_db([chunk_id for chunk_id in stream["ids"] if chunk_id not in owned])
+        set_version_visibility(stream["document_id"], show=[stream["version"]])
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_ingestion_queue() -> IngestionQueue:
+    """Get the shared ingestion queue"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = IngestionQueue()
+    return _queue
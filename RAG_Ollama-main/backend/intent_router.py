@@ -0,0 +1,140 @@
+import logging
+import re
+import threading
+from typing import Dict, Any, Optional, Tuple
+from .config import Config
+from rag_pipeline import embed_texts, embed_query, cosine_similarity
+
+logger = logging.getLogger(__name__)
+
+# Intents, from cheapest to most expensive pipeline
+GENERAL = "general"    # RFP advice: no retrieval, the editor answers alone
+PHRASE = "phrase"      # "is there / does it contain X": exact phrase lookup, the editor phrases the answer
+DOCUMENT = "document"  # question about the uploaded documents: retrieval and both agents
+
+# Phrasings that ask for content of the uploaded documents
+RETRIEVAL_KEYWORDS = [
+    'is there', 'does it contain', 'does the document', 'is mentioned', 'can you find', 'look for',
+    'search for', 'find', 'locate', 'where is', 'what does it say about'
+]
+DOCUMENT_REFERENCES = [
+    'the document', 'this document', 'the pdf', 'this pdf', 'the uploaded', 'this rfp', 'our rfp',
+    'my rfp', 'according to', 'on page', 'in section'
+]
+
+# All keywords in one alternation, longest first, matched on word boundaries in a single pass
+KEYWORD_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(keyword) for keyword in sorted(RETRIEVAL_KEYWORDS + DOCUMENT_REFERENCES, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+QUOTED_PHRASE = re.compile(r'["“]([^"”]{2,200})["”]')
+PHRASE_QUESTION = re.compile(
+    r"^\s*(?:is there (?:any |an? )?(?:mention of |reference to )?"
+    r"|does (?:it|the document|the rfp|this document) (?:contain|mention|include) (?:any |an? )?"
+    r"|can you find |search for |look for )"
+    r"(?P<phrase>.+?)\s*(?:in (?:it|the document|the rfp|this document))?[\s?.!]*$",
+    re.IGNORECASE
+)
+
+# Example queries for the optional embedding classifier
+DOCUMENT_EXAMPLES = [
+    "What are the evaluation criteria in this RFP?",
+    "When are proposals due?",
+    "What does the scope of work cover?",
+    "Summarize the payment terms of the contract.",
+    "Which deliverables does the vendor have to provide?",
+    "What insurance requirements are listed?",
+]
+GENERAL_EXAMPLES = [
+    "How do I write a good RFP?",
+    "What are best practices for RFP evaluation criteria?",
+    "Explain what a statement of work is.",
+    "How long should an RFP response period be?",
+    "What is the difference between an RFP and an RFQ?",
+    "Give me tips for writing measurable requirements.",
+]
+
+def extract_phrase_query(query: str) -> Tuple[Optional[str], bool]:
+    """
+    Phrase to look up for a phrase-existence question.
+
+    Returns:
+        (phrase, quoted): the quoted text if the query quotes one, else the object of a
+        "is there / does it contain / search for" question; (None, False) for other queries
+    """
+    quoted = QUOTED_PHRASE.search(query)
+    if quoted:
+        return quoted.group(1).strip(), True
+    match = PHRASE_QUESTION.match(query)
+    if match:
+        return match.group("phrase").strip(), False
+    return None, False
+
+class IntentRouter:
+    """
+    Decide which pipeline stages a query needs before any of them run.
+
+    Keyword routing ("keywords", the default) matches one precompiled pattern. "embedding"
+    additionally sends queries without a keyword match to a nearest-example classifier over
+    DOCUMENT_EXAMPLES and GENERAL_EXAMPLES. "off" still retrieves context for every query.
+    """
+
+    def __init__(self, mode: str = None):
+        self.mode = (mode or Config.INTENT_ROUTING).lower()
+        self._examples = None
+        self._lock = threading.Lock()
+
+    @property
+    def uses_embeddings(self) -> bool:
+        """Whether route() may block on the embedding model"""
+        return self.mode == "embedding"
+
+    def route(self, query: str) -> Dict[str, Any]:
+        """
+        Returns:
+            Dictionary with the "intent", whether to "retrieve" document context, the "phrase"
+            to look up (phrase intent only) and whether it was "quoted", and the "method" and
+            "matched" keyword that decided it
+        """
+        phrase, quoted = extract_phrase_query(query)
+        if phrase:
+            return self._decision(PHRASE, "phrase", phrase=phrase, quoted=quoted)
+        match = KEYWORD_PATTERN.search(query)
+        if match:
+            return self._decision(DOCUMENT, "keywords", matched=match.group(0).lower())
+        if self.mode == "off":
+            # Previous behaviour: retrieve for every query, but answer it as a general question
+            return self._decision(GENERAL, "off", retrieve=True)
+        if self.uses_embeddings:
+            try:
+                return self._classify(query)
+            except Exception as e:
+                logger.error(f"IntentRouter: embedding classifier failed, routing by keywords: {e}")
+        return self._decision(GENERAL, "keywords")
+
+    def _classify(self, query: str) -> Dict[str, Any]:
+        """Pick the intent whose closest example query is most similar to the query"""
+        if self._examples is None:
+            with self._lock:
+                if self._examples is None:
+                    self._examples = {
+                        DOCUMENT: embed_texts(DOCUMENT_EXAMPLES),
+                        GENERAL: embed_texts(GENERAL_EXAMPLES)
+                    }
+        embedding = embed_query(query)
+        similarity = {
+            intent: max(cosine_similarity(embedding, example) for example in examples)
+            for intent, examples in self._examples.items()
+        }
+        intent = DOCUMENT if similarity[DOCUMENT] >= similarity[GENERAL] else GENERAL
+        return self._decision(intent, "embedding", similarity={key: round(value, 4) for key, value in similarity.items()})
+
+    @staticmethod
+    def _decision(intent: str, method: str, **details) -> Dict[str, Any]:
+        decision = {"intent": intent, "retrieve": intent != GENERAL, "method": method, "phrase": None, "quoted": False}
+        decision.update(details)
+        return decision
+
+def is_retrieval_intent(decision: Dict[str, Any]) -> bool:
+    """Whether the query asks about document content (and so uses the document prompts)"""
+    return decision["intent"] != GENERAL
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from .config import Config
+from rag_pipeline import get_corpus_version
+
+logger = logging.getLogger(__name__)
+
+class LLMResponseCache:
+    """
+    Two-tier cache for Ollama responses: an in-memory LRU in front of a SQLite table.
+
+    Keys cover the model, the whitespace-normalized prompt and the generation options.
+    Entries expire after a TTL, both tiers are size bounded, and everything is dropped
+    when the ChromaDB corpus version changes.
+    """
+
+    def __init__(self, path: str = None, memory_entries: int = None, max_entries: int = None, ttl_seconds: int = None):
+        self.path = path or os.path.join(Config.CACHE_DIR, "llm_cache.sqlite3")
+        self.memory_entries = memory_entries or Config.LLM_CACHE_MEMORY_ENTRIES
+        self.max_entries = max_entries or Config.LLM_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or Config.LLM_CACHE_TTL_SECONDS
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0, "invalidations": 0}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, corpus_version TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)")
+        self._conn.commit()
+        self._corpus_version = get_corpus_version()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """Hash the model, normalized prompt and options into a cache key"""
+        normalized_prompt = re.sub(r"\s+", " ", prompt).strip()
+        payload = json.dumps({"model": model, "prompt": normalized_prompt, "options": options or {}}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None"""
+        now = time.time()
+        with self._lock:
+            self._check_corpus_version()
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return response
+                del self._memory[key]
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ? AND corpus_version = ?",
+                (key, self._corpus_version)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self._counters["misses"] += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._remember(key, row[0], row[1])
+            self._counters["disk_hits"] += 1
+            return row[0]
+
+    def set(self, key: str, response: str):
+        """Store a response in both tiers, evicting the least recently used entries"""
+        now = time.time()
+        with self._lock:
+            self._check_corpus_version()
+            self._remember(key, response, now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, corpus_version, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, response, self._corpus_version, now, now)
+            )
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            overflow = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+                self._counters["evictions"] += overflow
+            self._conn.commit()
+            self._counters["writes"] += 1
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes for monitoring"""
+        with self._lock:
+            disk_entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+            return dict(
+                self._counters,
+                hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+                memory_entries=len(self._memory),
+                disk_entries=disk_entries,
+                corpus_version=self._corpus_version
+            )
+
+    def _remember(self, key: str, response: str, created_at: float):
+        """Insert into the memory tier, evicting the least recently used entry when full"""
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _check_corpus_version(self):
+        """Invalidate both tiers when the indexed documents have changed"""
+        current = get_corpus_version()
+        if current != self._corpus_version:
+            logger.info(f"LLMResponseCache: corpus changed ({self._corpus_version or 'none'} -> {current}), invalidating")
+            self._memory.clear()
+            self._conn.execute("DELETE FROM llm_cache WHERE corpus_version != ?", (current,))
+            self._conn.commit()
+            self._corpus_version = current
+            self._counters["invalidations"] += 1
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """Get the shared response cache, or None when LLM_CACHE_ENABLED is off"""
+    global _cache
+    if not Config.LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache()
+    return _cache
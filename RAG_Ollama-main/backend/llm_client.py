@@ -0,0 +1,100 @@
+import logging
+from typing import Dict, Any, Optional, AsyncIterator
+import httpx
+import ollama
+from .config import Config
+from .executor import run_blocking
+from .llm_cache import get_response_cache
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+def get_async_client() -> ollama.AsyncClient:
+    """Get the shared async Ollama client (one pooled HTTP connection pool per process)"""
+    global _client
+    if _client is None:
+        _client = ollama.AsyncClient(
+            host=Config.OLLAMA_BASE_URL,
+            timeout=Config.OLLAMA_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=Config.OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.OLLAMA_MAX_CONNECTIONS
+            )
+        )
+    return _client
+
+def default_options(options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Merge request options over the configured defaults"""
+    merged = {"temperature": Config.TEMPERATURE}
+    if options:
+        merged.update(options)
+    return merged
+
+async def chat(prompt: str, model: str = None, options: Optional[Dict[str, Any]] = None) -> str:
+    """Send a single-turn chat to Ollama and return the message content (served from cache when possible)"""
+    model = model or Config.get_ollama_model()
+    options = default_options(options)
+    cache = get_response_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(model, prompt, options)
+        cached = await run_blocking(cache.get, cache_key)
+        if cached is not None:
+            logger.info(f"LLM cache hit for model {model}")
+            return cached
+    response = await get_async_client().chat(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        options=options
+    )
+    content = response['message']['content']
+    if cache is not None and content:
+        await run_blocking(cache.set, cache_key, content)
+    return content
+
+async def stream_chat(prompt: str, model: str = None, options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """
+    Send a single-turn chat to Ollama and yield content tokens as they are generated.
+    
+    A cached response is yielded as a single token; a completed stream is written to the cache.
+    """
+    model = model or Config.get_ollama_model()
+    options = default_options(options)
+    cache = get_response_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(model, prompt, options)
+        cached = await run_blocking(cache.get, cache_key)
+        if cached is not None:
+            logger.info(f"LLM cache hit for model {model}")
+            yield cached
+            return
+    stream = await get_async_client().chat(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        options=options,
+        stream=True
+    )
+    content = []
+    async for part in stream:
+        token = part['message']['content']
+        if token:
+            content.append(token)
+            yield token
+    if cache is not None and content:
+        await run_blocking(cache.set, cache_key, "".join(content))
+
+async def preload_model(model: str = None):
+    """Ask Ollama to load a model into memory (an empty prompt generates nothing)"""
+    model = model or Config.get_ollama_model()
+    await get_async_client().generate(model=model, prompt="")
+
+async def close_client():
+    """Close the pooled HTTP connections"""
+    global _client
+    if _client is not None:
+        transport = getattr(_client, "_client", None)
+        if transport is not None:
+            await transport.aclose()
+        _client = None
@@ -1,20 +1,31 @@
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
-import uuid
+from typing import Optional, Dict, Any, AsyncIterator, List, Union
 import os
+import json
+import time
+import asyncio
 import logging
 import sys
-import ollama
 
 # Add the parent directory to the path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from rag_pipeline import add_to_vector_db, query_vector_db
-from pdf_load import extract_text_from_pdf, split_pdf_into_chunks_with_metadata
+from rag_pipeline import search_chunks, find_phrase, get_chunks, get_reranker, make_filters, warm_up as warm_up_pipeline
 from backend.agents import MultiAgentRFPAssistant
 from backend.config import Config
+from backend.context_packer import ContextPacker
+from backend.executor import run_blocking, shutdown_executor
+from backend import llm_client
+from backend.llm_cache import get_response_cache
+from backend.semantic_cache import get_semantic_cache
+from backend.document_registry import get_document_registry
+from backend.uploads import MultipartUpload, UploadTooLarge, MULTIPART_OVERHEAD_BYTES
+from backend.ingestion import get_ingestion_queue
+from backend.tracing import get_trace_buffer
 
 app = FastAPI(title="Multi-Agent RFP Assistant", version="1.0.0")
 
@@ -27,88 +38,352 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class NonStreamingGZipMiddleware(GZipMiddleware):
+    """GZip for regular responses; NDJSON streams pass through so the compressor never holds back tokens"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(NonStreamingGZipMiddleware, minimum_size=Config.GZIP_MIN_BYTES)
+
+class UploadSizeLimitMiddleware:
+    """Reject uploads that declare a Content-Length over MAX_FILE_SIZE before their body is read"""
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/upload-pdf/":
+            length = dict(scope["headers"]).get(b"content-length", b"")
+            if length.isdigit() and int(length) > self.max_bytes:
+                response = JSONResponse(status_code=413, content={"detail": f"File exceeds the upload limit of {Config.MAX_FILE_SIZE} bytes"})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=Config.MAX_FILE_SIZE + MULTIPART_OVERHEAD_BYTES)
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+# Warm-up state reported by /ready
+readiness = {"ready": False, "warming_up": False, "components": {}, "error": None}
+_warm_up_task = None
+
+async def warm_up():
+    """Preload the embedding model, the HNSW index and the Ollama model"""
+    readiness.update(warming_up=True, error=None)
+    try:
+        readiness["components"].update(await run_blocking(warm_up_pipeline))
+        start = time.perf_counter()
+        await llm_client.preload_model()
+        readiness["components"]["llm_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        readiness["ready"] = True
+        logger.info(f"Warm-up finished: {readiness['components']}")
+    except Exception as e:
+        readiness["error"] = str(e)
+        logger.error(f"Warm-up failed: {e}")
+    finally:
+        readiness["warming_up"] = False
+
+def start_warm_up():
+    """Run warm-up in the background so the server accepts connections immediately"""
+    global _warm_up_task
+    if _warm_up_task is None or _warm_up_task.done():
+        _warm_up_task = asyncio.create_task(warm_up())
+
+@app.on_event("startup")
+async def startup():
+    """Resume ingestion jobs that were queued or running when the server stopped, and start warm-up"""
+    await run_blocking(get_ingestion_queue().resume)
+    if Config.WARMUP_ON_STARTUP:
+        start_warm_up()
+    else:
+        readiness["ready"] = True
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled Ollama connections, the blocking-call thread pool and the ingestion workers"""
+    get_ingestion_queue().shutdown()
+    await llm_client.close_client()
+    shutdown_executor()
+
 # Initialize the multi-agent system
-multi_agent_assistant = MultiAgentRFPAssistant(query_vector_db)
+multi_agent_assistant = MultiAgentRFPAssistant(search_chunks)
+context_packer = ContextPacker()
 
 # Pydantic models for request/response
-class QueryRequest(BaseModel):
+class RetrievalFilters(BaseModel):
+    """Optional scope for retrieval: document IDs (see GET /documents) and an inclusive page range"""
+    document_ids: Optional[List[str]] = None
+    page_start: Optional[int] = None
+    page_end: Optional[int] = None
+
+class QueryRequest(RetrievalFilters):
     query: str
+    compact: bool = False
 
-class FeedbackRequest(BaseModel):
+class FeedbackRequest(RetrievalFilters):
     query: str
     feedback: str
     original_suggestion: str
+    compact: bool = False
 
 class QueryResponse(BaseModel):
     status: str
     query: str
     retrieval_result: Dict[str, Any]
     improvement_result: Dict[str, Any]
+    revision_result: Optional[Dict[str, Any]] = None
+    route: Optional[Dict[str, Any]] = None
+    timings: Optional[Dict[str, float]] = None
+    cache: Optional[Dict[str, Any]] = None
+    trace_id: Optional[str] = None
     agent_log: list
 
-class HelpingAgentRequest(BaseModel):
+class ChunkRef(BaseModel):
+    """Reference to a retrieved chunk; GET /chunks/{id} returns its full text"""
+    id: Optional[str] = None
+    page: Optional[int] = None
+    para: Optional[str] = None  # opening words of the source paragraph
+    section: Optional[str] = None
+    document_id: Optional[str] = None
+    filename: Optional[str] = None
+    score: Optional[float] = None
+    snippet: str = ""
+
+class CompactQueryResponse(BaseModel):
+    """QueryResponse without the packed context: retrieved chunks are listed once, as references"""
+    status: str
+    query: str
+    answer: str = ""
+    improved_content: str = ""
+    best_practices_applied: list = []
+    chunks: List[ChunkRef]
+    retrieval: Dict[str, Any]
+    route: Optional[Dict[str, Any]] = None
+    timings: Optional[Dict[str, float]] = None
+    cache: Optional[Dict[str, Any]] = None
+    trace_id: Optional[str] = None
+    agent_log: list = []
+
+class HelpingAgentRequest(RetrievalFilters):
     query: str
 
 class HelpingAgentResponse(BaseModel):
     answer: str
 
-def process_pdf_sync(file_path: str, task_id: str):
-    """Process PDF file and add to vector database"""
-    logging.info(f"Task {task_id}: Started processing {file_path}")
-    try:
-        paragraphs = extract_text_from_pdf(file_path)
-        logging.info(f"Task {task_id}: Extracted text from PDF")
-        max_tokens = Config.get_chunk_size_tokens()
-        overlap_tokens = Config.get_overlap_tokens()
-        chunks = split_pdf_into_chunks_with_metadata(paragraphs, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
-        texts = [chunk['text'] for chunk in chunks]
-        ids = [str(uuid.uuid4()) for _ in chunks]
-        metadatas = [{'page': chunk['page'], 'para': chunk['para'], 'tokens': chunk['tokens']} for chunk in chunks]
-        add_to_vector_db(texts, ids, metadatas)
-        logging.info(f"Task {task_id}: Successfully added {len(chunks)} chunks to vector DB")
-        logging.info(f"Task {task_id}: Total tokens: {sum(chunk['tokens'] for chunk in chunks)}")
-    except Exception as e:
-        logging.error(f"Task {task_id}: Error processing PDF: {e}")
-        raise
+async def ndjson_events(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    """Serialize stream events as newline-delimited JSON"""
+    async for event in events:
+        yield json.dumps(event, default=str) + "\n"
+
+def request_filters(request: RetrievalFilters) -> Optional[Dict[str, Any]]:
+    """Validated retrieval filters of a request (None when it searches everything)"""
+    if request.page_start is not None and request.page_end is not None and request.page_start > request.page_end:
+        raise HTTPException(status_code=400, detail="page_start must not be greater than page_end")
+    return make_filters(request.document_ids, request.page_start, request.page_end)
+
+async def semantic_cache_lookup(kind: str, query: str, filters: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Look up a cached answer for a near-duplicate query in the same filter scope, if the semantic cache is enabled"""
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is None:
+        return None
+    return await run_blocking(semantic_cache.lookup, kind, query, filters)
+
+async def semantic_cache_store(kind: str, query: str, response: Dict[str, Any], filters: Optional[Dict[str, Any]] = None):
+    """Remember an answer in the semantic cache, if it is enabled"""
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is not None:
+        await run_blocking(semantic_cache.store, kind, query, response, filters)
 
-@app.post("/upload-pdf/")
-async def upload_pdf(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+def cache_info(hit: Dict[str, Any]) -> Dict[str, Any]:
+    """Describe a semantic cache hit in a response"""
+    return {"semantic_hit": True, "matched_query": hit["matched_query"], "similarity": hit["similarity"]}
+
+# Retrieval result fields kept in compact responses (alongside the chunk references)
+COMPACT_RETRIEVAL_FIELDS = ("retrieval_mode", "num_paragraphs", "context_tokens", "filters", "phrase_lookup", "error")
+
+def chunk_ref(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact reference to a retrieved chunk: its citation fields, score and a short snippet"""
+    text = chunk.get("text") or ""
+    snippet = text[:Config.COMPACT_SNIPPET_CHARS]
+    return {
+        "id": chunk.get("id"), "page": chunk.get("page"), "para": chunk.get("para"), "section": chunk.get("section"),
+        "document_id": chunk.get("document_id"), "filename": chunk.get("filename"),
+        "score": chunk.get("relevance", chunk.get("score")),
+        "snippet": snippet + ("..." if len(text) > len(snippet) else "")
+    }
+
+def compact_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """CompactQueryResponse fields for a process_query or handle_feedback result"""
+    retrieval = result.get("retrieval_result") or {}
+    improvement = result.get("revision_result") or result.get("improvement_result") or {}
+    return {
+        "status": result["status"],
+        "query": result["query"],
+        "answer": retrieval.get("llm_answer", ""),
+        "improved_content": improvement.get("improved_content", ""),
+        "best_practices_applied": improvement.get("best_practices_applied", []),
+        "chunks": [chunk_ref(chunk) for chunk in retrieval.get("retrieved_paragraphs", [])],
+        "retrieval": {key: value for key, value in retrieval.items() if key in COMPACT_RETRIEVAL_FIELDS},
+        "route": result.get("route"),
+        "timings": result.get("timings"),
+        "cache": result.get("cache"),
+        "trace_id": result.get("trace_id"),
+        "agent_log": result.get("agent_log", [])
+    }
+
+def query_response(result: Dict[str, Any], compact: bool) -> Union[QueryResponse, CompactQueryResponse]:
+    """Full or compact response model for a result"""
+    return CompactQueryResponse(**compact_result(result)) if compact else QueryResponse(**result)
+
+async def compact_events(events: AsyncIterator[Dict[str, Any]], compact: bool) -> AsyncIterator[Dict[str, Any]]:
+    """Replace the paragraphs (and citations) of metadata events with chunk references in compact mode"""
+    async for event in events:
+        if compact and event["type"] == "metadata":
+            chunks = [chunk_ref(chunk) for chunk in event.get("retrieved_paragraphs", [])]
+            event = dict({key: value for key, value in event.items() if key not in ("retrieved_paragraphs", "citations")}, chunks=chunks)
+        yield event
+
+def stream_response(events: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """Wrap an event generator in an NDJSON streaming response"""
+    return StreamingResponse(
+        ndjson_events(events),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Request body schema for the API docs (the endpoint parses the multipart body itself)
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object", "properties": {"file": {"type": "string", "format": "binary"}}, "required": ["file"]
+    }}}
+}
+
+@app.post("/upload-pdf/", openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
+async def upload_pdf(request: Request):
     """
     Upload a PDF file for processing and indexing
     
-    This endpoint processes the PDF in the background and adds it to the vector database
-    for later retrieval by the multi-agent system.
-    """
-    # Validate file type
-    if not file.filename.lower().endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are supported")
-    
-    # Create upload directory if it doesn't exist
-    upload_dir = Config.UPLOAD_DIR
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    file_path = os.path.join(upload_dir, file.filename)
+    This endpoint queues the PDF on the ingestion worker pool, which adds it to the vector
+    database for later retrieval by the multi-agent system. Files whose content is already
+    indexed are not processed again. Poll GET /tasks/{task_id} for progress.
     
-    # Save the uploaded file
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    The multipart body is parsed as it arrives and the file written to disk in blocks of up
+    to UPLOAD_CHUNK_SIZE (hashed on the way), so the upload is never held in memory or
+    spooled twice; it is rejected with 413 as soon as it exceeds MAX_FILE_SIZE, whether or
+    not the client sent a Content-Length.
+    """
+    try:
+        upload = MultipartUpload(request.headers.get("content-type", ""), Config.UPLOAD_DIR, Config.MAX_FILE_SIZE)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        pending, pending_bytes = [], 0
+        async for data in request.stream():
+            pending.append(data)
+            pending_bytes += len(data)
+            if pending_bytes >= Config.UPLOAD_CHUNK_SIZE:
+                await run_blocking(upload.write, b"".join(pending))
+                pending, pending_bytes = [], 0
+        await run_blocking(upload.write, b"".join(pending))
+        saved = await run_blocking(upload.finish)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await run_blocking(upload.close)
+    filename, file_path, content_hash = saved["filename"], saved["file_path"], saved["content_hash"]
 
-    task_id = str(uuid.uuid4())
-    logging.info(f"Received upload, assigned task_id: {task_id}")
+    existing = await run_blocking(get_document_registry().find_by_hash, content_hash)
+    if existing:
+        logging.info(f"Upload of {filename} matches indexed document {existing['document_id']}, skipping")
+        await run_blocking(os.remove, file_path)
+        return {
+            "message": f"{filename} is already indexed.",
+            "document_id": existing["document_id"],
+            "version": existing["version"],
+            "status": "unchanged"
+        }
 
-    # Process the PDF in the background
-    background_tasks.add_task(process_pdf_sync, file_path, task_id)
+    # Queue the PDF on the ingestion workers
+    task_id = await run_blocking(get_ingestion_queue().submit, file_path, filename, content_hash)
+    logging.info(f"Received upload of {saved['size']} bytes, assigned task_id: {task_id}")
 
     return {
-        "message": f"{file.filename} is being processed.",
+        "message": f"{filename} is being processed.",
         "task_id": task_id,
         "status": "processing"
     }
 
-@app.post("/ask/", response_model=QueryResponse)
+@app.get("/tasks")
+async def list_tasks(limit: int = 50):
+    """List recent ingestion tasks"""
+    return {"tasks": await run_blocking(get_ingestion_queue().store.list_jobs, limit)}
+
+@app.get("/tasks/{task_id}")
+async def get_task(task_id: str):
+    """Ingestion task status: stage, pages done, chunks embedded and timing"""
+    job = await run_blocking(get_ingestion_queue().get, task_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown task {task_id}")
+    return job
+
+@app.post("/tasks/{task_id}/cancel")
+async def cancel_task(task_id: str):
+    """Cancel a queued or running ingestion task"""
+    queue = get_ingestion_queue()
+    if not await run_blocking(queue.cancel, task_id):
+        job = await run_blocking(queue.get, task_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown task {task_id}")
+        raise HTTPException(status_code=409, detail=f"Task {task_id} already finished with status {job['status']}")
+    return await run_blocking(queue.get, task_id)
+
+@app.get("/documents")
+async def list_documents():
+    """List indexed documents with their current version and chunk counts"""
+    return {"documents": await run_blocking(get_document_registry().list_documents)}
+
+@app.get("/search/phrase")
+async def search_phrase(q: str, limit: int = None, document_id: str = None, page_start: int = None, page_end: int = None):
+    """
+    Exact phrase lookup: every chunk containing the phrase, with page numbers and snippets.
+    
+    Answered from the lexical index's word positions; no embedding or LLM call is made.
+    document_id, page_start and page_end restrict the lookup to one document and a page range.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query parameter q must not be empty")
+    limit = limit or Config.PHRASE_MAX_HITS
+    filters = request_filters(RetrievalFilters(document_ids=[document_id] if document_id else None, page_start=page_start, page_end=page_end))
+    started = time.perf_counter()
+    result = await run_blocking(find_phrase, q, limit=limit, filters=filters)
+    result["hits"] = [{key: value for key, value in hit.items() if key != "text"} for hit in result["hits"]]
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+@app.get("/chunks")
+async def get_chunks_by_id(ids: List[str] = Query(...)):
+    """Full texts and metadata of several chunks (?ids=a&ids=b), e.g. the references of a compact response"""
+    return {"chunks": await run_blocking(get_chunks, ids)}
+
+@app.get("/chunks/{chunk_id}")
+async def get_chunk(chunk_id: str):
+    """Full text and metadata of one chunk"""
+    chunks = await run_blocking(get_chunks, [chunk_id])
+    if not chunks:
+        raise HTTPException(status_code=404, detail=f"Unknown chunk {chunk_id}")
+    return chunks[0]
+
+@app.post("/ask/", response_model=Union[QueryResponse, CompactQueryResponse])
 async def ask_question(request: QueryRequest):
     """
     Process a query through the multi-agent RFP review system
@@ -117,23 +392,34 @@ async def ask_question(request: QueryRequest):
     1. Uses Agent A (Retriever) to find relevant documents
     2. Uses Agent B (RFP Editor) to analyze and improve content
     3. Returns both original and improved responses with agent logs
+    
+    document_ids, page_start and page_end restrict retrieval to those documents and pages.
+    With compact=true the response lists the retrieved chunks once as references (ID, page,
+    score, snippet) instead of repeating the packed context; see GET /chunks/{id}.
     """
+    filters = request_filters(request)
     try:
         logger.info(f"Processing query: {request.query}")
         
+        # Near-duplicate questions skip retrieval and generation entirely
+        hit = await semantic_cache_lookup("ask", request.query, filters)
+        if hit:
+            return query_response(dict(hit["response"], query=request.query, agent_log=[], cache=cache_info(hit)), request.compact)
+        
         # Process through multi-agent system
-        result = multi_agent_assistant.process_query(request.query)
+        result = await multi_agent_assistant.process_query(request.query, filters)
         
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result.get("error", "Unknown error"))
         
-        return QueryResponse(**result)
+        await semantic_cache_store("ask", request.query, {key: value for key, value in result.items() if key not in ("agent_log", "trace_id")}, filters)
+        return query_response(result, request.compact)
         
     except Exception as e:
         logger.error(f"Error processing query: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
-@app.post("/feedback/", response_model=QueryResponse)
+@app.post("/feedback/", response_model=Union[QueryResponse, CompactQueryResponse])
 async def handle_feedback(request: FeedbackRequest):
     """
     Handle user feedback and generate revised suggestions
@@ -142,25 +428,78 @@ async def handle_feedback(request: FeedbackRequest):
     - Reject a suggestion and get a rephrased version
     - Provide specific feedback for improvement
     """
+    filters = request_filters(request)
     try:
         logger.info(f"Handling feedback for query: {request.query}")
         
         # Process feedback through multi-agent system
-        result = multi_agent_assistant.handle_feedback(
+        result = await multi_agent_assistant.handle_feedback(
             request.query,
             request.feedback,
-            request.original_suggestion
+            request.original_suggestion,
+            filters
         )
         
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result.get("error", "Unknown error"))
         
-        return QueryResponse(**result)
+        return query_response(result, request.compact)
         
     except Exception as e:
         logger.error(f"Error handling feedback: {e}")
         raise HTTPException(status_code=500, detail=f"Error handling feedback: {str(e)}")
 
+@app.post("/ask/stream")
+async def ask_question_stream(request: QueryRequest):
+    """
+    Streaming variant of POST /ask/
+    
+    Returns newline-delimited JSON events: one "metadata" event with the retrieved
+    paragraphs and citations, "token" events as the RFP Editor Agent generates, then "done".
+    With compact=true the metadata event carries chunk references instead of the paragraphs.
+    """
+    logger.info(f"Streaming query: {request.query}")
+    return stream_response(compact_events(ask_events(request.query, request_filters(request)), request.compact))
+
+async def ask_events(query: str, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream events for a query, replaying a semantic cache hit or caching the finished answer.
+
+    Streamed answers are cached under their own kind: they lack the retriever's answer, the
+    context and the timings that POST /ask/ responses are rebuilt from.
+    """
+    hit = await semantic_cache_lookup("ask_stream", query, filters)
+    if hit:
+        cached = hit["response"]
+        metadata = {key: value for key, value in cached["retrieval_result"].items() if key != "context"}
+        yield dict(metadata, type="metadata", cache=cache_info(hit))
+        yield {"type": "token", "content": cached["improvement_result"].get("improved_content", "")}
+        yield dict(cached["improvement_result"], type="done")
+        return
+    metadata = None
+    async for event in multi_agent_assistant.stream_query(query, filters):
+        if event["type"] == "metadata":
+            metadata = event
+        elif event["type"] == "done" and metadata is not None:
+            await semantic_cache_store("ask_stream", query, {
+                "status": "success",
+                "query": query,
+                "retrieval_result": {key: value for key, value in metadata.items() if key not in ("type", "trace_id")},
+                "improvement_result": dict({key: value for key, value in event.items() if key != "type"}, original_query=query, status="success")
+            }, filters)
+        yield event
+
+@app.post("/feedback/stream")
+async def handle_feedback_stream(request: FeedbackRequest):
+    """Streaming variant of POST /feedback/ (same event format as /ask/stream)"""
+    logger.info(f"Streaming feedback for query: {request.query}")
+    return stream_response(compact_events(multi_agent_assistant.stream_feedback(
+        request.query,
+        request.feedback,
+        request.original_suggestion,
+        request_filters(request)
+    ), request.compact))
+
 @app.get("/ask/")
 async def ask_question_legacy(q: str):
     """
@@ -169,17 +508,12 @@ async def ask_question_legacy(q: str):
     This endpoint provides the original simple RAG functionality
     """
     try:
-        context_docs = query_vector_db(q)
-        context = "\n".join(context_docs) if context_docs else ""
+        context_docs = await run_blocking(search_chunks, q, n_results=Config.get_context_candidates(), include_embeddings=True)
+        context = context_packer.pack(context_docs)["context"]
 
         prompt = f"Answer the question using the context below.\n\nContext:\n{context}\n\nQuestion: {q}"
 
-        response = ollama.chat(
-            model=Config.get_ollama_model(), 
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        return {"response": response['message']['content']}
+        return {"response": await llm_client.chat(prompt)}
         
     except Exception as e:
         logger.error(f"Error in legacy ask endpoint: {e}")
@@ -190,6 +524,19 @@ async def ping():
     """Health check endpoint"""
     return {"status": "pong", "service": "Multi-Agent RFP Assistant"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the embedder, the vector index and the Ollama model are loaded, 503 before"""
+    if readiness["ready"]:
+        return {"status": "ready", "components": readiness["components"]}
+    if not readiness["warming_up"]:
+        # The last attempt failed (e.g. Ollama was not up yet); try again
+        start_warm_up()
+    return JSONResponse(
+        status_code=503,
+        content={"status": "warming_up", "components": readiness["components"], "error": readiness["error"]}
+    )
+
 @app.get("/config")
 async def get_config():
     """Get current configuration settings"""
@@ -203,45 +550,115 @@ async def get_config():
         "temperature": Config.TEMPERATURE
     }
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the LLM response cache, the semantic answer cache and the rerank score cache"""
+    response_cache = get_response_cache()
+    semantic_cache = get_semantic_cache()
+    return {
+        "llm": dict(await run_blocking(response_cache.stats), enabled=True) if response_cache else {"enabled": False},
+        "semantic": dict(await run_blocking(semantic_cache.stats), enabled=True) if semantic_cache else {"enabled": False},
+        "rerank": dict((await run_blocking(get_reranker)).stats(), enabled=True) if Config.RERANK_ENABLED else {"enabled": False}
+    }
+
+@app.get("/debug/traces")
+async def recent_traces(limit: int = 20):
+    """Most recent per-request traces (agent steps with chunk IDs, timings and token counts), newest first"""
+    return {"size": get_trace_buffer().size, "traces": get_trace_buffer().recent(max(limit, 0))}
+
+@app.get("/debug/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """One request trace by the trace_id returned with its response"""
+    trace = get_trace_buffer().get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired trace {trace_id}")
+    return trace
+
+def chunk_citations(chunks: list) -> list:
+    """Page citations for packed chunks"""
+    return [
+        {"id": chunk.get("id"), "page": chunk.get("page"), "para": chunk.get("para"), "section": chunk.get("section"),
+         "document_id": chunk.get("document_id"), "filename": chunk.get("filename")}
+        for chunk in chunks
+    ]
+
+async def build_helping_agent_prompt(query: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Retrieve and pack document context for the Helping Agent and build its prompt"""
+    context_chunks = await run_blocking(search_chunks, query, n_results=Config.get_context_candidates(), include_embeddings=True, filters=filters)
+    # Defensive: ensure context_chunks is a list
+    if not isinstance(context_chunks, list):
+        context_chunks = []
+    packed = context_packer.pack(context_chunks)
+    logger.info(f"Helping Agent: packed {len(packed['chunks'])} chunks ({packed['tokens']} tokens)")
+    context = packed["context"]
+
+    packed["prompt"] = f"""
+        You are an expert in writing, reviewing, and consulting on Requests for Proposal (RFPs). Answer the user's question with clear, accurate, and practical advice. Use both your general RFP knowledge and the provided document context below. If the context is relevant, cite it in your answer. If not, answer from your expertise.
+
+        USER QUESTION: {query}
+
+        DOCUMENT CONTEXT:
+        {context}
+        """
+    return packed
+
 @app.post("/helping-agent/", response_model=HelpingAgentResponse)
 async def helping_agent(request: HelpingAgentRequest):
     """
     RFP knowledge chatbot endpoint with document context.
     Answers any RFP-related question using the Ollama model, leveraging both general RFP knowledge and the indexed PDFs.
     """
+    filters = request_filters(request)
     try:
-        top_k = Config.TOP_K_RESULTS
-        context_chunks = query_vector_db(request.query, n_results=top_k)
-        logger.info(f"Helping Agent context_chunks: {context_chunks}")
-        # Defensive: ensure context_chunks is a list of dicts with 'text' key and not None
-        if not isinstance(context_chunks, list):
-            context_chunks = []
-        filtered_chunks = []
-        if context_chunks:
-            for chunk in context_chunks:
-                if isinstance(chunk, dict) and 'text' in chunk and chunk['text'] is not None:
-                    filtered_chunks.append(chunk)
-        context = "\n".join([chunk['text'] for chunk in filtered_chunks]) if filtered_chunks else ""
-
-        prompt = f"""
-        You are an expert in writing, reviewing, and consulting on Requests for Proposal (RFPs). Answer the user's question with clear, accurate, and practical advice. Use both your general RFP knowledge and the provided document context below. If the context is relevant, cite it in your answer. If not, answer from your expertise.
-
-        USER QUESTION: {request.query}
-
-        DOCUMENT CONTEXT:
-        {context}
-        """
-        response = ollama.chat(
-            model=Config.get_ollama_model(),
-            messages=[{"role": "user", "content": prompt}],
-            options={"temperature": Config.TEMPERATURE}
-        )
-        answer = response['message']['content']
+        hit = await semantic_cache_lookup("helping_agent", request.query, filters)
+        if hit:
+            return HelpingAgentResponse(answer=hit["response"]["answer"])
+        packed = await build_helping_agent_prompt(request.query, filters)
+        answer = await llm_client.chat(packed["prompt"])
+        await semantic_cache_store("helping_agent", request.query, {"answer": answer, "citations": chunk_citations(packed["chunks"])}, filters)
         return HelpingAgentResponse(answer=answer)
     except Exception as e:
         logger.error(f"Error in helping agent: {e}")
         raise HTTPException(status_code=500, detail=f"Error in helping agent: {str(e)}")
 
+async def helping_agent_events(query: str, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Citations first, then the Helping Agent's answer token by token"""
+    hit = await semantic_cache_lookup("helping_agent", query, filters)
+    if hit:
+        yield {"type": "metadata", "query": query, "citations": hit["response"].get("citations", []), "cache": cache_info(hit)}
+        yield {"type": "token", "content": hit["response"]["answer"]}
+        yield {"type": "done", "answer": hit["response"]["answer"]}
+        return
+    try:
+        packed = await build_helping_agent_prompt(query, filters)
+    except Exception as e:
+        logger.error(f"Error in streaming helping agent: {e}")
+        yield {"type": "error", "error": str(e)}
+        return
+    citations = chunk_citations(packed["chunks"])
+    yield {
+        "type": "metadata",
+        "query": query,
+        "citations": citations,
+        "context_tokens": packed["tokens"]
+    }
+    answer = []
+    try:
+        async for token in llm_client.stream_chat(packed["prompt"]):
+            answer.append(token)
+            yield {"type": "token", "content": token}
+    except Exception as e:
+        logger.error(f"Error in streaming helping agent: {e}")
+        yield {"type": "error", "error": str(e)}
+        return
+    await semantic_cache_store("helping_agent", query, {"answer": "".join(answer), "citations": citations}, filters)
+    yield {"type": "done", "answer": "".join(answer)}
+
+@app.post("/helping-agent/stream")
+async def helping_agent_stream(request: HelpingAgentRequest):
+    """Streaming variant of POST /helping-agent/ (newline-delimited JSON events)"""
+    return stream_response(helping_agent_events(request.query, request_filters(request)))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,164 @@
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional
+from .config import Config
+from .intent_router import extract_phrase_query
+from rag_pipeline import get_chroma_client, embed_query, get_corpus_version, result_similarity
+from lexical_index import TERM_PATTERN
+
+logger = logging.getLogger(__name__)
+
+# Single-quoted text ('ISO 27001'), but not apostrophes inside words
+SINGLE_QUOTED = re.compile(r"(?:^|\s)'([^']{2,200})'(?=[\s?.!,;:]|$)")
+
+def exact_terms(query: str) -> list:
+    """
+    Parts of a query that must match exactly for a cached answer to apply: single-quoted
+    text and identifiers containing digits ("27001", "rfp-2024-017", "3.2.1").
+
+    Embeddings barely separate "ISO 9001" from "ISO 27001", so these go into the cache scope.
+    """
+    quoted = [" ".join(phrase.lower().split()) for phrase in SINGLE_QUOTED.findall(query)]
+    identifiers = [term for term in TERM_PATTERN.findall(query.lower()) if any(char.isdigit() for char in term)]
+    return sorted(set(quoted + identifiers))
+
+def is_cacheable(query: str) -> bool:
+    """Phrase lookups ("is there ...", double-quoted text) are exact searches and never share answers"""
+    phrase, _ = extract_phrase_query(query)
+    return phrase is None
+
+class SemanticCache:
+    """
+    Answer cache for near-duplicate questions.
+
+    Past queries are embedded with the retrieval embedder and stored in a small dedicated
+    ChromaDB collection together with their answers. A new query reuses a stored answer when
+    its cosine similarity passes the threshold and the answer was produced for the same kind
+    of request, filter scope and exact terms (see exact_terms) against the same corpus version.
+    Phrase lookups bypass the cache.
+    """
+
+    def __init__(self, collection_name: str = None, threshold: float = None, max_entries: int = None, ttl_seconds: int = None):
+        self.collection = get_chroma_client().get_or_create_collection(collection_name or Config.SEMANTIC_CACHE_COLLECTION)
+        self.threshold = Config.SEMANTIC_CACHE_THRESHOLD if threshold is None else threshold
+        self.max_entries = max_entries or Config.SEMANTIC_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or Config.SEMANTIC_CACHE_TTL_SECONDS
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "bypassed": 0, "writes": 0, "evictions": 0}
+
+    @staticmethod
+    def scope_key(filters: Optional[Dict[str, Any]], query: str = "") -> str:
+        """Canonical string for the retrieval filters and exact terms of a query ("" for neither)"""
+        terms = exact_terms(query)
+        if not filters and not terms:
+            return ""
+        return json.dumps({"filters": filters or None, "terms": terms}, sort_keys=True)
+
+    def lookup(self, kind: str, query: str, filters: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find a cached answer for a semantically equivalent query.
+
+        Returns:
+            Dictionary with the cached "response", the "matched_query" and its "similarity", or None
+        """
+        if not is_cacheable(query):
+            with self._lock:
+                self._counters["bypassed"] += 1
+            return None
+        try:
+            embedding = embed_query(query)
+            results = self.collection.query(
+                query_embeddings=[embedding],
+                n_results=1,
+                where={"$and": [{"kind": kind}, {"scope": self.scope_key(filters, query)}, {"corpus_version": get_corpus_version()}]},
+                include=["documents", "metadatas", "distances"] + ([] if Config.EMBEDDING_NORMALIZE else ["embeddings"])
+            )
+            ids = results['ids'][0] if results.get('ids') else []
+            if not ids:
+                return self._miss()
+            meta = results['metadatas'][0][0]
+            cached_embedding = results['embeddings'][0][0] if results.get('embeddings') is not None else None
+            similarity = result_similarity(results['distances'][0][0], embedding, cached_embedding)
+            if similarity < self.threshold or time.time() - meta.get("created_at", 0) > self.ttl_seconds:
+                return self._miss()
+            with self._lock:
+                self._counters["hits"] += 1
+            logger.info(f"SemanticCache: hit for '{query}' (similarity {similarity:.3f})")
+            return {
+                "response": json.loads(meta["response"]),
+                "matched_query": results['documents'][0][0],
+                "similarity": round(similarity, 4)
+            }
+        except Exception as e:
+            logger.error(f"SemanticCache: lookup failed: {e}")
+            return self._miss()
+
+    def store(self, kind: str, query: str, response: Dict[str, Any], filters: Optional[Dict[str, Any]] = None):
+        """Remember the answer for a query"""
+        if not is_cacheable(query):
+            return
+        try:
+            embedding = embed_query(query)
+            self.collection.add(
+                ids=[uuid.uuid4().hex],
+                documents=[query],
+                embeddings=[embedding],
+                metadatas=[{
+                    "kind": kind,
+                    "scope": self.scope_key(filters, query),
+                    "corpus_version": get_corpus_version(),
+                    "created_at": time.time(),
+                    "response": json.dumps(response, default=str)
+                }]
+            )
+            with self._lock:
+                self._counters["writes"] += 1
+            self._evict()
+        except Exception as e:
+            logger.error(f"SemanticCache: store failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]  # bypassed queries are not lookups
+            return dict(
+                self._counters,
+                hit_rate=round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                entries=self.collection.count(),
+                threshold=self.threshold
+            )
+
+    def _miss(self) -> None:
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def _evict(self):
+        """Drop answers for older corpus versions, then the oldest entries beyond max_entries"""
+        self.collection.delete(where={"corpus_version": {"$ne": get_corpus_version()}})
+        overflow = self.collection.count() - self.max_entries
+        if overflow <= 0:
+            return
+        entries = self.collection.get(include=["metadatas"])
+        oldest = sorted(zip(entries['ids'], entries['metadatas']), key=lambda item: item[1].get("created_at", 0))
+        self.collection.delete(ids=[entry_id for entry_id, _ in oldest[:overflow]])
+        with self._lock:
+            self._counters["evictions"] += overflow
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Get the shared semantic cache, or None when SEMANTIC_CACHE_ENABLED is off"""
+    global _cache
+    if not Config.SEMANTIC_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache()
+    return _cache
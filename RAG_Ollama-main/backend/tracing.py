@@ -0,0 +1,111 @@
+import threading
+import time
+import uuid
+from collections import deque
+from typing import List, Dict, Any, Optional
+from .config import Config
+from pdf_load import count_tokens
+
+# Longest query prefix kept in a trace
+TRACE_QUERY_CHARS = 200
+
+def summarize_result(result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Compact view of an agent result: status, chunk IDs, pages and token counts, never texts"""
+    if not result:
+        return {"status": "skipped"}
+    summary = {"status": result.get("status")}
+    if result.get("error"):
+        summary["error"] = result["error"]
+    if "retrieved_paragraphs" in result:
+        chunks = result["retrieved_paragraphs"]
+        summary.update(
+            retrieval_mode=result.get("retrieval_mode"),
+            chunk_ids=[chunk.get("id") for chunk in chunks],
+            pages=[chunk.get("page") for chunk in chunks],
+            context_tokens=result.get("context_tokens", 0)
+        )
+    if result.get("phrase_lookup"):
+        summary["phrase_hits"] = result["phrase_lookup"]["total"]
+    for key in ("llm_answer", "improved_content"):
+        if result.get(key):
+            summary["answer_tokens"] = count_tokens(result[key])
+    return summary
+
+class RequestTrace:
+    """
+    Pipeline record of a single request.
+
+    Entries hold chunk IDs, timings and token counts only, so a trace stays small no matter
+    how much context the request retrieved.
+    """
+
+    def __init__(self, kind: str, query: str):
+        self.trace_id = uuid.uuid4().hex
+        self.kind = kind
+        self.query = query[:TRACE_QUERY_CHARS]
+        self.started_at = time.time()
+        self.route = None
+        self.timings: Dict[str, float] = {}
+        self.entries: List[Dict[str, Any]] = []
+        self.status = "running"
+
+    def add(self, agent: str, action: str, result: Optional[Dict[str, Any]], duration_ms: float = None) -> Dict[str, Any]:
+        """Append a compact entry for an agent step"""
+        entry = {"step": len(self.entries) + 1, "agent": agent, "action": action}
+        entry.update(summarize_result(result))
+        if duration_ms is not None:
+            entry["duration_ms"] = duration_ms
+        self.entries.append(entry)
+        return entry
+
+    def finish(self, status: str):
+        """Mark the request finished and keep the trace in the shared ring buffer"""
+        self.status = status
+        get_trace_buffer().record(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "kind": self.kind,
+            "query": self.query,
+            "started_at": self.started_at,
+            "status": self.status,
+            "route": self.route,
+            "timings": self.timings,
+            "entries": self.entries
+        }
+
+class TraceBuffer:
+    """Bounded ring buffer of the most recent request traces, for the debug endpoint"""
+
+    def __init__(self, size: int = None):
+        self.size = Config.TRACE_BUFFER_SIZE if size is None else size
+        self._traces = deque(maxlen=self.size or None)
+        self._lock = threading.Lock()
+
+    def record(self, trace: RequestTrace):
+        if not self.size:
+            return
+        with self._lock:
+            self._traces.append(trace.to_dict())
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent traces first"""
+        with self._lock:
+            return list(reversed(self._traces))[:limit]
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((trace for trace in self._traces if trace["trace_id"] == trace_id), None)
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def get_trace_buffer() -> TraceBuffer:
+    """Get the shared trace ring buffer"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = TraceBuffer()
+    return _buffer
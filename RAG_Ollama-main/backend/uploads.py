@@ -0,0 +1,139 @@
+import hashlib
+import os
+import re
+import tempfile
+import uuid
+from typing import Any, Dict, Iterable
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    # python-multipart < 0.0.13 only ships the "multipart" package
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Allowance for multipart boundaries, part headers and small form fields around an uploaded file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+class UploadTooLarge(Exception):
+    """Raised once an upload exceeds the size limit"""
+
+def safe_filename(filename: str) -> str:
+    """Filename without directories or characters that are unsafe on disk"""
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).lstrip(".") or "upload"
+
+class MultipartUpload:
+    """
+    Incremental multipart/form-data parser that writes one file field straight to disk.
+
+    Request body bytes are fed with write() as they arrive, so neither the API nor the
+    multipart layer ever holds or spools the whole file. The file part goes to a temporary
+    file in upload_dir and is hashed on the way; write() raises UploadTooLarge as soon as the
+    file (or the body as a whole) exceeds the limit, and ValueError for a malformed body or a
+    filename without an allowed extension. finish() renames the complete file atomically to a
+    unique name (random prefix plus the sanitized filename); close() removes an unfinished one.
+    """
+
+    def __init__(self, content_type: str, upload_dir: str, max_bytes: int, field: str = "file",
+                 extensions: Iterable[str] = (".pdf",)):
+        mime, params = parse_options_header(content_type)
+        if mime != b"multipart/form-data" or not params.get(b"boundary"):
+            raise ValueError("Expected a multipart/form-data body")
+        self.upload_dir = upload_dir
+        self.max_bytes = max_bytes
+        self.field = field.encode()
+        self.extensions = tuple(extensions)
+        self.filename = None
+        self.size = 0
+        self.received = 0
+        self._digest = hashlib.sha256()
+        self._target = None
+        self._temp_path = None
+        self._in_file = False
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+        self._parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def write(self, data: bytes):
+        """Parse the next block of the request body"""
+        self.received += len(data)
+        if self.received > self.max_bytes + MULTIPART_OVERHEAD_BYTES:
+            raise UploadTooLarge(f"File exceeds the upload limit of {self.max_bytes} bytes")
+        self._parser.write(data)
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Move the complete file into place.
+
+        Returns:
+            Dictionary with the original "filename", the stored "file_path", its SHA-256
+            "content_hash" and its "size" in bytes
+        """
+        self._parser.finalize()
+        if self._temp_path is None or self._in_file:
+            raise ValueError(f"No complete '{self.field.decode()}' file field in the upload")
+        file_path = os.path.join(self.upload_dir, f"{uuid.uuid4().hex[:12]}_{safe_filename(self.filename)}")
+        os.replace(self._temp_path, file_path)
+        self._temp_path = None
+        return {"filename": self.filename, "file_path": file_path, "content_hash": self._digest.hexdigest(), "size": self.size}
+
+    def close(self):
+        """Release the temporary file of an upload that did not finish"""
+        if self._target is not None and not self._target.closed:
+            self._target.close()
+        if self._temp_path is not None:
+            try:
+                os.remove(self._temp_path)
+            except OSError:
+                pass
+            self._temp_path = None
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _on_headers_finished(self):
+        disposition, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if options.get(b"name") != self.field or b"filename" not in options:
+            return
+        if self._temp_path is not None:
+            raise ValueError(f"More than one '{self.field.decode()}' file field in the upload")
+        self.filename = options[b"filename"].decode("utf-8", errors="replace")
+        if not self.filename.lower().endswith(self.extensions):
+            raise ValueError(f"Only {', '.join(self.extensions)} files are supported")
+        os.makedirs(self.upload_dir, exist_ok=True)
+        fd, self._temp_path = tempfile.mkstemp(dir=self.upload_dir, prefix=".upload-", suffix=".part")
+        self._target = os.fdopen(fd, "wb")
+        self._in_file = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if not self._in_file:
+            return
+        self.size += end - start
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"File exceeds the upload limit of {self.max_bytes} bytes")
+        block = data[start:end]
+        self._digest.update(block)
+        self._target.write(block)
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._target.close()
+            self._in_file = False
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the Multi-Agent RFP Assistant
+
+Usage: python benchmark_system.py [benchmark_name ...]
+Runs every benchmark when no name is given.
+"""
+
+import time
+import sys
+import os
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SAMPLE_PDF = os.path.join(DATA_DIR, "1710.10903v3.pdf")
+
+def timed(func, *args, repeat: int = 3, **kwargs):
+    """Run func repeat times and return (best seconds, last result)"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_pdf_extraction():
+    """Serial vs. parallel page extraction on the sample PDF"""
+    from pdf_load import extract_text_from_pdf
+    from backend.config import Config
+
+    print("Benchmarking PDF extraction...")
+    workers = max(2, Config.PDF_EXTRACTION_WORKERS)
+    # Force the parallel path regardless of the document's page count
+    Config.PDF_PARALLEL_MIN_PAGES = 1
+
+    serial_seconds, serial = timed(extract_text_from_pdf, SAMPLE_PDF, workers=1)
+    parallel_seconds, parallel = timed(extract_text_from_pdf, SAMPLE_PDF, workers=workers)
+    pages = len({page_num for page_num, _ in serial})
+
+    print(f"   Pages: {pages}, paragraphs: {len(serial)}")
+    print(f"   Serial:            {serial_seconds * 1000:.1f} ms")
+    print(f"   Parallel ({workers} workers): {parallel_seconds * 1000:.1f} ms")
+    print(f"   Speedup: {serial_seconds / parallel_seconds:.2f}x")
+    if parallel != serial:
+        print("❌ Parallel output differs from serial output")
+        return False
+    print("✅ Parallel output matches serial output")
+    return True
+
+def load_sample_chunks():
+    """Chunk texts from every PDF in data/"""
+    from pdf_load import extract_text_from_pdf, split_pdf_into_chunks_with_metadata
+    from backend.config import Config
+
+    texts = []
+    for filename in sorted(os.listdir(DATA_DIR)):
+        if filename.lower().endswith(".pdf"):
+            chunks = split_pdf_into_chunks_with_metadata(
+                extract_text_from_pdf(os.path.join(DATA_DIR, filename)),
+                max_tokens=Config.get_chunk_size_tokens(),
+                overlap_tokens=Config.get_overlap_tokens()
+            )
+            texts.extend(chunk['text'] for chunk in chunks)
+    return texts
+
+def bench_embedding():
+    """
+    Embedding throughput per backend on the chunks of data/*.pdf.
+
+    Backends come from BENCH_EMBEDDING_MODELS (comma separated EMBEDDING_MODEL specs); vectors
+    from each backend are compared with the first one's by mean cosine similarity.
+    """
+    from embedding_backends import create_embedding_backend
+    from backend.config import Config
+
+    print("Benchmarking embedding backends...")
+    texts = load_sample_chunks()
+    specs = os.getenv("BENCH_EMBEDDING_MODELS", f"{Config.EMBEDDING_MODEL},onnx:{Config.EMBEDDING_MODEL}").split(",")
+    print(f"   Chunks: {len(texts)}, batch size: {Config.EMBEDDING_BATCH_SIZE}, threads: {Config.EMBEDDING_THREADS or 'default'}")
+
+    baseline = None
+    completed = 0
+    for spec in specs:
+        try:
+            backend = create_embedding_backend(
+                spec.strip(),
+                batch_size=Config.EMBEDDING_BATCH_SIZE,
+                threads=Config.EMBEDDING_THREADS,
+                normalize=True,
+                onnx_file=Config.EMBEDDING_ONNX_FILE,
+                host=Config.OLLAMA_BASE_URL,
+                timeout=Config.OLLAMA_TIMEOUT
+            )
+            backend.encode(texts[:8])  # warm-up
+            seconds, vectors = timed(backend.encode, texts, repeat=1)
+        except Exception as e:
+            print(f"   {spec}: skipped ({e})")
+            continue
+        agreement = ""
+        if baseline is None:
+            baseline = vectors
+        elif len(vectors[0]) == len(baseline[0]):
+            mean_cosine = sum(sum(a * b for a, b in zip(u, v)) for u, v in zip(vectors, baseline)) / len(vectors)
+            agreement = f", mean cosine vs {specs[0]}: {mean_cosine:.4f}"
+        print(f"   {backend.name}: {len(texts) / seconds:.1f} chunks/s ({seconds:.2f} s){agreement}")
+        completed += 1
+    if not completed:
+        print("❌ No embedding backend could be loaded")
+        return False
+    print("✅ Embedding benchmark finished")
+    return True
+
+def legacy_count_tokens(text: str) -> int:
+    """count_tokens as it was before the single-encoding chunker (tokenizer resolved per call)"""
+    import tiktoken
+    try:
+        tokenizer = tiktoken.get_encoding("cl100k_base")
+        return len(tokenizer.encode(text))
+    except Exception:
+        return int(len(text.split()) * 1.3)
+
+def legacy_split_by_tokens(text: str, max_tokens: int = 500, overlap_tokens: int = 50):
+    """Copy of the previous split_by_tokens, kept as the chunking baseline"""
+    from pdf_load import tokenize_sentences
+    sentences = tokenize_sentences(text)
+    chunks = []
+    current_chunk = ""
+    current_tokens = 0
+    for sentence in sentences:
+        sentence_tokens = legacy_count_tokens(sentence)
+        if current_tokens + sentence_tokens <= max_tokens:
+            current_chunk += (" " if current_chunk else "") + sentence
+            current_tokens += sentence_tokens
+        else:
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+            if overlap_tokens > 0 and chunks:
+                overlap_text = ""
+                overlap_count = 0
+                for sent in reversed(current_chunk.split('. ')):
+                    sent_tokens = legacy_count_tokens(sent)
+                    if overlap_count + sent_tokens <= overlap_tokens:
+                        overlap_text = sent + (". " if overlap_text else "") + overlap_text
+                        overlap_count += sent_tokens
+                    else:
+                        break
+                current_chunk = overlap_text + " " + sentence
+                current_tokens = legacy_count_tokens(current_chunk)
+            else:
+                current_chunk = sentence
+                current_tokens = sentence_tokens
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    # The old metadata step counted every finished chunk once more
+    return [(chunk, legacy_count_tokens(chunk)) for chunk in chunks]
+
+def bench_chunking():
+    """Legacy sentence re-counting chunker vs. the single-encoding chunker on data/*.pdf paragraphs"""
+    from pdf_load import extract_text_from_pdf, chunk_text_by_tokens
+    from backend.config import Config
+
+    print("Benchmarking chunking...")
+    paragraphs = [para for filename in sorted(os.listdir(DATA_DIR)) if filename.lower().endswith(".pdf")
+                  for _, para in extract_text_from_pdf(os.path.join(DATA_DIR, filename))]
+    # Small chunks force many chunk boundaries and overlaps, where the legacy cost was highest
+    settings = [(Config.get_chunk_size_tokens(), Config.get_overlap_tokens()), (64, 16)]
+    for max_tokens, overlap_tokens in settings:
+        legacy_seconds, legacy = timed(lambda: [c for p in paragraphs for c in legacy_split_by_tokens(p, max_tokens, overlap_tokens)])
+        linear_seconds, linear = timed(lambda: [c for p in paragraphs for c in chunk_text_by_tokens(p, max_tokens, overlap_tokens)])
+        oversized = sum(1 for chunk in linear if chunk["tokens"] > max_tokens)
+        print(f"   max_tokens={max_tokens}, overlap={overlap_tokens}: {len(paragraphs)} paragraphs")
+        print(f"      Legacy: {legacy_seconds * 1000:.1f} ms ({len(legacy)} chunks)")
+        print(f"      Linear: {linear_seconds * 1000:.1f} ms ({len(linear)} chunks, {oversized} over budget)")
+        print(f"      Speedup: {legacy_seconds / linear_seconds:.2f}x")
+    print("✅ Chunking benchmark finished")
+    return True
+
+def sentence_boundaries(text: str, sentences) -> set:
+    """Character offsets at which sentences start within text"""
+    boundaries = set()
+    position = 0
+    for sentence in sentences:
+        found = text.find(sentence.strip(), position)
+        if found >= 0:
+            boundaries.add(found)
+            position = found + len(sentence.strip())
+    return boundaries
+
+def bench_sentences():
+    """Built-in sentence segmenter vs. NLTK punkt on data/*.pdf: throughput and boundary agreement"""
+    from pdf_load import extract_text_from_pdf, clean_text, fast_sent_tokenize, get_nltk
+
+    print("Benchmarking sentence segmentation...")
+    texts = [clean_text(para) for filename in sorted(os.listdir(DATA_DIR)) if filename.lower().endswith(".pdf")
+             for _, para in extract_text_from_pdf(os.path.join(DATA_DIR, filename))]
+    fast_seconds, fast = timed(lambda: [fast_sent_tokenize(text) for text in texts])
+    fast_count = sum(len(sentences) for sentences in fast)
+    print(f"   Paragraphs: {len(texts)}, characters: {sum(len(text) for text in texts)}")
+    print(f"   Built-in: {fast_seconds * 1000:.1f} ms, {fast_count} sentences ({fast_count / fast_seconds:.0f} sentences/s)")
+    try:
+        nltk = get_nltk()
+        nltk.sent_tokenize("Warm up. Punkt.")
+    except Exception as e:
+        print(f"   NLTK: skipped ({e})")
+        print("✅ Sentence segmentation benchmark finished (no NLTK comparison)")
+        return True
+    nltk_seconds, reference = timed(lambda: [nltk.sent_tokenize(text) for text in texts])
+    nltk_count = sum(len(sentences) for sentences in reference)
+    print(f"   NLTK:     {nltk_seconds * 1000:.1f} ms, {nltk_count} sentences ({nltk_count / nltk_seconds:.0f} sentences/s)")
+    print(f"   Speedup: {nltk_seconds / fast_seconds:.2f}x")
+
+    # Boundary agreement, taking NLTK as the reference; every paragraph start is a trivial boundary
+    matched = predicted = expected = 0
+    for text, ours, theirs in zip(texts, fast, reference):
+        ours_boundaries = sentence_boundaries(text, ours) - {0}
+        theirs_boundaries = sentence_boundaries(text, theirs) - {0}
+        matched += len(ours_boundaries & theirs_boundaries)
+        predicted += len(ours_boundaries)
+        expected += len(theirs_boundaries)
+    precision = matched / predicted if predicted else 1.0
+    recall = matched / expected if expected else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    print(f"   Boundary agreement vs NLTK: precision {precision:.3f}, recall {recall:.3f}, F1 {f1:.3f}")
+    print("✅ Sentence segmentation benchmark finished")
+    return True
+
+def ranking_quality(rankings, expected):
+    """Hit rate at 1 and 3 and mean reciprocal rank of the expected item in each ranking"""
+    hits_at_1 = hits_at_3 = reciprocal_ranks = 0.0
+    for ranking, target in zip(rankings, expected):
+        if target in ranking:
+            rank = ranking.index(target) + 1
+            hits_at_1 += rank == 1
+            hits_at_3 += rank <= 3
+            reciprocal_ranks += 1.0 / rank
+    count = len(expected) or 1
+    return hits_at_1 / count, hits_at_3 / count, reciprocal_ranks / count
+
+def bench_rerank():
+    """
+    Cross-encoder reranking on data/*.pdf: latency per query and retrieval quality.
+
+    Each query is a sentence taken from the middle of a chunk with its words shuffled into
+    a question-like bag of words, and the chunk it came from is the expected answer. Vector
+    search over all chunks supplies RERANK_CANDIDATES candidates, which are compared before
+    and after reranking.
+    """
+    import random
+    from pdf_load import fast_sent_tokenize
+    from embedding_backends import create_embedding_backend
+    from reranker import CrossEncoderReranker
+    from backend.config import Config
+
+    print("Benchmarking cross-encoder reranking...")
+    texts = load_sample_chunks()
+    rng = random.Random(17)
+    queries, expected = [], []
+    for index, text in enumerate(texts):
+        sentences = [sentence for sentence in fast_sent_tokenize(text) if len(sentence.split()) >= 8]
+        if len(sentences) >= 3:
+            words = sentences[len(sentences) // 2].split()
+            rng.shuffle(words)
+            queries.append(" ".join(words[:12]))
+            expected.append(index)
+    queries, expected = queries[:50], expected[:50]
+    if not queries:
+        print("❌ No sample chunks long enough to build queries")
+        return False
+
+    embedder = create_embedding_backend(Config.EMBEDDING_MODEL, batch_size=Config.EMBEDDING_BATCH_SIZE, normalize=True)
+    chunk_vectors = embedder.encode(texts)
+    query_vectors = embedder.encode(queries)
+    candidates = min(Config.RERANK_CANDIDATES, Config.RERANK_MAX_CANDIDATES)
+    vector_rankings = []
+    for query_vector in query_vectors:
+        similarities = [sum(a * b for a, b in zip(query_vector, vector)) for vector in chunk_vectors]
+        vector_rankings.append(sorted(range(len(texts)), key=similarities.__getitem__, reverse=True)[:candidates])
+
+    reranker = CrossEncoderReranker(Config.RERANK_MODEL, max_candidates=Config.RERANK_MAX_CANDIDATES,
+                                    batch_size=Config.RERANK_BATCH_SIZE, cache_entries=Config.RERANK_CACHE_ENTRIES)
+    reranker.score("warm-up", ["warm-up"])
+
+    def rerank_all():
+        rankings = []
+        for query, ranking in zip(queries, vector_rankings):
+            chunks = [{"id": index, "text": texts[index]} for index in ranking]
+            rankings.append([chunk["id"] for chunk in reranker.rerank(query, chunks, candidates)])
+        return rankings
+
+    cold_seconds, reranked = timed(rerank_all, repeat=1)
+    cached_seconds, _ = timed(rerank_all, repeat=1)
+    print(f"   Chunks: {len(texts)}, queries: {len(queries)}, candidates per query: {candidates}")
+    print(f"   Rerank latency: {cold_seconds / len(queries) * 1000:.1f} ms/query, {cached_seconds / len(queries) * 1000:.2f} ms/query with cached scores")
+    for label, rankings in (("Vector only", vector_rankings), ("Reranked", reranked)):
+        hit_1, hit_3, mrr = ranking_quality(rankings, expected)
+        print(f"   {label}: hit@1 {hit_1:.3f}, hit@3 {hit_3:.3f}, MRR {mrr:.3f}")
+    print("✅ Reranking benchmark finished")
+    return True
+
+BENCHMARKS = {
+    "pdf_extraction": bench_pdf_extraction,
+    "embedding": bench_embedding,
+    "chunking": bench_chunking,
+    "sentences": bench_sentences,
+    "rerank": bench_rerank,
+}
+
+def main():
+    """Run the selected benchmarks"""
+    print("⏱️  Multi-Agent RFP Assistant Benchmarks")
+    print("=" * 50)
+
+    names = sys.argv[1:] or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmarks: {', '.join(unknown)}. Available: {', '.join(BENCHMARKS)}")
+        return False
+
+    passed = 0
+    for name in names:
+        try:
+            if BENCHMARKS[name]():
+                passed += 1
+        except Exception as e:
+            print(f"❌ Benchmark {name} failed with exception: {e}")
+        print()
+
+    print("=" * 50)
+    print(f"📊 Benchmarks: {passed}/{len(names)} completed")
+    return passed == len(names)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
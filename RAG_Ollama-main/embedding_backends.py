@@ -0,0 +1,148 @@
+import logging
+import math
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBackend:
+    """
+    Interface for text embedding backends.
+
+    encode() embeds texts in batches of batch_size and returns plain lists of floats,
+    L2-normalized unless normalize is off (ChromaDB distances assume unit-length vectors).
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32, threads: int = 0, normalize: bool = True):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.threads = threads
+        self.normalize = normalize
+
+    @property
+    def name(self) -> str:
+        """Backend-qualified model name, as written in Config.EMBEDDING_MODEL"""
+        return self.model_name
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the vectors this backend produces, for the embedding cache"""
+        return self.name if self.normalize else f"{self.name}|unnormalized"
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+def normalize_vectors(vectors: List[List[float]]) -> List[List[float]]:
+    """Scale vectors to unit length (zero vectors are left unchanged)"""
+    normalized = []
+    for vector in vectors:
+        norm = math.sqrt(sum(value * value for value in vector))
+        normalized.append([value / norm for value in vector] if norm else list(vector))
+    return normalized
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """sentence-transformers model on PyTorch (the default backend)"""
+
+    def __init__(self, model_name: str, **kwargs):
+        super().__init__(model_name, **kwargs)
+        from sentence_transformers import SentenceTransformer
+        if self.threads:
+            import torch
+            torch.set_num_threads(self.threads)
+        self.model = SentenceTransformer(model_name, **self._model_kwargs())
+
+    def _model_kwargs(self) -> dict:
+        return {}
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=self.normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).tolist()
+
+class OnnxBackend(SentenceTransformerBackend):
+    """
+    sentence-transformers model exported to ONNX and run with onnxruntime on the CPU.
+
+    Loads the int8-quantized weights named by Config.EMBEDDING_ONNX_FILE; requires
+    sentence-transformers >= 3.2 with the onnx extra (optimum + onnxruntime).
+    """
+
+    def __init__(self, model_name: str, onnx_file: Optional[str] = None, **kwargs):
+        self.onnx_file = onnx_file
+        super().__init__(model_name, **kwargs)
+
+    @property
+    def name(self) -> str:
+        return f"onnx:{self.model_name}"
+
+    @property
+    def cache_key(self) -> str:
+        return f"{super().cache_key}|{self.onnx_file or 'default'}"
+
+    def _model_kwargs(self) -> dict:
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if self.onnx_file:
+            model_kwargs["file_name"] = self.onnx_file
+        if self.threads:
+            import onnxruntime
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = self.threads
+            model_kwargs["session_options"] = session_options
+        return {"backend": "onnx", "device": "cpu", "model_kwargs": model_kwargs}
+
+class OllamaBackend(EmbeddingBackend):
+    """Embeddings from Ollama's /api/embed endpoint (ollama >= 0.3, batched input)"""
+
+    def __init__(self, model_name: str, host: Optional[str] = None, timeout: Optional[float] = None, **kwargs):
+        super().__init__(model_name, **kwargs)
+        import ollama
+        self.client = ollama.Client(host=host, timeout=timeout)
+
+    @property
+    def name(self) -> str:
+        return f"ollama:{self.model_name}"
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            response = self.client.embed(model=self.model_name, input=texts[start:start + self.batch_size])
+            vectors.extend(list(vector) for vector in response["embeddings"])
+        return normalize_vectors(vectors) if self.normalize else vectors
+
+BACKENDS = {
+    "sentence-transformers": SentenceTransformerBackend,
+    "onnx": OnnxBackend,
+    "ollama": OllamaBackend,
+}
+
+def parse_embedding_model(spec: str):
+    """Split "backend:model" into (backend, model); a bare model name uses sentence-transformers"""
+    prefix, separator, model_name = spec.partition(":")
+    if separator and prefix in BACKENDS:
+        return prefix, model_name
+    return "sentence-transformers", spec
+
+def create_embedding_backend(spec: str, batch_size: int = 32, threads: int = 0, normalize: bool = True,
+                             **options) -> EmbeddingBackend:
+    """
+    Build the embedding backend for a model spec such as "all-MiniLM-L6-v2",
+    "onnx:all-MiniLM-L6-v2" or "ollama:nomic-embed-text".
+
+    Backend-specific options (onnx_file for ONNX; host and timeout for Ollama) are passed
+    only to the backend that accepts them.
+    """
+    backend_name, model_name = parse_embedding_model(spec)
+    common = {"batch_size": batch_size, "threads": threads, "normalize": normalize}
+    if backend_name == "onnx":
+        backend = OnnxBackend(model_name, onnx_file=options.get("onnx_file"), **common)
+    elif backend_name == "ollama":
+        backend = OllamaBackend(model_name, host=options.get("host"), timeout=options.get("timeout"), **common)
+    else:
+        backend = SentenceTransformerBackend(model_name, **common)
+    logger.info(f"Embedding backend: {backend.name} (batch_size={batch_size}, threads={threads or 'default'}, normalize={normalize})")
+    return backend
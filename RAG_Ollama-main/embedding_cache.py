@@ -0,0 +1,61 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Dict, List
+
+def text_hash(text: str) -> str:
+    """Stable hash of a chunk text (whitespace-normalized)"""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """Persistent text-hash -> embedding cache, keyed per embedding model"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Return the cached embeddings for the given text hashes"""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" for _ in batch)
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model] + batch
+                ).fetchall()
+                for hash_value, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[hash_value] = vector.tolist()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        """Store embeddings by text hash"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, hash_value, array("f", vector).tobytes()) for hash_value, vector in items.items()]
+            )
+            self._conn.commit()
+
+    def count(self, model: str = None) -> int:
+        """Number of cached embeddings, optionally for one model"""
+        with self._lock:
+            if model is None:
+                return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (model,)).fetchone()[0]
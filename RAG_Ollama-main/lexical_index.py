@@ -0,0 +1,239 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Keeps identifiers such as "rfp-2024-017", "3.2.1" and "24/7" as single terms
+TERM_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+""".split())
+
+# Word positions are stored space separated, in ascending order
+POSTINGS_TABLE = (
+    "CREATE TABLE {if_not_exists}postings ("
+    "term TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL, positions TEXT NOT NULL, "
+    "PRIMARY KEY (term, chunk_id)) WITHOUT ROWID"
+)
+# Document ID, version, page and chunk index are kept per chunk so filtered and ordered searches never leave the index
+CHUNKS_TABLE = (
+    "CREATE TABLE {if_not_exists}chunks ("
+    "chunk_id TEXT PRIMARY KEY, length INTEGER NOT NULL, document_id TEXT, page INTEGER, version INTEGER, chunk_index INTEGER)"
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased index terms of a text, without stopwords"""
+    return [term for term in TERM_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+def term_positions(text: str) -> Dict[str, List[int]]:
+    """
+    Positions of each index term in a text.
+
+    Positions count every word, stopwords included, so "scope of work" puts "scope" and
+    "work" two positions apart even though "of" itself is not indexed.
+    """
+    positions = defaultdict(list)
+    for position, term in enumerate(TERM_PATTERN.findall(text.lower())):
+        if term not in STOPWORDS:
+            positions[term].append(position)
+    return positions
+
+def phrase_pattern(phrase: str) -> Optional[re.Pattern]:
+    """Case-insensitive regex for a phrase's words separated by any punctuation or whitespace"""
+    words = TERM_PATTERN.findall(phrase.lower())
+    if not words:
+        return None
+    return re.compile(r"(?<![a-z0-9])" + r"[^a-z0-9]+".join(re.escape(word) for word in words) + r"(?![a-z0-9])", re.IGNORECASE)
+
+class LexicalIndex:
+    """
+    Persistent inverted index over chunk texts with BM25 scoring.
+
+    Postings (term, chunk_id, term frequency, word positions) and chunk lengths, document IDs
+    and pages live in SQLite and are updated incrementally as chunks are upserted into or
+    deleted from ChromaDB. The positions answer exact phrase lookups without reading chunk
+    texts. Searches take optional filters: {"document_ids": [...], "page_start": n, "page_end": m,
+    "hidden_versions": {document_id: [version, ...]}}.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(POSTINGS_TABLE.format(if_not_exists="IF NOT EXISTS "))
+        self._conn.execute(CHUNKS_TABLE.format(if_not_exists="IF NOT EXISTS "))
+        postings_columns = [row[1] for row in self._conn.execute("PRAGMA table_info(postings)")]
+        chunks_columns = [row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")]
+        if "positions" not in postings_columns or not {"version", "chunk_index"} <= set(chunks_columns):
+            # Index written by an older version: drop it so the backfill rebuilds it
+            self._conn.execute("DROP TABLE postings")
+            self._conn.execute("DROP TABLE chunks")
+            self._conn.execute(POSTINGS_TABLE.format(if_not_exists=""))
+            self._conn.execute(CHUNKS_TABLE.format(if_not_exists=""))
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_chunk_id ON postings (chunk_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_document_page ON chunks (document_id, page)")
+        self._conn.commit()
+
+    def upsert(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]] = None):
+        """Index chunks (with their "document_id", "page", "version" and "chunk_index" metadata), replacing IDs that are already indexed"""
+        if metadatas is None:
+            metadatas = [{} for _ in ids]
+        with self._lock:
+            with self._conn:
+                self._delete(ids)
+                for chunk_id, text, meta in zip(ids, texts, metadatas):
+                    meta = meta or {}
+                    positions = term_positions(text)
+                    length = sum(len(offsets) for offsets in positions.values())
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO chunks (chunk_id, length, document_id, page, version, chunk_index) VALUES (?, ?, ?, ?, ?, ?)",
+                        (chunk_id, length, meta.get("document_id"), meta.get("page"), meta.get("version"), meta.get("chunk_index"))
+                    )
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO postings (term, chunk_id, tf, positions) VALUES (?, ?, ?, ?)",
+                        [(term, chunk_id, len(offsets), " ".join(map(str, offsets))) for term, offsets in positions.items()]
+                    )
+
+    def delete(self, ids: List[str]):
+        """Remove chunks from the index"""
+        with self._lock:
+            with self._conn:
+                self._delete(ids)
+
+    def _delete(self, ids: List[str]):
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ",".join("?" for _ in batch)
+            self._conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", batch)
+
+    @staticmethod
+    def _filter_sql(filters: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        """SQL conditions on the chunks table (aliased c) for search filters"""
+        conditions, params = [], []
+        filters = filters or {}
+        if filters.get("document_ids"):
+            conditions.append(f"c.document_id IN ({','.join('?' for _ in filters['document_ids'])})")
+            params.extend(filters["document_ids"])
+        if filters.get("page_start") is not None:
+            conditions.append("c.page >= ?")
+            params.append(filters["page_start"])
+        if filters.get("page_end") is not None:
+            conditions.append("c.page <= ?")
+            params.append(filters["page_end"])
+        for document_id, versions in (filters.get("hidden_versions") or {}).items():
+            # Chunks written before versions were recorded count as version 0, which is never hidden
+            conditions.append(f"NOT (c.document_id = ? AND COALESCE(c.version, 0) IN ({','.join('?' for _ in versions)}))")
+            params.extend([document_id, *versions])
+        return "".join(f" AND {condition}" for condition in conditions), params
+
+    def count(self) -> int:
+        """Number of indexed chunks"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def search(self, query: str, n_results: int = 10, filters: Dict[str, Any] = None) -> List[Tuple[str, float]]:
+        """
+        Rank chunks for a query with BM25 (collection-wide term statistics, filtered candidates).
+
+        Returns:
+            (chunk_id, score) pairs, best first
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        placeholders = ",".join("?" for _ in terms)
+        conditions, params = self._filter_sql(filters)
+        with self._lock:
+            total, average_length = self._conn.execute("SELECT COUNT(*), AVG(length) FROM chunks").fetchone()
+            if not total:
+                return []
+            document_frequency = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term", terms
+            ).fetchall())
+            rows = self._conn.execute(
+                f"SELECT p.term, p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.chunk_id = p.chunk_id "
+                f"WHERE p.term IN ({placeholders}){conditions}", terms + params
+            ).fetchall()
+        average_length = average_length or 1.0
+        scores: Dict[str, float] = {}
+        for term, chunk_id, tf, length in rows:
+            df = document_frequency[term]
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * length / average_length)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+    def phrase_search(self, phrase: str, limit: int = None, filters: Dict[str, Any] = None,
+                      document_order: bool = False) -> List[Tuple[str, int]]:
+        """
+        Find chunks in which the phrase's index terms occur at the phrase's relative positions.
+
+        Stopwords inside the phrase only fix the gaps between terms, so callers that need the
+        exact wording should confirm matches against the chunk text (see phrase_pattern).
+
+        Returns:
+            (chunk_id, occurrences) pairs, most occurrences first, or in (page, chunk index)
+            order with document_order
+        """
+        words = TERM_PATTERN.findall(phrase.lower())
+        terms = [(term, offset) for offset, term in enumerate(words) if term not in STOPWORDS]
+        if not terms:
+            return []
+        conditions, params = self._filter_sql(filters)
+        # Intersect on the rarest term first so the candidate set starts small
+        with self._lock:
+            frequency = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({','.join('?' for _ in terms)}) GROUP BY term",
+                [term for term, _ in terms]
+            ).fetchall())
+            if len(frequency) < len({term for term, _ in terms}):
+                return []
+            terms.sort(key=lambda item: frequency[item[0]])
+            starts = None
+            for term, offset in terms:
+                if starts is None:
+                    rows = self._conn.execute(
+                        f"SELECT p.chunk_id, p.positions FROM postings p JOIN chunks c ON c.chunk_id = p.chunk_id "
+                        f"WHERE p.term = ?{conditions}", [term, *params]
+                    ).fetchall()
+                else:
+                    candidates = list(starts)
+                    rows = []
+                    for batch_start in range(0, len(candidates), 500):
+                        batch = candidates[batch_start:batch_start + 500]
+                        rows.extend(self._conn.execute(
+                            f"SELECT chunk_id, positions FROM postings WHERE term = ? AND chunk_id IN ({','.join('?' for _ in batch)})",
+                            [term, *batch]
+                        ).fetchall())
+                matched = {}
+                for chunk_id, positions in rows:
+                    # Candidate phrase start positions consistent with this term
+                    term_starts = {int(position) - offset for position in positions.split()}
+                    if starts is not None:
+                        term_starts &= starts[chunk_id]
+                    if term_starts:
+                        matched[chunk_id] = term_starts
+                starts = matched
+                if not starts:
+                    return []
+            if document_order:
+                candidates = list(starts)
+                locations = {}
+                for batch_start in range(0, len(candidates), 500):
+                    batch = candidates[batch_start:batch_start + 500]
+                    locations.update((chunk_id, (page is None, page or 0, chunk_index or 0, chunk_id)) for chunk_id, page, chunk_index in self._conn.execute(
+                        f"SELECT chunk_id, page, chunk_index FROM chunks WHERE chunk_id IN ({','.join('?' for _ in batch)})", batch
+                    ))
+        hits = [(chunk_id, len(positions)) for chunk_id, positions in starts.items()]
+        if document_order:
+            hits.sort(key=lambda item: locations[item[0]])
+        else:
+            hits.sort(key=lambda item: item[1], reverse=True)
+        return hits[:limit] if limit else hits
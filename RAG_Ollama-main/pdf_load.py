@@ -1,22 +1,28 @@
 import PyPDF2
-import nltk
 import re
-from typing import List, Tuple, Dict, Any
+import bisect
+import itertools
+import multiprocessing
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Dict, Any, Optional, Callable, Iterable, Iterator
 import tiktoken
+from backend.config import Config
 
-# Always download 'punkt' for sentence tokenization
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-
-# Download required NLTK data
-nltk.download('averaged_perceptron_tagger', quiet=True)
-nltk.download('maxent_ne_chunker', quiet=True)
-nltk.download('words', quiet=True)
+@lru_cache(maxsize=1)
+def get_nltk():
+    """Import NLTK and make sure its punkt data is available, on first use rather than at import time"""
+    import nltk
+    try:
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        nltk.download('punkt')
+    return nltk
 
+@lru_cache(maxsize=1)
 def get_tokenizer():
-    """Get tiktoken tokenizer for accurate token counting"""
+    """Get tiktoken tokenizer for accurate token counting (resolved once per process)"""
     try:
         return tiktoken.get_encoding("cl100k_base")  # OpenAI's encoding
     except:
@@ -36,21 +42,85 @@ def clean_text(text: str) -> str:
     text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)\[\]\{\}]', ' ', text)
     return text.strip()
 
+# Words that end with a period without ending the sentence
+ABBREVIATIONS = frozenset({
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "inc", "ltd", "co", "corp", "llc", "dept", "govt",
+    "e.g", "i.e", "eg", "ie", "cf", "vs", "viz", "al", "approx", "est", "min", "max", "avg", "no", "nos",
+    "sec", "art", "fig", "figs", "vol", "vols", "pp", "para", "paras", "ch", "app", "ref", "refs", "ed", "rev",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+    "u.s", "u.s.a", "u.k", "d.c", "p.o", "a.m", "p.m", "ph.d"
+})
+# Words after which a number is a reference ("Section 3. The ...") rather than the end of a sentence
+REFERENCE_WORDS = frozenset({
+    "section", "sections", "article", "part", "item", "items", "chapter", "appendix", "exhibit", "attachment",
+    "schedule", "page", "pages", "figure", "table", "step", "phase", "task", "tab", "volume", "clause", "paragraph"
+})
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+(?=["\'(\[]?[A-Z0-9])')
+LIST_ITEM_SEPARATOR = re.compile(r'\s+-\s+(?=\S)')
+NUMBER_LIKE = re.compile(r'\d+(?:\.\d+)*|[IVXLC]{1,4}')
+
+def _ends_sentence(text: str, sentence_start: int, period: int) -> bool:
+    """Decide whether the period at text[period] ends the sentence that began at sentence_start"""
+    word_start = text.rfind(' ', sentence_start, period) + 1
+    word = text[max(word_start, sentence_start):period].lstrip('(["\'')
+    if word.lower() in ABBREVIATIONS:
+        return False
+    if len(word) == 1 and word.isalpha():
+        return False  # an initial, as in "J. Smith"
+    if NUMBER_LIKE.fullmatch(word):
+        if word_start <= sentence_start:
+            return False  # enumeration marker such as "1." or "3.2.1." opening a fragment
+        previous_start = text.rfind(' ', sentence_start, word_start - 1) + 1
+        if text[max(previous_start, sentence_start):word_start - 1].lower() in REFERENCE_WORDS:
+            return False
+    return True
+
+def fast_sent_tokenize(text: str) -> List[str]:
+    """
+    Dependency-free sentence segmenter tuned for RFP text.
+    
+    Splits after ., ! or ? followed by whitespace and an upper-case letter or digit, except
+    after known abbreviations, initials, enumeration markers ("1.", "3.2.1.") and references
+    such as "Section 4." Bullet lists from segment_page ("- item - item") are split into
+    their items first. Sentences are returned as substrings of text.
+    """
+    if text.startswith("- "):
+        return [sentence for item in LIST_ITEM_SEPARATOR.split(text) for sentence in fast_sent_tokenize(item.lstrip("- "))]
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        punctuation = match.start()
+        if text[punctuation] == '.' and not _ends_sentence(text, start, punctuation):
+            continue
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    tail = text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
 def tokenize_sentences(text: str) -> List[str]:
-    """Advanced sentence tokenization with technical content handling"""
+    """
+    Advanced sentence tokenization with technical content handling.
+    Uses the built-in segmenter, or NLTK punkt when Config.SENTENCE_SEGMENTER is "nltk".
+    """
     # Clean the text first
     text = clean_text(text)
+    if Config.SENTENCE_SEGMENTER != "nltk":
+        return fast_sent_tokenize(text)
     try:
-        return nltk.sent_tokenize(text)
+        return get_nltk().sent_tokenize(text)
     except Exception as e:
         import logging
-        logging.error(f"NLTK sentence tokenization failed: {e}. Falling back to simple split.")
-        return text.split('.')
+        logging.error(f"NLTK sentence tokenization failed: {e}. Falling back to the built-in segmenter.")
+        return fast_sent_tokenize(text)
 
 def tokenize_words(text: str) -> List[str]:
     """Word tokenization with technical term preservation"""
     # Use NLTK word tokenizer
-    words = nltk.word_tokenize(text)
+    words = get_nltk().word_tokenize(text)
     
     # Preserve technical terms and acronyms
     refined_words = []
@@ -65,121 +135,370 @@ def tokenize_words(text: str) -> List[str]:
     
     return refined_words
 
+# Without tiktoken, words and punctuation marks each count as one token (close to BPE counts for prose);
+# count_tokens and token_offsets share it so chunk sizes and context budgets agree
+FALLBACK_TOKEN = re.compile(r'\w+|[^\w\s]')
+
 def count_tokens(text: str) -> int:
-    """Count tokens using tiktoken or fallback to word-based approximation"""
+    """Count tokens using tiktoken or fallback to the FALLBACK_TOKEN approximation"""
     tokenizer = get_tokenizer()
     if tokenizer:
         try:
             return len(tokenizer.encode(text))
         except:
             pass
-    
-    # Fallback: approximate tokens as words * 1.3 (typical ratio)
-    words = text.split()
-    return int(len(words) * 1.3)
+    return len(FALLBACK_TOKEN.findall(text))
 
-def split_by_tokens(text: str, max_tokens: int = 500, overlap_tokens: int = 50) -> List[str]:
-    """Split text by token count rather than character count"""
+def token_offsets(text: str) -> List[int]:
+    """
+    Encode text once and return the character offset at which each token starts.
+    Without tiktoken the tokens are the FALLBACK_TOKEN matches, as in count_tokens.
+    """
     tokenizer = get_tokenizer()
-    sentences = tokenize_sentences(text)
+    if tokenizer:
+        try:
+            _, offsets = tokenizer.decode_with_offsets(tokenizer.encode(text))
+            return offsets
+        except:
+            pass
+    return [match.start() for match in FALLBACK_TOKEN.finditer(text)]
+
+def sentence_starts(text: str) -> List[int]:
+    """Character offsets at which the sentences of text start"""
+    starts = []
+    position = 0
+    for sentence in tokenize_sentences(text):
+        found = text.find(sentence.strip(), position)
+        if found < 0:
+            continue
+        starts.append(found)
+        position = found + len(sentence.strip())
+    return starts or [0]
+
+def chunk_text_by_tokens(text: str, max_tokens: int = 500, overlap_tokens: int = 50) -> List[Dict[str, Any]]:
+    """
+    Split text into chunks of at most max_tokens, breaking at sentence boundaries.
+    
+    The text is encoded once; chunks and their overlaps (trailing whole sentences of up to
+    overlap_tokens) are slices of that token sequence, so the cost is linear in the number
+    of tokens. Sentences longer than max_tokens are cut into token windows.
+    Returns dicts: {"text": ..., "tokens": ..., "char_start": ..., "char_end": ...}, with
+    character offsets into the cleaned text.
+    """
+    text = clean_text(text)
+    offsets = token_offsets(text)
+    if not offsets:
+        return []
+    # Sentence boundaries as token indices: the token containing each sentence's first character
+    boundaries = sorted({max(0, bisect.bisect_right(offsets, start) - 1) for start in sentence_starts(text)} | {0})
+    boundaries.append(len(offsets))
+    
+    def make_chunk(token_start: int, token_end: int) -> Dict[str, Any]:
+        char_start = offsets[token_start]
+        char_end = offsets[token_end] if token_end < len(offsets) else len(text)
+        raw = text[char_start:char_end]
+        stripped = raw.strip()
+        char_start += len(raw) - len(raw.lstrip())
+        return {"text": stripped, "tokens": token_end - token_start, "char_start": char_start, "char_end": char_start + len(stripped)}
     
     chunks = []
-    current_chunk = ""
-    current_tokens = 0
-    
-    for sentence in sentences:
-        sentence_tokens = count_tokens(sentence)
-        
-        if current_tokens + sentence_tokens <= max_tokens:
-            current_chunk += (" " if current_chunk else "") + sentence
-            current_tokens += sentence_tokens
+    chunk_start = 0  # token index where the current chunk begins
+    first_sentence = 0  # index into boundaries of the current chunk's first whole sentence
+    sentence = 0
+    while sentence < len(boundaries) - 1:
+        sentence_end = boundaries[sentence + 1]
+        if sentence_end - chunk_start <= max_tokens:
+            sentence += 1
+            continue
+        if boundaries[sentence] <= chunk_start:
+            # A single sentence longer than max_tokens: cut it into token windows
+            window_end = chunk_start + max_tokens
+            chunks.append(make_chunk(chunk_start, window_end))
+            chunk_start = max(window_end - overlap_tokens, chunk_start + 1) if overlap_tokens > 0 else window_end
+            first_sentence = sentence
+            continue
+        chunks.append(make_chunk(chunk_start, boundaries[sentence]))
+        # Overlap: carry trailing whole sentences of the finished chunk into the next one
+        back = sentence
+        while (overlap_tokens > 0 and back - 1 >= first_sentence and boundaries[back - 1] > chunk_start
+               and boundaries[sentence] - boundaries[back - 1] <= overlap_tokens):
+            back -= 1
+        first_sentence = back
+        chunk_start = boundaries[back]
+    if chunk_start < len(offsets):
+        chunks.append(make_chunk(chunk_start, len(offsets)))
+    return [chunk for chunk in chunks if chunk["text"]]
+
+def split_by_tokens(text: str, max_tokens: int = 500, overlap_tokens: int = 50) -> List[str]:
+    """Split text by token count rather than character count"""
+    return [chunk["text"] for chunk in chunk_text_by_tokens(text, max_tokens, overlap_tokens)]
+
+# Layout patterns, matched against raw PDF lines before whitespace is normalized
+NUMBERED_HEADING = re.compile(
+    r'^(?:(?:section|article|part)\s+)?(?:\d+(?:\.\d+)*|[IVXLC]+)[.)]?\s+[A-Z][^.!?]*$', re.IGNORECASE
+)
+BULLET_ITEM = re.compile(r'^(?:[•●○◦▪■□\-\*–]|\(?[a-z0-9]{1,3}[.)])\s+')
+# Table of contents entry: dot leaders followed by a page number
+TOC_ENTRY = re.compile(r'(?:\.\s*){4,}\d+$')
+TERMINAL_PUNCTUATION = ('.', '!', '?', ':', ';')
+# Running headers and footers are looked for among the first and last blocks of each page
+RUNNING_BLOCK_WINDOW = 4
+RUNNING_BLOCK_MAX_WORDS = 12
+
+def is_title_like(words: List[str]) -> bool:
+    """True when most significant words are capitalized, as in headings"""
+    significant = [word for word in words if len(word) > 3 and word[0].isalpha()]
+    return not significant or sum(word[0].isupper() for word in significant) / len(significant) >= 0.6
+
+def classify_line(line: str) -> str:
+    """Classify a stripped PDF text line as "heading", "bullet" or "text" """
+    words = line.split()
+    is_bullet = bool(BULLET_ITEM.match(line))
+    if len(words) > 12 or line.endswith(('.', ',', ';')) or TOC_ENTRY.search(line):
+        return "bullet" if is_bullet else "text"
+    if NUMBERED_HEADING.match(line) and (re.match(r'^\d+\.\d+', line) or is_title_like(words[1:])):
+        return "heading"
+    letters = [char for char in line if char.isalpha()]
+    if len(letters) >= 3 and sum(char.isupper() for char in letters) / len(letters) > 0.8:
+        return "heading"
+    if line.endswith(':') and len(words) <= 8 and not is_bullet and is_title_like(words):
+        return "heading"
+    return "bullet" if is_bullet else "text"
+
+def join_lines(lines: List[str]) -> str:
+    """Join wrapped PDF lines, undoing end-of-line hyphenation"""
+    text = ""
+    for line in lines:
+        if text.endswith('-') and line[:1].islower():
+            text = text[:-1] + line
         else:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            
-            # Handle overlap
-            if overlap_tokens > 0 and chunks:
-                # Get last few sentences for overlap
-                overlap_text = ""
-                overlap_count = 0
-                for sent in reversed(current_chunk.split('. ')):
-                    sent_tokens = count_tokens(sent)
-                    if overlap_count + sent_tokens <= overlap_tokens:
-                        overlap_text = sent + (". " if overlap_text else "") + overlap_text
-                        overlap_count += sent_tokens
-                    else:
-                        break
-                current_chunk = overlap_text + " " + sentence
-                current_tokens = count_tokens(current_chunk)
-            else:
-                current_chunk = sentence
-                current_tokens = sentence_tokens
+            text += (" " if text else "") + line
+    return text
+
+def segment_page(page_text: str) -> List[Tuple[str, str]]:
+    """
+    Split one page of raw extracted text into layout blocks before any normalization.
     
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+    Returns (kind, text) tuples in reading order, where kind is "heading" (all-caps,
+    numbered section or short colon-terminated lines), "list" (consecutive bullet or
+    enumerated items) or "paragraph". Paragraphs end at blank lines, headings, list items
+    and short lines that finish a sentence. Block text is cleaned with clean_text.
+    """
+    lines = [line.strip() for line in page_text.splitlines()]
+    text_lengths = sorted(len(line) for line in lines if line)
+    typical_length = text_lengths[len(text_lengths) // 2] if text_lengths else 0
+    
+    blocks = []
+    kind, current = None, []
     
-    return chunks
+    def flush():
+        nonlocal kind, current
+        if current:
+            if kind == "list":
+                text = " ".join(f"- {BULLET_ITEM.sub('', item, count=1)}" for item in current)
+            else:
+                text = join_lines(current)
+            blocks.append((kind, clean_text(text)))
+        kind, current = None, []
+    
+    for line in lines:
+        if not line:
+            flush()
+            continue
+        line_kind = classify_line(line)
+        if line_kind == "heading":
+            flush()
+            blocks.append(("heading", clean_text(line.rstrip(':'))))
+        elif line_kind == "bullet":
+            if kind != "list":
+                flush()
+                kind = "list"
+            current.append(line)
+        elif kind == "list" and (line[:1].islower() or current[-1].endswith(('-', ','))):
+            # Wrapped continuation of the last list item
+            current[-1] = join_lines([current[-1], line])
+        else:
+            if kind == "list":
+                flush()
+            kind = "paragraph"
+            current.append(line)
+            if line.endswith(TERMINAL_PUNCTUATION) and len(line) < 0.6 * typical_length:
+                flush()
+    flush()
+    return [(block_kind, text) for block_kind, text in blocks if text]
 
-def extract_text_from_pdf(pdf_path: str) -> List[Tuple[int, str]]:
+def extract_page_paragraphs(page_text: str) -> List[str]:
+    """Clean one page of extracted text and split it into paragraphs (headings are dropped)"""
+    return [text for kind, text in segment_page(page_text) if kind != "heading" and len(text) > 10]
+
+def extract_page_range(pdf_path: str, start: int, end: int) -> List[Tuple[int, List[Tuple[str, str]]]]:
+    """Segment pages start..end-1 (0-based) into layout blocks; runs inside extraction workers"""
+    with open(pdf_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        return [
+            (index + 1, segment_page(reader.pages[index].extract_text() or ""))
+            for index in range(start, min(end, len(reader.pages)))
+        ]
+
+def iter_pdf_pages(pdf_path: str, progress: Optional[Callable[[int, int], None]] = None,
+                   workers: Optional[int] = None) -> Iterator[Tuple[int, List[Tuple[str, str]]]]:
     """
-    Extracts text from a PDF and returns a list of (page_num, paragraph) tuples.
-    Uses improved text cleaning and paragraph detection.
+    Yields (page_num, blocks) for each page of a PDF, in page order, where blocks are the
+    (kind, text) layout blocks from segment_page.
+    If given, progress(pages_done, pages_total) is called as pages complete.
+    
+    Documents with at least Config.PDF_PARALLEL_MIN_PAGES pages are split into page ranges
+    that are extracted by a pool of `workers` processes (Config.PDF_EXTRACTION_WORKERS by
+    default). Only a few ranges are in flight at a time, so pages are produced as the
+    consumer asks for them rather than all at once.
     """
-    paragraphs = []
+    workers = Config.PDF_EXTRACTION_WORKERS if workers is None else workers
     with open(pdf_path, "rb") as f:
         reader = PyPDF2.PdfReader(f)
-        for page_num, page in enumerate(reader.pages, 1):
-            page_text = page.extract_text() or ""
-            
-            # Clean the page text
-            page_text = clean_text(page_text)
-            
-            # Split by paragraph markers (double newlines, section breaks, etc.)
-            paragraph_markers = [
-                r'\n\s*\n',           # Double newlines
-                r'\n\s*[A-Z][A-Z\s]+\n',  # Section headers
-                r'\n\s*\d+\.\s*\n',   # Numbered sections
-                r'\n\s*[•\-]\s*\n',   # Bullet points
+        pages_total = len(reader.pages)
+        if workers <= 1 or pages_total < Config.PDF_PARALLEL_MIN_PAGES:
+            for index, page in enumerate(reader.pages):
+                yield index + 1, segment_page(page.extract_text() or "")
+                if progress:
+                    progress(index + 1, pages_total)
+            return
+    
+    # Several shards per worker keep the pool busy when some pages are much heavier than others
+    shard_size = max(1, -(-pages_total // (workers * 4)))
+    starts = iter(range(0, pages_total, shard_size))
+    pages_done = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = deque(
+            executor.submit(extract_page_range, pdf_path, start, start + shard_size)
+            for start in itertools.islice(starts, workers * 2)
+        )
+        while pending:
+            shard = pending.popleft().result()
+            next_start = next(starts, None)
+            if next_start is not None:
+                pending.append(executor.submit(extract_page_range, pdf_path, next_start, next_start + shard_size))
+            for page_num, blocks in shard:
+                yield page_num, blocks
+            pages_done += len(shard)
+            if progress:
+                progress(pages_done, pages_total)
+
+def running_key(text: str) -> str:
+    """Comparison key for running header/footer blocks: case, spacing, punctuation and numbers ignored"""
+    return re.sub(r'\d+', '#', re.sub(r'[^\w]+', '', text.lower()))
+
+def drop_running_blocks(pages: Iterable[Tuple[int, List[Tuple[str, str]]]]) -> Iterator[Tuple[int, List[Tuple[str, str]]]]:
+    """
+    Remove running headers and footers from (page_num, blocks) pages, looking one page ahead.
+    
+    A block is dropped when it is short, among the first or last RUNNING_BLOCK_WINDOW blocks
+    of its page, and repeats (ignoring numbers such as page numbers) among the edge blocks
+    of the previous or next page.
+    """
+    def edge_keys(blocks):
+        edges = blocks[:RUNNING_BLOCK_WINDOW] + blocks[-RUNNING_BLOCK_WINDOW:]
+        return {running_key(text) for _, text in edges if len(text.split()) <= RUNNING_BLOCK_MAX_WORDS}
+    
+    previous_keys = set()
+    current = None
+    for page in itertools.chain(pages, [None]):
+        next_keys = edge_keys(page[1]) if page is not None else set()
+        if current is not None:
+            page_num, blocks = current
+            running = (previous_keys | next_keys) & edge_keys(blocks)
+            edge = set(range(RUNNING_BLOCK_WINDOW)) | set(range(len(blocks) - RUNNING_BLOCK_WINDOW, len(blocks)))
+            yield page_num, [
+                block for index, block in enumerate(blocks)
+                if index not in edge or len(block[1].split()) > RUNNING_BLOCK_MAX_WORDS or running_key(block[1]) not in running
             ]
-            
-            raw_paragraphs = re.split('|'.join(paragraph_markers), page_text)
-            raw_paragraphs = [p.strip() for p in raw_paragraphs if p.strip()]
-            
-            if not raw_paragraphs:
-                # Fallback: treat the whole page as one paragraph
-                raw_paragraphs = [page_text.strip()]
-            
-            for para in raw_paragraphs:
-                if para and len(para) > 10:  # Filter out very short paragraphs
-                    paragraphs.append((page_num, para))
-    
-    return paragraphs
-
-def split_pdf_into_chunks_with_metadata(paragraphs: List[Tuple[int, str]], 
+            previous_keys = edge_keys(blocks)
+        current = page
+
+def iter_sections(pdf_path: str, progress: Optional[Callable[[int, int], None]] = None,
+                  workers: Optional[int] = None) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """
+    Yields (page_num, paragraph, section) tuples from a PDF, one page at a time.
+    section is the most recent heading (carried across pages), or None before the first one.
+    Running headers and footers are dropped first (see drop_running_blocks).
+    """
+    section = None
+    for page_num, blocks in drop_running_blocks(iter_pdf_pages(pdf_path, progress=progress, workers=workers)):
+        for kind, text in blocks:
+            if kind == "heading":
+                section = text
+            elif len(text) > 10:
+                yield page_num, text, section
+
+def iter_paragraphs(pdf_path: str, progress: Optional[Callable[[int, int], None]] = None,
+                    workers: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """Yields (page_num, paragraph) tuples from a PDF, one page at a time"""
+    for page_num, para, _ in iter_sections(pdf_path, progress=progress, workers=workers):
+        yield page_num, para
+
+def extract_text_from_pdf(pdf_path: str, progress: Optional[Callable[[int, int], None]] = None,
+                          workers: Optional[int] = None) -> List[Tuple[int, str]]:
+    """
+    Extracts text from a PDF and returns a list of (page_num, paragraph) tuples.
+    Uses improved text cleaning and paragraph detection.
+    If given, progress(pages_done, pages_total) is called as pages complete.
+    Large documents are extracted in parallel, see iter_pdf_pages.
+    """
+    return list(iter_paragraphs(pdf_path, progress=progress, workers=workers))
+
+def merge_short_paragraphs(paragraphs: Iterable[Tuple], max_tokens: int = 500) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """
+    Merge consecutive paragraphs from the same page and section while they fit in one chunk.
+    Accepts (page_num, paragraph) or (page_num, paragraph, section) tuples and yields
+    (page_num, paragraph, section).
+    """
+    pending = None  # [page_num, text, section, tokens]
+    for item in paragraphs:
+        page_num, para = item[0], item[1]
+        section = item[2] if len(item) > 2 else None
+        tokens = count_tokens(para)
+        if pending and pending[0] == page_num and pending[2] == section and pending[3] + tokens <= max_tokens:
+            pending[1] += " " + para
+            pending[3] += tokens
+            continue
+        if pending:
+            yield pending[0], pending[1], pending[2]
+        pending = [page_num, para, section, tokens]
+    if pending:
+        yield pending[0], pending[1], pending[2]
+
+def iter_chunks_with_metadata(paragraphs: Iterable[Tuple],
+                              max_tokens: int = 500,
+                              overlap_tokens: int = 50) -> Iterator[Dict[str, Any]]:
+    """
+    Split PDF paragraphs into token-based chunks with metadata, lazily.
+    Accepts (page_num, paragraph) or (page_num, paragraph, section) tuples; short paragraphs
+    of the same page and section are merged first so chunks are whole rather than fragments.
+    Yields dicts: {"text": ..., "page": ..., "para": ..., "section": ..., "tokens": ...,
+    "char_start": ..., "char_end": ...}, where the character offsets locate the chunk
+    within its (cleaned, merged) paragraph.
+    """
+    for page_num, para, section in merge_short_paragraphs(paragraphs, max_tokens):
+        # Split paragraph by tokens; counts and offsets come from a single encoding
+        for chunk in chunk_text_by_tokens(para, max_tokens, overlap_tokens):
+            yield {
+                "text": chunk["text"],
+                "page": page_num,
+                "para": para[:60] + ("..." if len(para) > 60 else ""),
+                "section": section,
+                "tokens": chunk["tokens"],
+                "characters": len(chunk["text"]),
+                "char_start": chunk["char_start"],
+                "char_end": chunk["char_end"]
+            }
+
+def split_pdf_into_chunks_with_metadata(paragraphs: List[Tuple], 
                                        max_tokens: int = 500, 
                                        overlap_tokens: int = 50) -> List[Dict[str, Any]]:
     """
     Split PDF paragraphs into token-based chunks with metadata.
-    Returns a list of dicts: {"text": ..., "page": ..., "para": ..., "tokens": ...}
+    Returns a list of dicts: {"text": ..., "page": ..., "para": ..., "section": ..., "tokens": ...}
     """
-    chunks = []
-    
-    for page_num, para in paragraphs:
-        # Split paragraph by tokens
-        para_chunks = split_by_tokens(para, max_tokens, overlap_tokens)
-        
-        for chunk in para_chunks:
-            if chunk.strip():
-                chunk_info = {
-                    "text": chunk.strip(),
-                    "page": page_num,
-                    "para": para[:60] + ("..." if len(para) > 60 else ""),
-                    "tokens": count_tokens(chunk.strip()),
-                    "characters": len(chunk.strip())
-                }
-                chunks.append(chunk_info)
-    
-    return chunks
+    return list(iter_chunks_with_metadata(paragraphs, max_tokens, overlap_tokens))
 
 def split_text_into_chunks(text: str, max_tokens: int = 500, overlap_tokens: int = 50) -> List[str]:
     """Split text into token-based chunks"""
@@ -1,29 +1,332 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
+import os
+import math
+import time
+import uuid
+import logging
+import threading
+from backend.config import Config
+from embedding_cache import EmbeddingCache, text_hash
+from embedding_backends import create_embedding_backend
+from lexical_index import LexicalIndex, phrase_pattern
+from reranker import CrossEncoderReranker
 
-# New persistent client path
-chroma_client = chromadb.PersistentClient(path="./chroma_data")
-collection = chroma_client.get_or_create_collection("rag_collection")
+# Heavy resources (ChromaDB client, HNSW index, embedding model) are created on first use so
+# importing this module stays cheap; warm_up() loads them ahead of the first request.
+_chroma_client = None
+_collection = None
+_embedder = None
+_embedding_cache = None
+_lexical_index = None
+_reranker = None
+_init_lock = threading.Lock()
+_backfill_lock = threading.Lock()
+# Document versions being ingested (or just replaced) that retrieval must not see: {document_id: {version, ...}}
+_hidden_versions = {}
+_visibility_lock = threading.Lock()
 
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
+def get_chroma_client():
+    """Get the persistent ChromaDB client"""
+    global _chroma_client
+    if _chroma_client is None:
+        with _init_lock:
+            if _chroma_client is None:
+                import chromadb
+                _chroma_client = chromadb.PersistentClient(path=Config.get_chroma_path())
+    return _chroma_client
 
-def add_to_vector_db(texts: list[str], ids: list[str], metadatas: list[dict]):
-    embeddings = embedder.encode(texts).tolist()
-    collection.add(documents=texts, embeddings=embeddings, ids=ids, metadatas=metadatas)
+def get_collection():
+    """Get the document collection"""
+    global _collection
+    if _collection is None:
+        client = get_chroma_client()
+        with _init_lock:
+            if _collection is None:
+                _collection = client.get_or_create_collection(Config.get_collection_name())
+    return _collection
 
-def query_vector_db(query: str, n_results: int = 3):
+def get_embedder():
+    """Get the configured embedding backend"""
+    global _embedder
+    if _embedder is None:
+        with _init_lock:
+            if _embedder is None:
+                _embedder = create_embedding_backend(
+                    Config.get_embedding_model(),
+                    batch_size=Config.EMBEDDING_BATCH_SIZE,
+                    threads=Config.EMBEDDING_THREADS,
+                    normalize=Config.EMBEDDING_NORMALIZE,
+                    onnx_file=Config.EMBEDDING_ONNX_FILE,
+                    host=Config.OLLAMA_BASE_URL,
+                    timeout=Config.OLLAMA_TIMEOUT
+                )
+    return _embedder
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get the persistent embedding cache"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _init_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(Config.EMBEDDING_CACHE_PATH)
+    return _embedding_cache
+
+def get_lexical_index() -> LexicalIndex:
+    """Get the BM25 inverted index kept in step with the collection"""
+    global _lexical_index
+    if _lexical_index is None:
+        with _init_lock:
+            if _lexical_index is None:
+                _lexical_index = LexicalIndex(Config.LEXICAL_INDEX_PATH, k1=Config.BM25_K1, b=Config.BM25_B)
+        backfill_lexical_index(_lexical_index)
+    return _lexical_index
+
+def get_reranker() -> CrossEncoderReranker:
+    """Get the cross-encoder used to rerank retrieved chunks (RERANK_ENABLED)"""
+    global _reranker
+    if _reranker is None:
+        with _init_lock:
+            if _reranker is None:
+                _reranker = CrossEncoderReranker(
+                    Config.RERANK_MODEL,
+                    max_candidates=Config.RERANK_MAX_CANDIDATES,
+                    batch_size=Config.RERANK_BATCH_SIZE,
+                    cache_entries=Config.RERANK_CACHE_ENTRIES
+                )
+    return _reranker
+
+def backfill_lexical_index(index: LexicalIndex, page_size: int = 1000):
+    """One-time fill of an empty index from a collection written before the index existed"""
+    with _backfill_lock:
+        collection = get_collection()
+        if index.count() > 0 or collection.count() == 0:
+            return
+        logging.info(f"Building the lexical index for {collection.count()} existing chunks")
+        offset = 0
+        while True:
+            page = collection.get(limit=page_size, offset=offset, include=["documents", "metadatas"])
+            if not page['ids']:
+                break
+            index.upsert(page['ids'], page['documents'], page['metadatas'])
+            offset += len(page['ids'])
+
+def warm_up() -> dict:
+    """
+    Load the embedding model and the collection's HNSW index into memory.
+
+    Returns:
+        Milliseconds spent on each step
+    """
+    timings = {}
+    start = time.perf_counter()
+    embedding = get_embedder().encode(["warm-up"])[0]
+    timings["embedder_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    start = time.perf_counter()
+    collection = get_collection()
+    if collection.count() > 0:
+        # The first query loads the index from disk
+        collection.query(query_embeddings=[embedding], n_results=1, include=["distances"])
+    timings["index_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    start = time.perf_counter()
+    get_lexical_index()
+    timings["lexical_index_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    if Config.RERANK_ENABLED:
+        start = time.perf_counter()
+        get_reranker().model.predict([("warm-up", "warm-up")], show_progress_bar=False)
+        timings["reranker_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return timings
+
+# Marker file rewritten whenever the collection contents change; caches compare against it
+CORPUS_VERSION_FILE = os.path.join(Config.get_chroma_path(), "corpus_version")
+
+def get_corpus_version() -> str:
+    """Return the current corpus version ("" if the collection was never written through this module)"""
+    try:
+        with open(CORPUS_VERSION_FILE, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+def bump_corpus_version() -> str:
+    """Record that the collection changed so dependent caches invalidate themselves"""
+    version = uuid.uuid4().hex
+    os.makedirs(os.path.dirname(CORPUS_VERSION_FILE), exist_ok=True)
+    tmp_path = f"{CORPUS_VERSION_FILE}.{version}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, CORPUS_VERSION_FILE)
+    return version
+
+def make_chunk_id(text: str, namespace: str = "") -> str:
+    """Deterministic chunk ID derived from the chunk's content (and an optional namespace)"""
+    return text_hash(f"{namespace}\x00{text}" if namespace else text)[:32]
+
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    """Embed texts, reusing cached embeddings for text seen before"""
+    embedder = get_embedder()
+    embedding_cache = get_embedding_cache()
+    model = embedder.cache_key
+    hashes = [text_hash(text) for text in texts]
+    cached = embedding_cache.get_many(model, hashes)
+    missing = {h: text for h, text in zip(hashes, texts) if h not in cached}
+    if missing:
+        new_embeddings = embedder.encode(list(missing.values()))
+        fresh = dict(zip(missing.keys(), new_embeddings))
+        embedding_cache.put_many(model, fresh)
+        cached.update(fresh)
+    logging.info(f"Embedded {len(missing)} new texts, reused {len(texts) - len(missing)} cached embeddings")
+    return [cached[h] for h in hashes]
+
+def embed_query(query: str) -> list[float]:
+    """Embed a single query (not cached)"""
+    return get_embedder().encode([query])[0]
+
+def add_to_vector_db(texts: list[str], ids: list[str], metadatas: list[dict], embeddings: list[list[float]] = None):
+    """Upsert chunks, embedding them unless embeddings are given; repeated IDs within a call keep the first occurrence"""
+    if embeddings is None:
+        embeddings = [None] * len(texts)
+    seen = set()
+    unique = []
+    for text, chunk_id, meta, embedding in zip(texts, ids, metadatas, embeddings):
+        if chunk_id not in seen:
+            seen.add(chunk_id)
+            unique.append((text, chunk_id, meta, embedding))
+    if not unique:
+        return
+    texts, ids, metadatas, embeddings = (list(column) for column in zip(*unique))
+    if any(embedding is None for embedding in embeddings):
+        embeddings = embed_texts(texts)
+    get_collection().upsert(documents=texts, embeddings=embeddings, ids=ids, metadatas=metadatas)
+    get_lexical_index().upsert(ids, texts, metadatas)
+    bump_corpus_version()
+
+def make_filters(document_ids: list[str] = None, page_start: int = None, page_end: int = None):
+    """
+    Normalized retrieval filters: restrict a search to some documents and/or a page range.
+
+    Returns:
+        {"document_ids": [...], "page_start": n, "page_end": m} with unset keys omitted,
+        or None when nothing is filtered
+    """
+    filters = {}
+    if document_ids:
+        filters["document_ids"] = sorted(set(document_ids))
+    if page_start is not None:
+        filters["page_start"] = int(page_start)
+    if page_end is not None:
+        filters["page_end"] = int(page_end)
+    return filters or None
+
+def set_version_visibility(document_id: str, hide: list = (), show: list = ()):
+    """
+    Hide and show document versions for retrieval in one step.
+
+    Ingestion hides a version while its chunks are written and, on commit, shows it and hides
+    the replaced version in the same call, so queries see either version but never a mix.
+    The corpus version is bumped whenever the hidden set changes, since results may change.
+    """
+    with _visibility_lock:
+        versions = _hidden_versions.setdefault(document_id, set())
+        before = set(versions)
+        versions.difference_update(show)
+        versions.update(hide)
+        changed = versions != before
+        if not versions:
+            del _hidden_versions[document_id]
+    if changed:
+        bump_corpus_version()
+
+def visible_filters(filters: dict = None):
+    """Retrieval filters plus the currently hidden document versions, for the lexical index"""
+    with _visibility_lock:
+        hidden = {document_id: sorted(versions) for document_id, versions in _hidden_versions.items()}
+    return dict(filters or {}, hidden_versions=hidden) if hidden else filters
+
+def build_where(filters: dict = None):
+    """ChromaDB where clause for retrieval filters and hidden document versions (None when nothing is filtered)"""
+    clauses = [
+        {"$or": [{"document_id": {"$ne": document_id}}, {"version": {"$nin": versions}}]}
+        for document_id, versions in (visible_filters(filters) or {}).get("hidden_versions", {}).items()
+    ]
+    if filters and filters.get("document_ids"):
+        document_ids = filters["document_ids"]
+        clauses.append({"document_id": document_ids[0]} if len(document_ids) == 1 else {"document_id": {"$in": list(document_ids)}})
+    if filters and filters.get("page_start") is not None:
+        clauses.append({"page": {"$gte": filters["page_start"]}})
+    if filters and filters.get("page_end") is not None:
+        clauses.append({"page": {"$lte": filters["page_end"]}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def chunk_info(chunk_id: str, doc: str, meta: dict) -> dict:
+    """Chunk dict returned by the retrieval functions, from a ChromaDB record"""
+    meta = meta or {}
+    return {
+        "id": chunk_id,
+        "text": doc,
+        "page": meta.get("page", None),
+        "para": meta.get("para", None),
+        "section": meta.get("section") or None,
+        "tokens": meta.get("tokens", None),
+        "document_id": meta.get("document_id", None),
+        "filename": meta.get("filename", None),
+    }
+
+def distance_to_similarity(distance):
+    """Convert a squared L2 distance between unit-length embeddings to cosine similarity"""
+    if distance is None:
+        return None
+    return 1.0 - float(distance) / 2.0
+
+def cosine_similarity(a, b) -> float:
+    """Cosine similarity of two embedding vectors of any length"""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+def result_similarity(distance, query_embedding, result_embedding=None):
+    """
+    Cosine similarity of a ChromaDB query result.
+
+    ChromaDB returns squared L2 distances, which only map to cosine similarity for unit-length
+    embeddings, so with EMBEDDING_NORMALIZE off the similarity is computed from the vectors
+    (query with include=["embeddings"]).
+    """
+    if Config.EMBEDDING_NORMALIZE or result_embedding is None:
+        return distance_to_similarity(distance)
+    return cosine_similarity(query_embedding, result_embedding)
+
+def delete_from_vector_db(ids: list[str]):
+    """Remove chunks by ID"""
+    if not ids:
+        return
+    get_collection().delete(ids=ids)
+    get_lexical_index().delete(ids)
+    bump_corpus_version()
+
+def query_vector_db(query: str, n_results: int = 3, include_embeddings: bool = False, query_embedding: list[float] = None,
+                    filters: dict = None):
     try:
-        embedding = embedder.encode([query]).tolist()[0]
-        results = collection.query(query_embeddings=[embedding], n_results=n_results)
+        embedding = query_embedding if query_embedding is not None else embed_query(query)
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings or not Config.EMBEDDING_NORMALIZE:
+            include.append("embeddings")
+        results = get_collection().query(query_embeddings=[embedding], n_results=n_results, where=build_where(filters), include=include)
         docs = results['documents'][0] if results['documents'] else []
         metadatas = results['metadatas'][0] if results.get('metadatas') and results['metadatas'] else [{} for _ in docs]
+        ids = results['ids'][0] if results.get('ids') and results['ids'] else [None for _ in docs]
+        distances = results['distances'][0] if results.get('distances') and results['distances'] else [None for _ in docs]
+        embeddings = results['embeddings'][0] if results.get('embeddings') is not None and len(results['embeddings']) else [None for _ in docs]
         # Remove duplicates by text while preserving order
         seen = set()
         unique_chunks = []
-        for doc, meta in zip(docs, metadatas):
+        for doc, meta, chunk_id, distance, chunk_embedding in zip(docs, metadatas, ids, distances, embeddings):
             if doc and doc not in seen:
-                chunk_info = {"text": doc, "page": meta.get("page", None), "para": meta.get("para", None)}
-                unique_chunks.append(chunk_info)
+                chunk = dict(chunk_info(chunk_id, doc, meta), distance=distance,
+                             score=result_similarity(distance, embedding, chunk_embedding))
+                if include_embeddings and chunk_embedding is not None:
+                    chunk["embedding"] = list(chunk_embedding)
+                unique_chunks.append(chunk)
                 seen.add(doc)
         # Defensive: always return a list of dicts with 'text' key
         if not unique_chunks:
@@ -35,21 +338,157 @@ def query_vector_db(query: str, n_results: int = 3):
         logging.error(f"Error in query_vector_db: {e}")
         return []
 
-def get_all_paragraph_chunks():
-    """Fetch all paragraph chunks from the vector DB."""
+def get_all_paragraph_chunks(filters: dict = None):
+    """Fetch all paragraph chunks from the vector DB (optionally only those matching filters)."""
     try:
-        results = collection.get()
+        results = get_collection().get(where=build_where(filters))
         if not results:
             return []
         docs = results['documents'] if results.get('documents') else []
         metadatas = results['metadatas'] if results.get('metadatas') else [{} for _ in docs]
+        ids = results['ids'] if results.get('ids') else [None for _ in docs]
         chunks = []
-        for doc, meta in zip(docs, metadatas):
+        for doc, meta, chunk_id in zip(docs, metadatas, ids):
             if doc:
-                chunk_info = {"text": doc, "page": meta.get("page", None), "para": meta.get("para", None)}
-                chunks.append(chunk_info)
+                chunks.append(chunk_info(chunk_id, doc, meta))
         return chunks
     except Exception as e:
         import logging
         logging.error(f"Error in get_all_paragraph_chunks: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def hybrid_query(query: str, n_results: int = 3, include_embeddings: bool = False, filters: dict = None):
+    """
+    Fuse vector and BM25 results with reciprocal-rank fusion.
+
+    Each retriever contributes weight / (RRF_K + rank) for its top HYBRID_CANDIDATES chunks.
+    Returned chunks have the same shape as query_vector_db's plus "bm25", "vector_rank",
+    "lexical_rank" and "relevance" (the fused score scaled to 0..1).
+    """
+    try:
+        candidates = max(n_results, Config.HYBRID_CANDIDATES)
+        embedding = embed_query(query)
+        vector_hits = query_vector_db(query, n_results=candidates, include_embeddings=True, query_embedding=embedding, filters=filters)
+        lexical_hits = get_lexical_index().search(query, candidates, filters=visible_filters(filters))
+        fused = {}
+        for rank, chunk in enumerate(vector_hits, start=1):
+            fused[chunk["id"]] = fused.get(chunk["id"], 0.0) + Config.HYBRID_VECTOR_WEIGHT / (Config.RRF_K + rank)
+        for rank, (chunk_id, _) in enumerate(lexical_hits, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + Config.HYBRID_LEXICAL_WEIGHT / (Config.RRF_K + rank)
+        top_ids = sorted(fused, key=fused.get, reverse=True)[:n_results]
+
+        chunks = {chunk["id"]: chunk for chunk in vector_hits}
+        missing = [chunk_id for chunk_id in top_ids if chunk_id not in chunks]
+        if missing:
+            # Lexical-only hits: fetch them and score them against the query embedding too
+            results = get_collection().get(ids=missing, include=["documents", "metadatas", "embeddings"])
+            for chunk_id, doc, meta, chunk_embedding in zip(results['ids'], results['documents'], results['metadatas'], results['embeddings']):
+                chunks[chunk_id] = dict(
+                    chunk_info(chunk_id, doc, meta),
+                    distance=sum((a - b) ** 2 for a, b in zip(embedding, chunk_embedding)),
+                    score=cosine_similarity(embedding, chunk_embedding),
+                    embedding=list(chunk_embedding)
+                )
+
+        vector_ranks = {chunk["id"]: rank for rank, chunk in enumerate(vector_hits, start=1)}
+        lexical = {chunk_id: (rank, score) for rank, (chunk_id, score) in enumerate(lexical_hits, start=1)}
+        best_possible = (Config.HYBRID_VECTOR_WEIGHT + Config.HYBRID_LEXICAL_WEIGHT) / (Config.RRF_K + 1)
+        fused_chunks = []
+        for chunk_id in top_ids:
+            chunk = chunks.get(chunk_id)
+            if chunk is None:
+                continue
+            chunk = dict(chunk)
+            lexical_rank, bm25 = lexical.get(chunk_id, (None, None))
+            chunk.update(
+                bm25=bm25,
+                vector_rank=vector_ranks.get(chunk_id),
+                lexical_rank=lexical_rank,
+                relevance=fused[chunk_id] / best_possible if best_possible else 0.0
+            )
+            if not include_embeddings:
+                chunk.pop("embedding", None)
+            fused_chunks.append(chunk)
+        return fused_chunks
+    except Exception as e:
+        logging.error(f"Error in hybrid_query: {e}")
+        return []
+
+def search_chunks(query: str, n_results: int = 3, include_embeddings: bool = False, filters: dict = None):
+    """
+    Retrieve chunks for a query with the configured RETRIEVAL_MODE ("hybrid" or "vector"),
+    restricted to the documents and pages in filters (see make_filters).
+
+    With RERANK_ENABLED, RERANK_CANDIDATES chunks (at most RERANK_MAX_CANDIDATES) are retrieved
+    and the cross-encoder keeps the best n_results.
+    """
+    candidates = n_results
+    if Config.RERANK_ENABLED:
+        candidates = min(max(n_results, Config.RERANK_CANDIDATES), Config.RERANK_MAX_CANDIDATES)
+    if Config.get_retrieval_mode() == "hybrid":
+        chunks = hybrid_query(query, n_results=candidates, include_embeddings=include_embeddings, filters=filters)
+    else:
+        chunks = query_vector_db(query, n_results=candidates, include_embeddings=include_embeddings, filters=filters)
+    if not Config.RERANK_ENABLED or not chunks:
+        return chunks
+    try:
+        start = time.perf_counter()
+        reranked = get_reranker().rerank(query, chunks, n_results)
+        logging.info(f"Reranked {len(chunks)} candidates in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return reranked
+    except Exception as e:
+        logging.error(f"Error reranking, keeping retrieval order: {e}")
+        return chunks[:n_results]
+
+def get_chunks(ids: list[str]) -> list[dict]:
+    """Full chunks (text and metadata) by ID, in the order requested; unknown IDs are skipped"""
+    chunks = {}
+    for start in range(0, len(ids), 500):
+        results = get_collection().get(ids=ids[start:start + 500], include=["documents", "metadatas"])
+        for chunk_id, doc, meta in zip(results['ids'], results['documents'], results['metadatas']):
+            chunks[chunk_id] = chunk_info(chunk_id, doc, meta)
+    return [chunks[chunk_id] for chunk_id in dict.fromkeys(ids) if chunk_id in chunks]
+
+def find_phrase(phrase: str, limit: int = 20, snippet_chars: int = 80, filters: dict = None) -> dict:
+    """
+    Exact phrase lookup through the lexical index's word positions, without embeddings or the LLM.
+
+    Candidates come from the index in (page, chunk index) order and only as many are read
+    from ChromaDB as it takes to confirm limit of them against the chunk text
+    (case-insensitive, any punctuation or whitespace between words).
+
+    Returns:
+        Dictionary with the phrase, the number of chunks the index matches and up to limit
+        hits (the chunk fields plus occurrences and a snippet), in page order
+    """
+    pattern = phrase_pattern(phrase)
+    if pattern is None:
+        return {"phrase": phrase, "total": 0, "hits": []}
+    candidates = [chunk_id for chunk_id, _ in get_lexical_index().phrase_search(
+        phrase, filters=visible_filters(filters), document_order=True
+    )]
+    hits = []
+    start = 0
+    while start < len(candidates) and len(hits) < limit:
+        batch = candidates[start:start + limit - len(hits)]
+        start += len(batch)
+        results = get_collection().get(ids=batch, include=["documents", "metadatas"])
+        # ChromaDB does not return records in the order of the requested IDs
+        records = {chunk_id: (doc, meta) for chunk_id, doc, meta in zip(results['ids'], results['documents'], results['metadatas'])}
+        for chunk_id in batch:
+            if chunk_id not in records:
+                continue
+            doc, meta = records[chunk_id]
+            matches = list(pattern.finditer(doc or ""))
+            if not matches:
+                continue
+            first = matches[0]
+            snippet_start = max(0, first.start() - snippet_chars)
+            snippet_end = min(len(doc), first.end() + snippet_chars)
+            snippet = doc[snippet_start:snippet_end].strip()
+            hits.append(dict(
+                chunk_info(chunk_id, doc, meta),
+                occurrences=len(matches),
+                snippet=("..." if snippet_start > 0 else "") + snippet + ("..." if snippet_end < len(doc) else "")
+            ))
+    return {"phrase": phrase, "total": len(candidates), "hits": hits}
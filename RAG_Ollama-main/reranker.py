@@ -0,0 +1,73 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+from embedding_cache import text_hash
+
+logger = logging.getLogger(__name__)
+
+class CrossEncoderReranker:
+    """
+    Rescore retrieved chunks against the query with a small cross-encoder on the CPU.
+
+    At most max_candidates chunks are scored per query (the rest are dropped, in retrieval
+    order), and scores are kept in an in-memory LRU keyed by (query, chunk text) so repeated
+    questions and overlapping candidate sets are not scored twice.
+    """
+
+    def __init__(self, model_name: str, max_candidates: int = 50, batch_size: int = 16, cache_entries: int = 4096):
+        from sentence_transformers import CrossEncoder
+        self.model_name = model_name
+        self.max_candidates = max_candidates
+        self.batch_size = batch_size
+        self.cache_entries = cache_entries
+        self.model = CrossEncoder(model_name, device="cpu")
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0}
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """Relevance of each text to the query (higher is better)"""
+        query_key = text_hash(query)
+        keys = [(query_key, text_hash(text)) for text in texts]
+        scores: Dict[Tuple[str, str], float] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+            self._counters["hits"] += len(scores)
+        missing = {key: text for key, text in zip(keys, texts) if key not in scores}
+        if missing:
+            predicted = self.model.predict(
+                [(query, text) for text in missing.values()],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            fresh = {key: float(value) for key, value in zip(missing, predicted)}
+            scores.update(fresh)
+            with self._lock:
+                self._counters["misses"] += len(fresh)
+                self._cache.update(fresh)
+                while len(self._cache) > self.cache_entries:
+                    self._cache.popitem(last=False)
+        return [scores[key] for key in keys]
+
+    def rerank(self, query: str, chunks: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """
+        Keep the top_k chunks by cross-encoder score.
+
+        Returned chunks are copies carrying "rerank_score", with "relevance" set to it so the
+        context packer ranks by it as well.
+        """
+        candidates = [chunk for chunk in chunks if chunk.get("text")][:self.max_candidates]
+        if not candidates:
+            return []
+        scores = self.score(query, [chunk["text"] for chunk in candidates])
+        ranked = sorted(zip(candidates, scores), key=lambda item: item[1], reverse=True)[:top_k]
+        return [dict(chunk, rerank_score=score, relevance=score) for chunk, score in ranked]
+
+    def stats(self) -> Dict[str, int]:
+        """Score cache counters"""
+        with self._lock:
+            return dict(self._counters, entries=len(self._cache))
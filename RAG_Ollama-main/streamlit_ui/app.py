@@ -20,6 +20,10 @@ def init_session_state():
         st.session_state.feedback_history = []
     if 'pdf_uploaded' not in st.session_state:
         st.session_state.pdf_uploaded = False
+    if 'search_filters' not in st.session_state:
+        st.session_state.search_filters = {}
+    if 'chunk_texts' not in st.session_state:
+        st.session_state.chunk_texts = {}
 
 def check_api_health():
     """Check if the API is running"""
@@ -43,116 +47,153 @@ def upload_pdf(file):
         st.error(f"Error uploading file: {str(e)}")
         return None
 
-def ask_question(query: str) -> Optional[Dict[str, Any]]:
-    """Send query to the multi-agent system"""
+def get_task_status(task_id: str) -> Optional[Dict[str, Any]]:
+    """Fetch the progress of an ingestion task"""
     try:
-        payload = {"query": query}
-        response = requests.post(f"{API_BASE_URL}/ask/", json=payload)
+        response = requests.get(f"{API_BASE_URL}/tasks/{task_id}", timeout=5)
         if response.status_code == 200:
             return response.json()
-        else:
-            st.error(f"Query failed: {response.text}")
+        st.error(f"Status check failed: {response.text}")
+        return None
+    except Exception as e:
+        st.error(f"Error checking status: {str(e)}")
+        return None
+
+def list_documents() -> list:
+    """Fetch the indexed documents"""
+    try:
+        response = requests.get(f"{API_BASE_URL}/documents", timeout=5)
+        if response.status_code == 200:
+            return response.json().get("documents", [])
+    except Exception as e:
+        st.error(f"Error listing documents: {str(e)}")
+    return []
+
+def stream_events(path: str, payload: Dict[str, Any]):
+    """POST to a streaming endpoint and yield its newline-delimited JSON events"""
+    with requests.post(f"{API_BASE_URL}{path}", json=payload, stream=True, timeout=(5, 600)) as response:
+        if response.status_code != 200:
+            yield {"type": "error", "error": f"{response.status_code} - {response.text}"}
+            return
+        for line in response.iter_lines(decode_unicode=True):
+            if line:
+                yield json.loads(line)
+
+def render_stream(path: str, payload: Dict[str, Any], placeholder) -> Optional[Dict[str, Any]]:
+    """
+    Render streamed tokens into a placeholder as they arrive.
+    
+    Returns the metadata event merged with the final "done" event, or None on error.
+    """
+    metadata = {}
+    text = ""
+    for event in stream_events(path, payload):
+        if event["type"] == "metadata":
+            metadata = event
+            placeholder.info(f"Found {event.get('num_paragraphs', len(event.get('citations', [])))} relevant paragraphs, generating answer...")
+        elif event["type"] == "token":
+            text += event["content"]
+            placeholder.markdown(text + "▌")
+        elif event["type"] == "done":
+            placeholder.markdown(text)
+            return {"metadata": metadata, "done": event}
+        elif event["type"] == "error":
+            st.error(f"Request failed: {event.get('error')}")
             return None
+    return None
+
+def get_chunk_text(chunk: Dict[str, Any]) -> str:
+    """Full text of a referenced chunk, fetched once per session; the snippet if it cannot be fetched"""
+    texts = st.session_state.chunk_texts
+    if chunk.get('id') not in texts:
+        try:
+            response = requests.get(f"{API_BASE_URL}/chunks/{chunk['id']}", timeout=10)
+            if response.status_code != 200:
+                return chunk.get('snippet', '')
+            texts[chunk['id']] = response.json().get('text', '')
+        except Exception:
+            return chunk.get('snippet', '')
+    return texts[chunk['id']]
+
+def fetch_agent_log(trace_id: Optional[str]) -> list:
+    """Agent steps of a finished request from the backend's trace buffer"""
+    if not trace_id:
+        return []
+    try:
+        response = requests.get(f"{API_BASE_URL}/debug/traces/{trace_id}", timeout=5)
+        if response.status_code == 200:
+            return response.json().get("entries", [])
+    except Exception:
+        pass
+    return []
+
+def ask_question(query: str, placeholder) -> Optional[Dict[str, Any]]:
+    """Send query to the multi-agent system, streaming the answer into the placeholder"""
+    try:
+        result = render_stream("/ask/stream", dict(st.session_state.search_filters, query=query, compact=True), placeholder)
+        if not result:
+            return None
+        improvement_result = dict(result["done"], original_query=query, status="success")
+        return {
+            "status": "success",
+            "query": query,
+            "retrieval_result": result["metadata"],
+            "improvement_result": improvement_result,
+            "agent_log": fetch_agent_log(result["metadata"].get("trace_id"))
+        }
     except Exception as e:
         st.error(f"Error sending query: {str(e)}")
         return None
 
-def send_feedback(query: str, feedback: str, original_suggestion: str) -> Optional[Dict[str, Any]]:
-    """Send feedback to get revised suggestions"""
+def send_feedback(query: str, feedback: str, original_suggestion: str, placeholder) -> Optional[Dict[str, Any]]:
+    """Send feedback to get revised suggestions, streaming the revision into the placeholder"""
     try:
-        payload = {
+        payload = dict(
+            st.session_state.search_filters,
+            query=query,
+            feedback=feedback,
+            original_suggestion=original_suggestion,
+            compact=True
+        )
+        result = render_stream("/feedback/stream", payload, placeholder)
+        if not result:
+            return None
+        revision_result = dict(result["done"], original_query=query, feedback_addressed=feedback, status="success")
+        return {
+            "status": "success",
             "query": query,
-            "feedback": feedback,
-            "original_suggestion": original_suggestion
+            "retrieval_result": result["metadata"],
+            "improvement_result": revision_result,
+            "revision_result": revision_result,
+            "agent_log": fetch_agent_log(result["metadata"].get("trace_id"))
         }
-        response = requests.post(f"{API_BASE_URL}/feedback/", json=payload)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Feedback failed: {response.text}")
-            return None
     except Exception as e:
         st.error(f"Error sending feedback: {str(e)}")
         return None
 
 def display_agent_log(agent_log: list):
-    """Display the agent execution log"""
+    """Display the agent execution log (the request's compact trace)"""
     if not agent_log:
         return
     
     st.subheader("Agent Execution Log")
     
-    for i, step in enumerate(agent_log):
-        expander_key = f"{step['step']}_{step['agent']}_{step['action']}"
+    for step in agent_log:
         with st.expander(f"Step {step['step']}: {step['agent']} - {step['action']}"):
-            result = step['result']
-            
-            if step['agent'] == "Retriever Agent":
-                st.write(f"**Query:** {result.get('query', 'N/A')}")
-                st.write(f"**Paragraphs Retrieved:** {result.get('num_paragraphs', 0)}")
-                
-                if result.get('retrieved_paragraphs'):
-                    paras = result['retrieved_paragraphs']
-                    if len(paras) > 1:
-                        selected_para_idx = st.radio(
-                            "Select a paragraph to view:",
-                            options=list(range(len(paras))),
-                            format_func=lambda i: f"Paragraph {i+1}",
-                            key=f"retrieved_para_selector_{i}_{expander_key}"
-                        )
-                        para = paras[selected_para_idx]
-                        if isinstance(para, dict):
-                            st.text_area(
-                                f"Paragraph {selected_para_idx+1} (Page {para.get('page', '?')}, Para: {para.get('para', '')}, Tokens: {para.get('tokens', 'N/A')})",
-                                para.get('text', ''),
-                                height=200,
-                                disabled=True,
-                                key=f"para_{selected_para_idx}_retriever_{i}_{expander_key}"
-                            )
-                        else:
-                            st.text_area(
-                                f"Paragraph {selected_para_idx+1}",
-                                str(para),
-                                height=200,
-                                disabled=True,
-                                key=f"para_{selected_para_idx}_retriever_{i}_{expander_key}"
-                            )
-                    else:
-                        para = paras[0]
-                        if isinstance(para, dict):
-                            st.text_area(
-                                f"Paragraph 1 (Page {para.get('page', '?')}, Para: {para.get('para', '')}, Tokens: {para.get('tokens', 'N/A')})",
-                                para.get('text', ''),
-                                height=200,
-                                disabled=True,
-                                key=f"para_1_retriever_{i}_{expander_key}"
-                            )
-                        else:
-                            st.text_area(
-                                "Paragraph 1",
-                                str(para),
-                                height=200,
-                                disabled=True,
-                                key=f"para_1_retriever_{i}_{expander_key}"
-                            )
-            
-            elif step['agent'] == "RFP Editor Agent":
-                st.write(f"**Status:** {result.get('status', 'N/A')}")
-                
-                if result.get('improved_content'):
-                    st.write("**Improved Content:**")
-                    st.text_area(
-                        "Content",
-                        result['improved_content'],
-                        height=200,
-                        disabled=True,
-                        key=f"improved_content_{expander_key}_{i}"
-                    )
-                
-                if result.get('best_practices_applied'):
-                    st.write("**Best Practices Applied:**")
-                    for idx, practice in enumerate(result['best_practices_applied']):
-                        st.write(f"{practice.title()}", key=f"best_practice_{idx}_{expander_key}")
+            st.write(f"**Status:** {step.get('status', 'N/A')}")
+            if step.get('duration_ms') is not None:
+                st.write(f"**Duration:** {step['duration_ms']} ms")
+            if step.get('error'):
+                st.write(f"**Error:** {step['error']}")
+            if 'chunk_ids' in step:
+                st.write(f"**Retrieval Mode:** {step.get('retrieval_mode', 'N/A')}")
+                st.write(f"**Context Tokens:** {step.get('context_tokens', 0)}")
+                st.write(f"**Pages:** {', '.join(str(page) for page in step.get('pages', [])) or 'none'}")
+                st.write(f"**Chunk IDs:** {', '.join(str(chunk_id) for chunk_id in step['chunk_ids']) or 'none'}")
+            if 'phrase_hits' in step:
+                st.write(f"**Phrase Hits:** {step['phrase_hits']}")
+            if 'answer_tokens' in step:
+                st.write(f"**Answer Tokens:** {step['answer_tokens']}")
 
 def display_feedback_interface(response_data: Dict[str, Any]):
     """Display the feedback interface for user interaction"""
@@ -192,7 +233,8 @@ def display_feedback_interface(response_data: Dict[str, Any]):
                     revised_response = send_feedback(
                         response_data['query'],
                         feedback_text,
-                        response_data['improvement_result']['improved_content']
+                        response_data['improvement_result']['improved_content'],
+                        st.empty()
                     )
                     
                     if revised_response:
@@ -310,12 +352,40 @@ def main():
                     result = upload_pdf(uploaded_file)
                     if result:
                         st.session_state.pdf_uploaded = True
+                        st.session_state.last_task_id = result.get('task_id')
                         st.success(f"{uploaded_file.name} uploaded successfully!")
-                        st.info(f"Task ID: {result.get('task_id', 'N/A')}")
+                        if result.get('status') == 'unchanged':
+                            st.info("This document is already indexed.")
+                        else:
+                            st.info(f"Task ID: {result.get('task_id', 'N/A')}")
         
         # Show a message if a PDF was uploaded in this session
         if st.session_state.pdf_uploaded:
             st.success("PDF uploaded and being processed. You can now ask questions.")
+            if st.session_state.get('last_task_id') and st.button("Check Processing Status"):
+                task = get_task_status(st.session_state.last_task_id)
+                if task:
+                    st.write(f"**Status:** {task['status']} ({task['stage']})")
+                    st.write(f"Pages: {task['pages_done']}/{task['pages_total']}, "
+                             f"chunks embedded: {task['chunks_embedded']}/{task['chunks_total']}")
+        
+        # Search scope: restrict retrieval to some documents and a page range
+        st.subheader("Search Scope")
+        documents = list_documents()
+        names = {document["document_id"]: document["filename"] for document in documents}
+        selected = st.multiselect(
+            "Documents",
+            options=list(names),
+            format_func=lambda document_id: names[document_id],
+            help="Leave empty to search all documents"
+        )
+        restrict_pages = st.checkbox("Restrict to a page range")
+        filters = {"document_ids": selected} if selected else {}
+        if restrict_pages:
+            page_start, page_end = st.columns(2)
+            filters["page_start"] = page_start.number_input("From page", min_value=1, value=1, step=1)
+            filters["page_end"] = page_end.number_input("To page", min_value=1, value=10, step=1)
+        st.session_state.search_filters = filters
         
         # Configuration
         st.subheader("Settings")
@@ -346,7 +416,7 @@ def main():
             if st.button("Process with Multi-Agent System", type="primary", key="process_retriever"):
                 if query.strip():
                     with st.spinner("Processing with multi-agent system..."):
-                        response = ask_question(query)
+                        response = ask_question(query, st.empty())
                         if response:
                             st.session_state.current_query = query
                             st.session_state.current_response = response
@@ -361,48 +431,29 @@ def main():
                 retrieval = response_data['retrieval_result']
                 st.write(f"Retriever Agent Results:")
                 st.info(f"Found {retrieval.get('num_paragraphs', 0)} relevant paragraphs")
-                if retrieval.get('retrieved_paragraphs'):
-                    paras = retrieval['retrieved_paragraphs']
-                    if len(paras) > 1:
-                        selected_para_idx = st.radio(
+                if retrieval.get('chunks'):
+                    chunks = retrieval['chunks']
+                    selected_idx = 0
+                    if len(chunks) > 1:
+                        selected_idx = st.radio(
                             "Select a paragraph to view:",
-                            options=list(range(len(paras))),
-                            format_func=lambda i: f"Paragraph {i+1}",
+                            options=list(range(len(chunks))),
+                            format_func=lambda i: f"Paragraph {i+1} (Page {chunks[i].get('page', '?')})",
                             key="retrieved_para_selector_main"
                         )
-                        para = paras[selected_para_idx]
-                        if isinstance(para, dict):
-                            st.text_area(
-                                f"Content {selected_para_idx+1} (Page {para.get('page', '?')}, Para: {para.get('para', '')}, Tokens: {para.get('tokens', 'N/A')})",
-                                para.get('text', ''),
-                                height=200,
-                                key=f"retrieved_para_text_main_{selected_para_idx}"
-                            )
-                        else:
-                            st.text_area(
-                                f"Content {selected_para_idx+1}",
-                                para,
-                                height=200,
-                                key=f"retrieved_para_text_main_{selected_para_idx}"
-                            )
-                    else:
-                        para = paras[0]
-                        if isinstance(para, dict):
-                            st.text_area(
-                                f"Content 1 (Page {para.get('page', '?')}, Para: {para.get('para', '')}, Tokens: {para.get('tokens', 'N/A')})",
-                                para.get('text', ''),
-                                height=200,
-                                disabled=True,
-                                key="para_1_retriever_main"
-                            )
-                        else:
-                            st.text_area(
-                                "Content 1",
-                                str(para),
-                                height=200,
-                                disabled=True,
-                                key="para_1_retriever_main"
-                            )
+                    chunk = chunks[selected_idx]
+                    # Only the selected paragraph's full text is fetched
+                    st.text_area(
+                        f"Content {selected_idx+1} (Page {chunk.get('page', '?')}, Para: {chunk.get('para', '')}, Source: {chunk.get('filename') or 'N/A'})",
+                        get_chunk_text(chunk),
+                        height=200,
+                        disabled=True,
+                        key=f"retrieved_para_text_main_{selected_idx}"
+                    )
+                improvement = response_data.get('improvement_result', {})
+                if improvement.get('improved_content'):
+                    st.write("RFP Editor Agent Results:")
+                    st.markdown(improvement['improved_content'])
                 # ... (rest of the retriever agent UI, feedback, etc.) ...
 
         with tab2:
@@ -415,18 +466,15 @@ def main():
             )
             if st.button("Ask Helping Agent", type="primary", key="process_helper"):
                 if help_query.strip():
+                    url = f"{API_BASE_URL}/helping-agent/stream"
                     with st.spinner("Helping Agent is thinking..."):
                         try:
-                            payload = {"query": help_query}
-                            url = f"{API_BASE_URL}/helping-agent/"
-                            response = requests.post(url, json=payload)
-                            if response.status_code == 200:
-                                result = response.json()
-                                st.session_state.helping_agent_response = result.get("answer", "No answer returned.")
-                                st.session_state.last_help_query = help_query
+                            result = render_stream("/helping-agent/stream", dict(st.session_state.search_filters, query=help_query), st.empty())
+                            if result:
+                                st.session_state.helping_agent_response = result["done"].get("answer") or "No answer returned."
                             else:
-                                st.session_state.helping_agent_response = f"Error: {response.status_code} - {response.text} (URL: {url})"
-                                st.session_state.last_help_query = help_query
+                                st.session_state.helping_agent_response = f"Error: no answer returned (URL: {url})"
+                            st.session_state.last_help_query = help_query
                         except Exception as e:
                             st.session_state.helping_agent_response = f"Error: {str(e)} (URL: {url})"
                             st.session_state.last_help_query = help_query
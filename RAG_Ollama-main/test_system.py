@@ -4,6 +4,7 @@ Test script for the Multi-Agent RFP Assistant
 """
 
 import requests
+import subprocess
 import time
 import json
 import sys
@@ -14,6 +15,10 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 API_BASE_URL = "http://localhost:8000"
 
+# Importing the API must not load these; they are initialized lazily or during warm-up
+HEAVY_MODULES = ["chromadb", "sentence_transformers", "torch", "onnxruntime", "nltk"]
+IMPORT_TIME_BUDGET_SECONDS = float(os.getenv("IMPORT_TIME_BUDGET_SECONDS", "3.0"))
+
 def test_api_health():
     """Test if the API is running"""
     print("Testing API health...")
@@ -29,6 +34,60 @@ def test_api_health():
         print(f"❌ API health check failed: {e}")
         return False
 
+def test_import_time():
+    """Test that importing the backend stays within the startup budget"""
+    print("\nTesting import time...")
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import backend.main\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    try:
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            timeout=120
+        )
+        if result.returncode != 0:
+            print(f"❌ Importing backend.main failed: {result.stderr.strip().splitlines()[-1:]}")
+            return False
+        measurement = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"   Import time: {measurement['seconds']:.2f}s (budget {IMPORT_TIME_BUDGET_SECONDS:.1f}s)")
+        if measurement["loaded"]:
+            print(f"❌ Heavy modules loaded at import time: {', '.join(measurement['loaded'])}")
+            return False
+        if measurement["seconds"] > IMPORT_TIME_BUDGET_SECONDS:
+            print("❌ Import time is over budget")
+            return False
+        print("✅ Import time within budget")
+        return True
+    except Exception as e:
+        print(f"❌ Import time test failed: {e}")
+        return False
+
+def test_readiness():
+    """Test the readiness probe"""
+    print("\nTesting readiness...")
+    try:
+        # Warm-up runs in the background after startup; give it time to load the models
+        deadline = time.time() + 120
+        while True:
+            response = requests.get(f"{API_BASE_URL}/ready", timeout=5)
+            if response.status_code == 200:
+                print(f"✅ API is ready: {response.json().get('components')}")
+                return True
+            if time.time() > deadline:
+                print(f"❌ API not ready: {response.json()}")
+                return False
+            time.sleep(2)
+    except Exception as e:
+        print(f"❌ Readiness check failed: {e}")
+        return False
+
 def test_config():
     """Test configuration endpoint"""
     print("\nTesting configuration...")
@@ -112,13 +171,133 @@ def test_feedback():
         print(f"❌ Feedback test failed: {e}")
         return False
 
+# Embedding backends to check, one spec per backend (see EMBEDDING_MODEL in the README)
+EMBEDDING_BACKEND_SPECS = [
+    "all-MiniLM-L6-v2",
+    "onnx:all-MiniLM-L6-v2",
+    f"ollama:{os.getenv('TEST_OLLAMA_EMBEDDING_MODEL', 'nomic-embed-text')}",
+]
+
+def embedding_backend_unavailable(spec, config):
+    """Why a backend cannot run here (optional extra not installed, Ollama or its model missing), or None"""
+    import importlib.util
+    from embedding_backends import parse_embedding_model
+
+    backend, model_name = parse_embedding_model(spec)
+    if backend == "onnx":
+        missing = [module for module in ("optimum", "onnxruntime") if importlib.util.find_spec(module) is None]
+        return f"{', '.join(missing)} not installed" if missing else None
+    if backend == "ollama":
+        try:
+            response = requests.get(f"{config.OLLAMA_BASE_URL}/api/tags", timeout=5)
+            response.raise_for_status()
+        except requests.RequestException:
+            return f"Ollama is not reachable at {config.OLLAMA_BASE_URL}"
+        models = {model.get("name", "") for model in response.json().get("models", [])}
+        if model_name not in models and f"{model_name}:latest" not in models:
+            return f"model {model_name} is not pulled"
+    return None
+
+def test_embedding_backends():
+    """
+    Test that every available embedding backend loads with the pinned dependencies and returns
+    unit-length vectors; backends whose optional extra or service is missing are skipped
+    """
+    print("\nTesting embedding backends...")
+    from embedding_backends import create_embedding_backend
+    from backend.config import Config
+
+    texts = ["The vendor shall provide 24/7 support.", "Proposals are due on March 1."]
+    passed = True
+    for spec in EMBEDDING_BACKEND_SPECS:
+        reason = embedding_backend_unavailable(spec, Config)
+        if reason:
+            print(f"⏭️  {spec} skipped: {reason}")
+            continue
+        try:
+            backend = create_embedding_backend(spec, batch_size=1, onnx_file=Config.EMBEDDING_ONNX_FILE,
+                                               host=Config.OLLAMA_BASE_URL, timeout=Config.OLLAMA_TIMEOUT)
+            vectors = backend.encode(texts)
+            norms = [sum(value * value for value in vector) ** 0.5 for vector in vectors]
+            if len(vectors) != len(texts) or len({len(vector) for vector in vectors}) != 1 or any(abs(norm - 1) > 1e-3 for norm in norms):
+                print(f"❌ {spec}: unexpected vectors (count {len(vectors)}, norms {norms})")
+                passed = False
+                continue
+            print(f"✅ {spec}: {len(vectors[0])} dimensions")
+        except Exception as e:
+            print(f"❌ {spec} failed: {e}")
+            passed = False
+    return passed
+
+def test_compact_response():
+    """Test that compact responses validate with chunk metadata as ingestion stores it"""
+    print("\nTesting compact response schema...")
+    try:
+        from pdf_load import extract_text_from_pdf, split_pdf_into_chunks_with_metadata
+        from rag_pipeline import chunk_info
+        from backend.main import CompactQueryResponse, compact_result
+
+        sample_pdf = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "1710.10903v3.pdf")
+        chunks = split_pdf_into_chunks_with_metadata(extract_text_from_pdf(sample_pdf))[:5]
+        paragraphs = [
+            dict(chunk_info(f"chunk-{index}", chunk["text"], {
+                "page": chunk["page"], "para": chunk["para"], "section": chunk.get("section") or "",
+                "tokens": chunk["tokens"], "document_id": "doc-1", "filename": "1710.10903v3.pdf"
+            }), score=0.5)
+            for index, chunk in enumerate(chunks)
+        ]
+        result = {
+            "status": "success",
+            "query": "What is the attention mechanism?",
+            "retrieval_result": {"retrieved_paragraphs": paragraphs, "num_paragraphs": len(paragraphs),
+                                 "retrieval_mode": "vector", "llm_answer": "answer", "context": "..."},
+            "improvement_result": {"improved_content": "improved", "context_used": "..."},
+            "agent_log": []
+        }
+        response = CompactQueryResponse(**compact_result(result))
+        if len(response.chunks) != len(paragraphs) or "context" in response.retrieval:
+            print("❌ Compact response lost chunk references or kept the context")
+            return False
+        print(f"✅ Compact response valid ({len(response.chunks)} chunk references)")
+        return True
+    except Exception as e:
+        print(f"❌ Compact response test failed: {e}")
+        return False
+
+def test_section_headings():
+    """Test that running headers and table of contents lines are not recorded as sections"""
+    print("\nTesting section headings on the sample RFP...")
+    try:
+        from pdf_load import iter_sections, running_key
+
+        sample_pdf = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data",
+                                  "17-023_data_analytics_consultant_and_solutions (1).pdf")
+        paragraphs = list(iter_sections(sample_pdf, workers=1))
+        sections = {section for _, _, section in paragraphs if section}
+        running = [section for section in sections if running_key(section) == running_key("RFP 17-023")]
+        toc = [section for section in sections if "...." in section]
+        headers = [text for _, text, _ in paragraphs if text.startswith("Date Issued")]
+        if running or toc or headers:
+            print(f"❌ Running headers or TOC entries kept: {(running + toc + headers)[:3]}")
+            return False
+        print(f"✅ {len(sections)} sections over {len(paragraphs)} paragraphs, no running headers or TOC entries")
+        return True
+    except Exception as e:
+        print(f"❌ Section heading test failed: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("🧪 Multi-Agent RFP Assistant System Test")
     print("=" * 50)
     
     tests = [
+        test_import_time,
+        test_compact_response,
+        test_section_headings,
+        test_embedding_backends,
         test_api_health,
+        test_readiness,
         test_config,
         test_legacy_ask,
         test_multi_agent_ask,